@@ -16,4 +16,5 @@ from .core import (
     SocketAPIError,
 )
 from .model import *
-from .reconnect_logic import ReconnectLogic
+from .reconnect_logic import ConnectScheduler, ReconnectLogic
+from .stats import ConnectionStats, MessageTypeStats
@@ -1,9 +1,27 @@
 from __future__ import annotations
 
-from .noise import APINoiseFrameHelper
+from typing import TYPE_CHECKING, Any
+
+from .base import WriteStats
 from .plain_text import APIPlaintextFrameHelper
 
+if TYPE_CHECKING:
+    from .noise import APINoiseFrameHelper
+
 __all__ = (
     "APINoiseFrameHelper",
     "APIPlaintextFrameHelper",
+    "WriteStats",
 )
+
+
+def __getattr__(name: str) -> Any:
+    # Importing noise pulls in the noise and cryptography packages, which
+    # only encrypted connections need.
+    if name == "APINoiseFrameHelper":
+        from .noise import (  # pylint: disable=import-outside-toplevel
+            APINoiseFrameHelper,
+        )
+
+        return APINoiseFrameHelper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
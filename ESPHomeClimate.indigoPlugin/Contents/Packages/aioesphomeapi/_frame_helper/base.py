@@ -4,9 +4,12 @@ import asyncio
 import logging
 from abc import abstractmethod
 from functools import partial
-from typing import Callable, cast
+from typing import TYPE_CHECKING, Callable, NamedTuple, cast
 
-from ..core import HandshakeAPIError, SocketClosedAPIError
+from ..core import HandshakeAPIError, SocketAPIError, SocketClosedAPIError
+
+if TYPE_CHECKING:
+    from ..stats import ConnectionStats
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,6 +23,16 @@ SOCKET_ERRORS = (
 WRITE_EXCEPTIONS = (RuntimeError, ConnectionResetError, OSError)
 
 
+class WriteStats(NamedTuple):
+    """Counters for packets written to a connection."""
+
+    packets: int
+    # Calls into the transport, each of which is normally one send syscall
+    writes: int
+    # The largest number of packets sent in a single write
+    largest_batch: int
+
+
 class APIFrameHelper(asyncio.Protocol):
     """Helper class to handle the API frame protocol."""
 
@@ -31,8 +44,15 @@ class APIFrameHelper(asyncio.Protocol):
         "_writer",
         "_ready_future",
         "_buffer",
-        "_buffer_len",
-        "_pos",
+        "_buffer_needed",
+        "_batch_writes",
+        "_write_chunks",
+        "_write_batch_len",
+        "_write_handle",
+        "_packets_written",
+        "_write_calls",
+        "_largest_write_batch",
+        "_stats",
         "_client_info",
         "_log_name",
         "_debug_enabled",
@@ -40,10 +60,12 @@ class APIFrameHelper(asyncio.Protocol):
 
     def __init__(
         self,
-        on_pkt: Callable[[int, bytes], None],
+        on_pkt: Callable[[int, bytes | memoryview], None],
         on_error: Callable[[Exception], None],
         client_info: str,
         log_name: str,
+        batch_writes: bool = False,
+        stats: ConnectionStats | None = None,
     ) -> None:
         """Initialize the API frame helper."""
         loop = asyncio.get_event_loop()
@@ -54,8 +76,17 @@ class APIFrameHelper(asyncio.Protocol):
         self._writer: None | (Callable[[bytes | bytearray | memoryview], None]) = None
         self._ready_future = self._loop.create_future()
         self._buffer = bytearray()
-        self._buffer_len = 0
-        self._pos = 0
+        # Length _buffer must reach before the frame at its start can be
+        # parsed; until then data_received() only appends to it.
+        self._buffer_needed = 0
+        self._batch_writes = batch_writes
+        self._write_chunks: list[bytes] = []
+        self._write_batch_len = 0
+        self._write_handle: asyncio.Handle | None = None
+        self._packets_written = 0
+        self._write_calls = 0
+        self._largest_write_batch = 0
+        self._stats = stats
         self._client_info = client_info
         self._log_name = log_name
         self._debug_enabled = partial(_LOGGER.isEnabledFor, logging.DEBUG)
@@ -64,14 +95,68 @@ class APIFrameHelper(asyncio.Protocol):
         if not self._ready_future.done():
             self._ready_future.set_exception(exc)
 
-    def _read_exactly(self, length: int) -> bytearray | None:
-        """Read exactly length bytes from the buffer or None if all the bytes are not yet available."""
-        original_pos = self._pos
-        new_pos = original_pos + length
-        if self._buffer_len < new_pos:
-            return None
-        self._pos = new_pos
-        return self._buffer[original_pos:new_pos]
+    @property
+    def write_stats(self) -> WriteStats:
+        """Return the packet and write counters for this connection."""
+        return WriteStats(
+            self._packets_written, self._write_calls, self._largest_write_batch
+        )
+
+    def _write_packet_chunks(self, *chunks: bytes) -> None:
+        """Write the chunks making up one packet.
+
+        With batched writes the chunks are queued, and every packet sent
+        during the same loop iteration goes out in a single writelines call.
+        Otherwise they are written immediately.
+        """
+        self._packets_written += 1
+        if self._stats is not None:
+            for chunk in chunks:
+                self._stats.bytes_sent += len(chunk)
+        if self._batch_writes:
+            self._write_chunks.extend(chunks)
+            self._write_batch_len += 1
+            if self._write_handle is None:
+                self._write_handle = self._loop.call_soon(self._flush_writes)
+            return
+
+        if TYPE_CHECKING:
+            assert self._writer is not None, "Writer should be set"
+
+        self._write_calls += 1
+        self._largest_write_batch = 1
+        try:
+            if len(chunks) == 1:
+                self._writer(chunks[0])
+            else:
+                self._writer(b"".join(chunks))
+        except WRITE_EXCEPTIONS as err:
+            raise SocketAPIError(
+                f"{self._log_name}: Error while writing data: {err}"
+            ) from err
+
+    def _flush_writes(self) -> None:
+        """Write all queued chunks to the transport."""
+        if self._write_handle is not None:
+            self._write_handle.cancel()
+            self._write_handle = None
+        chunks = self._write_chunks
+        if not chunks:
+            return
+        batch_len = self._write_batch_len
+        self._write_chunks = []
+        self._write_batch_len = 0
+        if self._transport is None:
+            return
+        self._write_calls += 1
+        if batch_len > self._largest_write_batch:
+            self._largest_write_batch = batch_len
+        try:
+            self._transport.writelines(chunks)
+        except WRITE_EXCEPTIONS as err:
+            self._handle_error_and_close(
+                SocketAPIError(f"{self._log_name}: Error while writing data: {err}")
+            )
 
     async def perform_handshake(self, timeout: float) -> None:
         """Perform the handshake with the server."""
@@ -115,6 +200,10 @@ class APIFrameHelper(asyncio.Protocol):
 
     def close(self) -> None:
         """Close the connection."""
+        if self._transport:
+            # Send anything still queued; a write error closes the
+            # transport itself.
+            self._flush_writes()
         if self._transport:
             self._transport.close()
             self._transport = None
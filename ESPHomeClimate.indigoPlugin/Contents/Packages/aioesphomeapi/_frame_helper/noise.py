@@ -23,10 +23,15 @@ from ..core import (
 )
 from .base import WRITE_EXCEPTIONS, APIFrameHelper
 
+if TYPE_CHECKING:
+    from ..stats import ConnectionStats
+
 _LOGGER = logging.getLogger(__name__)
 
 
 PACK_NONCE = partial(Struct("<LQ").pack, 0)
+PACK_TYPE_LEN = Struct(">HH").pack
+PACK_FRAME_HEADER = partial(Struct(">BH").pack, 0x01)
 
 
 class ChaCha20CipherReuseable(ChaCha20Cipher):  # type: ignore[misc]
@@ -72,6 +77,8 @@ class APINoiseFrameHelper(APIFrameHelper):
         "_proto",
         "_decrypt",
         "_encrypt",
+        "_decrypt_nonce",
+        "_encrypt_nonce",
         "_is_ready",
     )
 
@@ -83,15 +90,22 @@ class APINoiseFrameHelper(APIFrameHelper):
         expected_name: str | None,
         client_info: str,
         log_name: str,
+        stats: ConnectionStats | None = None,
     ) -> None:
         """Initialize the API frame helper."""
-        super().__init__(on_pkt, on_error, client_info, log_name)
+        # Encrypted packets are always batched; each one is written as a
+        # separate header and frame chunk.
+        super().__init__(
+            on_pkt, on_error, client_info, log_name, batch_writes=True, stats=stats
+        )
         self._noise_psk = noise_psk
         self._expected_name = expected_name
         self._set_state(NoiseConnectionState.HELLO)
         self._server_name: str | None = None
-        self._decrypt: Callable[[bytes], bytes] | None = None
-        self._encrypt: Callable[[bytes], bytes] | None = None
+        self._decrypt: Callable[[bytes, bytes, None], bytes] | None = None
+        self._encrypt: Callable[[bytes, bytes, None], bytes] | None = None
+        self._decrypt_nonce = 0
+        self._encrypt_nonce = 0
         self._setup_proto()
         self._is_ready = False
 
@@ -137,38 +151,54 @@ class APINoiseFrameHelper(APIFrameHelper):
         await super().perform_handshake(timeout)
 
     def data_received(self, data: bytes) -> None:
-        self._buffer += data
-        self._buffer_len += len(data)
-        while self._buffer:
-            self._pos = 0
-            header = self._read_exactly(3)
-            if header is None:
+        if self._stats is not None:
+            self._stats.bytes_received += len(data)
+        if self._buffer:
+            # Only an incomplete frame is kept between calls. Append to it
+            # until it can be complete, so a large frame arriving in many
+            # segments is copied once rather than once per segment.
+            self._buffer += data
+            if len(self._buffer) < self._buffer_needed:
                 return
-            preamble, msg_size_high, msg_size_low = header
+            buf = bytes(self._buffer)
+        else:
+            buf = data
+        # Frames are parsed by offset; each one is sliced out of buf once,
+        # which is the only copy made before it is decrypted.
+        buf_len = len(buf)
+        pos = 0
+        # Bytes from pos needed before parsing can go on
+        needed = 3
+        while pos + 3 <= buf_len:
+            preamble = buf[pos]
             if preamble != 0x01:
                 self._handle_error_and_close(
                     ProtocolAPIError(
-                        f"{self._log_name}: Marker byte invalid: {header[0]}"
+                        f"{self._log_name}: Marker byte invalid: {preamble}"
                     )
                 )
                 return
-            frame = self._read_exactly((msg_size_high << 8) | msg_size_low)
+            frame_pos = pos + 3
+            end_of_frame_pos = frame_pos + ((buf[pos + 1] << 8) | buf[pos + 2])
             # The complete frame is not yet available, wait for more data
-            # to arrive before continuing, since callback_packet has not
-            # been called yet the buffer will not be cleared and the next
-            # call to data_received will continue processing the packet
-            # at the start of the frame.
-            if frame is None:
-                return
-
+            # to arrive before continuing; the frame will be parsed again
+            # from its header.
+            if end_of_frame_pos > buf_len:
+                needed = end_of_frame_pos - pos
+                break
+            pos = end_of_frame_pos
             try:
-                self._dispatch(self, frame)
+                self._dispatch(self, buf[frame_pos:end_of_frame_pos])
             except Exception as err:  # pylint: disable=broad-except
                 self._handle_error_and_close(err)
-            finally:
-                end_of_frame_pos = self._pos
-                del self._buffer[:end_of_frame_pos]
-                self._buffer_len -= end_of_frame_pos
+
+        self._buffer_needed = needed
+        if pos == buf_len:
+            self._buffer.clear()
+        elif pos or buf is data:
+            # Keep just the incomplete frame. If nothing was consumed from
+            # a buffered remainder, _buffer already holds exactly that.
+            self._buffer = bytearray(buf[pos:])
 
     def _send_hello_handshake(self) -> None:
         """Send a ClientHello to the server."""
@@ -194,7 +224,7 @@ class APINoiseFrameHelper(APIFrameHelper):
                 f"{self._log_name}: Error while writing data: {err}"
             ) from err
 
-    def _handle_hello(self, server_hello: bytearray) -> None:
+    def _handle_hello(self, server_hello: bytes) -> None:
         """Perform the handshake with the server."""
         if not server_hello:
             self._handle_error_and_close(
@@ -265,7 +295,7 @@ class APINoiseFrameHelper(APIFrameHelper):
         proto.start_handshake()
         self._proto = proto
 
-    def _handle_handshake(self, msg: bytearray) -> None:
+    def _handle_handshake(self, msg: bytes) -> None:
         _LOGGER.debug("Starting handshake...")
         if msg[0] != 0:
             explanation = msg[1:].decode()
@@ -291,15 +321,16 @@ class APINoiseFrameHelper(APIFrameHelper):
             return
         _LOGGER.debug("Handshake complete")
         self._set_state(NoiseConnectionState.READY)
+        # After the handshake use the reusable ChaCha20-Poly1305 contexts
+        # directly and keep the nonces here, which skips the per-message
+        # CipherState and nonce formatting layers in noise.
         noise_protocol = self._proto.noise_protocol
-        self._decrypt = partial(
-            noise_protocol.cipher_state_decrypt.decrypt_with_ad,  # pylint: disable=no-member
-            None,
-        )
-        self._encrypt = partial(
-            noise_protocol.cipher_state_encrypt.encrypt_with_ad,  # pylint: disable=no-member
-            None,
-        )
+        cipher_state_decrypt = noise_protocol.cipher_state_decrypt  # pylint: disable=no-member
+        cipher_state_encrypt = noise_protocol.cipher_state_encrypt  # pylint: disable=no-member
+        self._decrypt = cipher_state_decrypt.cipher.cipher.decrypt
+        self._encrypt = cipher_state_encrypt.cipher.cipher.encrypt
+        self._decrypt_nonce = cipher_state_decrypt.n
+        self._encrypt_nonce = cipher_state_encrypt.n
         self._ready_future.set_result(None)
 
     def write_packet(self, type_: int, data: bytes) -> None:
@@ -311,43 +342,38 @@ class APINoiseFrameHelper(APIFrameHelper):
             assert self._encrypt is not None, "Handshake should be complete"
             assert self._writer is not None, "Writer is not set"
 
-        data_len = len(data)
-        type_len = bytes(
-            ((type_ >> 8) & 0xFF, type_ & 0xFF, (data_len >> 8) & 0xFF, data_len & 0xFF)
+        frame = self._encrypt(
+            PACK_NONCE(self._encrypt_nonce),
+            PACK_TYPE_LEN(type_, len(data)) + data,
+            None,
         )
-        frame = self._encrypt(type_len + data)
+        self._encrypt_nonce += 1
 
         if self._debug_enabled():
             _LOGGER.debug("%s: Sending frame: [%s]", self._log_name, frame.hex())
 
-        frame_len = len(frame)
-        header = bytes((0x01, (frame_len >> 8) & 0xFF, frame_len & 0xFF))
-        try:
-            self._writer(header + frame)
-        except WRITE_EXCEPTIONS as err:
-            raise SocketAPIError(
-                f"{self._log_name}: Error while writing data: {err}"
-            ) from err
+        self._write_packet_chunks(PACK_FRAME_HEADER(len(frame)), frame)
 
-    def _handle_frame(self, frame: bytearray) -> None:
+    def _handle_frame(self, frame: bytes) -> None:
         """Handle an incoming frame."""
         if TYPE_CHECKING:
             assert self._decrypt is not None, "Handshake should be complete"
         try:
-            msg = self._decrypt(bytes(frame))
+            msg = self._decrypt(PACK_NONCE(self._decrypt_nonce), frame, None)
         except InvalidTag as ex:
             self._handle_error_and_close(
                 ProtocolAPIError(f"{self._log_name}: Bad encryption frame: {ex!r}")
             )
             return
+        self._decrypt_nonce += 1
         # Message layout is
         # 2 bytes: message type
         # 2 bytes: message length
         # N bytes: message data
-        self._on_pkt((msg[0] << 8) | msg[1], msg[4:])
+        self._on_pkt((msg[0] << 8) | msg[1], memoryview(msg)[4:])
 
     def _handle_closed(  # pylint: disable=unused-argument
-        self, frame: bytearray
+        self, frame: bytes
     ) -> None:
         """Handle a closed frame."""
         self._handle_error(ProtocolAPIError(f"{self._log_name}: Connection closed"))
@@ -2,14 +2,29 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import TYPE_CHECKING
+from functools import lru_cache
 
-from ..core import ProtocolAPIError, RequiresEncryptionAPIError, SocketAPIError
-from ..util import bytes_to_varuint, varuint_to_bytes
-from .base import WRITE_EXCEPTIONS, APIFrameHelper
+from ..core import (
+    MESSAGE_TYPE_TO_PROTO,
+    ProtocolAPIError,
+    RequiresEncryptionAPIError,
+)
+from ..util import varuint_to_bytes
+from .base import APIFrameHelper
 
 _LOGGER = logging.getLogger(__name__)
 
+_MESSAGE_TYPE_VARUINTS = {
+    msg_type: varuint_to_bytes(msg_type) for msg_type in MESSAGE_TYPE_TO_PROTO
+}
+
+
+@lru_cache(maxsize=1024)
+def _make_plain_text_header(type_: int, length: int) -> bytes:
+    """Return the frame header (preamble, length, type) for a packet."""
+    type_bytes = _MESSAGE_TYPE_VARUINTS.get(type_) or varuint_to_bytes(type_)
+    return b"\0" + varuint_to_bytes(length) + type_bytes
+
 
 class APIPlaintextFrameHelper(APIFrameHelper):
     """Frame helper for plaintext API connections."""
@@ -24,34 +39,35 @@ class APIPlaintextFrameHelper(APIFrameHelper):
 
         The entire packet must be written in a single call.
         """
-        if TYPE_CHECKING:
-            assert self._writer is not None, "Writer should be set"
-
-        data = b"\0" + varuint_to_bytes(len(data)) + varuint_to_bytes(type_) + data
+        data = _make_plain_text_header(type_, len(data)) + data
         if self._debug_enabled():
             _LOGGER.debug("%s: Sending plaintext frame %s", self._log_name, data.hex())
 
-        try:
-            self._writer(data)
-        except WRITE_EXCEPTIONS as err:
-            raise SocketAPIError(
-                f"{self._log_name}: Error while writing data: {err}"
-            ) from err
-
-    def data_received(self, data: bytes) -> None:  # pylint: disable=too-many-branches
-        self._buffer += data
-        self._buffer_len += len(data)
-        while self._buffer:
-            # Read preamble, which should always 0x00
-            # Also try to get the length and msg type
-            # to avoid multiple calls to _read_exactly
-            self._pos = 0
-            init_bytes = self._read_exactly(3)
-            if init_bytes is None:
+        self._write_packet_chunks(data)
+
+    def data_received(self, data: bytes) -> None:
+        if self._stats is not None:
+            self._stats.bytes_received += len(data)
+        if self._buffer:
+            # Only an incomplete frame is kept between calls. Append to it
+            # until it can be complete, so a large frame arriving in many
+            # segments is copied once rather than once per segment.
+            self._buffer += data
+            if len(self._buffer) < self._buffer_needed:
                 return
-            msg_type_int: int | None = None
-            length_int: int | None = None
-            preamble, length_high, maybe_msg_type = init_bytes
+            buf = bytes(self._buffer)
+        else:
+            buf = data
+        # Frames are parsed by offset and handed on as views into buf, so
+        # a burst of frames costs no per-frame copies or buffer shifts.
+        view = memoryview(buf)
+        buf_len = len(buf)
+        pos = 0
+        # Bytes from pos needed before parsing can go on
+        needed = 0
+        while pos < buf_len:
+            # Read preamble, which should always 0x00
+            preamble = buf[pos]
             if preamble != 0x00:
                 if preamble == 0x01:
                     self._handle_error_and_close(
@@ -67,62 +83,69 @@ class APIPlaintextFrameHelper(APIFrameHelper):
                 )
                 return
 
-            if length_high & 0x80 != 0x80:
-                # Length is only 1 byte
-                #
-                # This is the most common case needing a single byte for
-                # length and type which means we avoid 2 calls to _read_exactly
-                length_int = length_high
-                if maybe_msg_type & 0x80 != 0x80:
-                    # Message type is also only 1 byte
-                    msg_type_int = maybe_msg_type
-                else:
-                    # Message type is longer than 1 byte
-                    msg_type = bytes(init_bytes[2:3])
-            else:
-                # Length is longer than 1 byte
-                length = bytes(init_bytes[1:3])
-                # If the message is long, we need to read the rest of the length
-                while length[-1] & 0x80 == 0x80:
-                    add_length = self._read_exactly(1)
-                    if add_length is None:
-                        return
-                    length += add_length
-                length_int = bytes_to_varuint(length)
-                # Since the length is longer than 1 byte we do not have the
-                # message type yet.
-                msg_type = b""
-
-            # If the we do not have the message type yet because the message
-            # length was so long it did not fit into the first byte we need
-            # to read the (rest) of the message type
-            if msg_type_int is None:
-                while not msg_type or msg_type[-1] & 0x80 == 0x80:
-                    add_msg_type = self._read_exactly(1)
-                    if add_msg_type is None:
-                        return
-                    msg_type += add_msg_type
-                msg_type_int = bytes_to_varuint(msg_type)
-
-            if TYPE_CHECKING:
-                assert length_int is not None
-                assert msg_type_int is not None
-
-            if length_int == 0:
-                packet_data = b""
+            if pos + 2 >= buf_len:
+                needed = 3
+                break
+            length_int = buf[pos + 1]
+            msg_type_int = buf[pos + 2]
+            if not (length_int | msg_type_int) & 0x80:
+                # Length and message type are each a single byte. This is
+                # by far the most common case, so decode it directly.
+                data_pos = pos + 3
             else:
-                packet_data_bytearray = self._read_exactly(length_int)
-                # The packet data is not yet available, wait for more data
-                # to arrive before continuing, since callback_packet has not
-                # been called yet the buffer will not be cleared and the next
-                # call to data_received will continue processing the packet
-                # at the start of the frame.
-                if packet_data_bytearray is None:
-                    return
-                packet_data = bytes(packet_data_bytearray)
-
-            end_of_frame_pos = self._pos
-            del self._buffer[:end_of_frame_pos]
-            self._buffer_len -= end_of_frame_pos
-            self._on_pkt(msg_type_int, packet_data)
-            # If we have more data, continue processing
+                # A two-byte length with a one-byte type, or the other way
+                # round, is decoded inline as well.
+                data_pos = 0
+                if pos + 3 < buf_len and not buf[pos + 3] & 0x80:
+                    if not msg_type_int & 0x80:
+                        length_int = (length_int & 0x7F) | (msg_type_int << 7)
+                        msg_type_int = buf[pos + 3]
+                        data_pos = pos + 4
+                    elif not length_int & 0x80:
+                        msg_type_int = (msg_type_int & 0x7F) | (buf[pos + 3] << 7)
+                        data_pos = pos + 4
+                if not data_pos:
+                    length_varuint = _read_varuint(buf, pos + 1, buf_len)
+                    if length_varuint is None:
+                        needed = buf_len - pos + 1
+                        break
+                    length_int, msg_type_pos = length_varuint
+                    msg_type_varuint = _read_varuint(buf, msg_type_pos, buf_len)
+                    if msg_type_varuint is None:
+                        needed = buf_len - pos + 1
+                        break
+                    msg_type_int, data_pos = msg_type_varuint
+            end_of_frame_pos = data_pos + length_int
+            # The packet data is not yet available, wait for more data
+            # to arrive before continuing; the frame will be parsed again
+            # from its start.
+            if end_of_frame_pos > buf_len:
+                needed = end_of_frame_pos - pos
+                break
+            pos = end_of_frame_pos
+            self._on_pkt(msg_type_int, view[data_pos:end_of_frame_pos])
+
+        self._buffer_needed = needed
+        if pos == buf_len:
+            self._buffer.clear()
+        elif pos or buf is data:
+            # Keep just the incomplete frame. If nothing was consumed from
+            # a buffered remainder, _buffer already holds exactly that.
+            self._buffer = bytearray(view[pos:])
+
+
+def _read_varuint(buf: bytes, pos: int, buf_len: int) -> tuple[int, int] | None:
+    """Decode a varuint at pos.
+
+    Returns the value and the position after it, or None if buf ends first.
+    """
+    result = 0
+    bitpos = 0
+    while pos < buf_len:
+        val = buf[pos]
+        pos += 1
+        result |= (val & 0x7F) << bitpos
+        if (val & 0x80) == 0:
+            return result, pos
+        bitpos += 7
+    return None
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from collections.abc import Awaitable, Coroutine
+from collections.abc import Awaitable, Coroutine, Iterable
 from functools import partial
 from typing import TYPE_CHECKING, Any, Callable, Union, cast
 
@@ -98,6 +98,7 @@ from .api_pb2 import (  # type: ignore
     VoiceAssistantRequest,
     VoiceAssistantResponse,
 )
+from ._frame_helper import WriteStats
 from .connection import APIConnection, ConnectionParams
 from .core import (
     APIConnectionError,
@@ -106,6 +107,8 @@ from .core import (
     to_human_readable_address,
 )
 from .host_resolver import ZeroconfInstanceType
+from .state_decoders import STATE_DECODERS
+from .stats import ConnectionStats
 from .model import (
     AlarmControlPanelCommand,
     AlarmControlPanelEntityState,
@@ -207,6 +210,8 @@ class APIClient:
         zeroconf_instance: ZeroconfInstanceType = None,
         noise_psk: str | None = None,
         expected_name: str | None = None,
+        batch_writes: bool = False,
+        stats: ConnectionStats | None = None,
     ):
         """Create a client, this object is shared across sessions.
 
@@ -222,6 +227,9 @@ class APIClient:
         :param expected_name: Require the devices name to match the given expected name.
             Can be used to prevent accidentally connecting to a different device if
             IP passed as address but DHCP reassigned IP.
+        :param batch_writes: Collect the messages sent during one event loop iteration
+            and write them to the socket together. Encrypted connections always do this.
+        :param stats: Count messages and bytes on this client's connections into stats.
         """
         self._params = ConnectionParams(
             address=address,
@@ -233,6 +241,8 @@ class APIClient:
             # treat empty psk string as missing (like password)
             noise_psk=noise_psk or None,
             expected_name=expected_name,
+            batch_writes=batch_writes,
+            stats=stats,
         )
         self._connection: APIConnection | None = None
         self._cached_name: str | None = None
@@ -374,8 +384,20 @@ class APIClient:
             entities.append(cls.from_pb(msg))
         return entities, services
 
-    async def subscribe_states(self, on_state: Callable[[EntityState], None]) -> None:
+    async def subscribe_states(
+        self,
+        on_state: Callable[[EntityState], None],
+        keys: Iterable[int] | None = None,
+    ) -> Callable[[], None]:
+        """Subscribe to entity state updates.
+
+        :param keys: Only deliver states for these entity keys. States for
+            other entities are dropped before they are decoded.
+        :return: A function that stops delivering states to on_state. The
+            device has no request to stop sending them, so it keeps doing so.
+        """
         self._check_authenticated()
+        wanted_keys = None if keys is None else frozenset(keys)
         image_stream: dict[int, list[bytes]] = {}
         response_types: dict[Any, type[EntityState]] = {
             BinarySensorStateResponse: BinarySensorState,
@@ -393,9 +415,25 @@ class APIClient:
             MediaPlayerStateResponse: MediaPlayerEntityState,
             AlarmControlPanelStateResponse: AlarmControlPanelEntityState,
         }
-        msg_types = (*response_types, CameraImageResponse)
+        # States with a fast decoder skip protobuf and arrive as the model
+        state_types = [
+            msg_type for msg_type in response_types if msg_type in STATE_DECODERS
+        ]
+        msg_types = (
+            *(msg_type for msg_type in response_types if msg_type not in state_types),
+            CameraImageResponse,
+        )
+
+        def _on_state(state: EntityState) -> None:
+            if wanted_keys is not None and state.key not in wanted_keys:
+                return
+            on_state(state)
 
         def _on_state_msg(msg: message.Message) -> None:
+            # The connection only filters on the keys wanted by all its
+            # subscribers together.
+            if wanted_keys is not None and msg.key not in wanted_keys:
+                return
             msg_type = type(msg)
             cls = response_types.get(msg_type)
             if cls:
@@ -417,10 +455,20 @@ class APIClient:
                     on_state(CameraState(key=msg.key, data=image_data))  # type: ignore[call-arg]
 
         assert self._connection is not None
-        self._connection.send_message_callback_response(
-            SubscribeStatesRequest(), _on_state_msg, msg_types
+        unsub_msg_callback = self._connection.send_message_callback_response(
+            SubscribeStatesRequest(), _on_state_msg, msg_types, wanted_keys
+        )
+        # No await since sending the request, so no state can be missed
+        unsub_state_callback = self._connection.add_state_callback(
+            _on_state, state_types, wanted_keys
         )
 
+        def unsub() -> None:
+            unsub_msg_callback()
+            unsub_state_callback()
+
+        return unsub
+
     async def subscribe_logs(
         self,
         on_log: Callable[[SubscribeLogsResponse], None],
@@ -1340,6 +1388,16 @@ class APIClient:
             return None
         return self._connection.api_version
 
+    @property
+    def stats(self) -> ConnectionStats | None:
+        return self._params.stats
+
+    @property
+    def write_stats(self) -> WriteStats | None:
+        if self._connection is None:
+            return None
+        return self._connection.write_stats
+
     async def subscribe_voice_assistant(
         self,
         handle_start: Callable[[str, bool], Coroutine[Any, Any, int | None]],
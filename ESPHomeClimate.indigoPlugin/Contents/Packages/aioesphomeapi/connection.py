@@ -6,6 +6,7 @@ import enum
 import logging
 import socket
 import time
+from asyncio.staggered import staggered_race
 from collections.abc import Coroutine, Iterable
 from dataclasses import astuple, dataclass
 from functools import partial
@@ -16,7 +17,7 @@ from google.protobuf import message
 
 import aioesphomeapi.host_resolver as hr
 
-from ._frame_helper import APINoiseFrameHelper, APIPlaintextFrameHelper
+from ._frame_helper import APIPlaintextFrameHelper, WriteStats
 from .api_pb2 import (  # type: ignore
     ConnectRequest,
     ConnectResponse,
@@ -43,7 +44,13 @@ from .core import (
     SocketAPIError,
     TimeoutAPIError,
 )
-from .model import APIVersion
+from .keepalive import get_keepalive_wheel
+from .model import APIVersion, EntityState
+from .state_decoders import STATE_DECODERS
+
+if TYPE_CHECKING:
+    from ._frame_helper.noise import APINoiseFrameHelper
+    from .stats import ConnectionStats
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -75,6 +82,11 @@ CONNECT_REQUEST_TIMEOUT = 30.0
 # to reboot and connect to the network/WiFi.
 TCP_CONNECT_TIMEOUT = 60.0
 
+# When a host resolves to several addresses, start connecting to the next
+# one after this long if the previous attempt hasn't finished (RFC 8305
+# recommends 250ms for the connection attempt delay).
+HAPPY_EYEBALLS_DELAY = 0.25
+
 # The maximum time for the whole connect process to complete
 CONNECT_AND_SETUP_TIMEOUT = 120.0
 
@@ -90,6 +102,32 @@ in_do_connect: contextvars.ContextVar[bool | None] = contextvars.ContextVar(
 )
 
 
+def _add_handler(
+    handlers: dict[Any, tuple[Callable[[Any], None], ...]],
+    msg_type: Any,
+    handler: Callable[[Any], None],
+) -> None:
+    """Add handler for msg_type, replacing the tuple rather than changing it."""
+    current = handlers.get(msg_type, ())
+    if handler not in current:
+        handlers[msg_type] = (*current, handler)
+
+
+def _remove_handler(
+    handlers: dict[Any, tuple[Callable[[Any], None], ...]],
+    msg_type: Any,
+    handler: Callable[[Any], None],
+) -> None:
+    """Remove handler for msg_type, dropping the entry once it has none."""
+    current = handlers.get(msg_type)
+    if current is None or handler not in current:
+        return
+    if remaining := tuple(other for other in current if other != handler):
+        handlers[msg_type] = remaining
+    else:
+        del handlers[msg_type]
+
+
 @dataclass
 class ConnectionParams:
     address: str
@@ -100,6 +138,8 @@ class ConnectionParams:
     zeroconf_instance: hr.ZeroconfInstanceType
     noise_psk: str | None
     expected_name: str | None
+    batch_writes: bool
+    stats: ConnectionStats | None
 
 
 class ConnectionState(enum.Enum):
@@ -132,20 +172,27 @@ class APIConnection:
         "_connection_state",
         "_connect_complete",
         "_message_handlers",
+        "_state_handlers",
+        "_handler_keys",
+        "_key_filters",
         "log_name",
         "_read_exception_futures",
-        "_ping_timer",
-        "_pong_timer",
+        "_keepalive",
+        "_keep_alive_check",
+        "_next_check",
+        "_last_check",
+        "_last_seen",
+        "_ping_sent",
         "_keep_alive_interval",
         "_keep_alive_timeout",
         "_connect_task",
         "_fatal_exception",
         "_expected_disconnect",
         "_loop",
-        "_send_pending_ping",
         "is_connected",
         "is_authenticated",
         "_is_socket_open",
+        "_stats",
         "_debug_enabled",
     )
 
@@ -169,27 +216,49 @@ class APIConnection:
         # Used so that on_stop is _not_ called if an error occurs during connect()
         self._connect_complete = False
 
-        # Message handlers currently subscribed to incoming messages
-        self._message_handlers: dict[Any, set[Callable[[message.Message], None]]] = {}
+        # Message handlers currently subscribed to incoming messages. The
+        # tuples are replaced, never changed, when handlers are added or
+        # removed, so dispatch can iterate them without copying, even if a
+        # handler unsubscribes itself.
+        self._message_handlers: dict[
+            Any, tuple[Callable[[message.Message], None], ...]
+        ] = {}
+        # Handlers for entity states that are decoded straight to the model
+        self._state_handlers: dict[Any, tuple[Callable[[EntityState], None], ...]] = {}
+        # Entity keys that handlers registered with a key projection want
+        self._handler_keys: dict[Callable[[Any], None], frozenset[int]] = {}
+        # Per message type, the only entity keys any handler wants; types
+        # with a handler that wants every key have no entry
+        self._key_filters: dict[Any, frozenset[int]] = {}
         # The friendly name to show for this connection in the logs
         self.log_name = log_name or params.address
 
         # futures currently subscribed to exceptions in the read task
         self._read_exception_futures: set[asyncio.Future[None]] = set()
 
-        self._ping_timer: asyncio.TimerHandle | None = None
-        self._pong_timer: asyncio.TimerHandle | None = None
+        self._loop = asyncio.get_event_loop()
+        # Keepalive pings and pong deadlines for every connection on the loop
+        # run from one timer wheel. Receiving a frame only records the time.
+        self._keepalive = get_keepalive_wheel(self._loop)
+        # Bound once, rather than on every schedule and cancel
+        self._keep_alive_check = self._async_keep_alive_check
+        # When the next keep alive check is due, and the wheel times of the
+        # last check, the last message received, and the first ping still
+        # waiting for an answer
+        self._next_check = 0.0
+        self._last_check = 0.0
+        self._last_seen = 0.0
+        self._ping_sent: float | None = None
         self._keep_alive_interval = params.keepalive
         self._keep_alive_timeout = params.keepalive * KEEP_ALIVE_TIMEOUT_RATIO
 
         self._connect_task: asyncio.Task[None] | None = None
         self._fatal_exception: Exception | None = None
         self._expected_disconnect = False
-        self._send_pending_ping = False
-        self._loop = asyncio.get_event_loop()
         self.is_connected = False
         self.is_authenticated = False
         self._is_socket_open = False
+        self._stats = params.stats
         self._debug_enabled = partial(_LOGGER.isEnabledFor, logging.DEBUG)
 
     @property
@@ -197,6 +266,13 @@ class APIConnection:
         """Return the current connection state."""
         return self._connection_state
 
+    @property
+    def write_stats(self) -> WriteStats | None:
+        """Return the write counters for the open socket, if any."""
+        if self._frame_helper is None:
+            return None
+        return self._frame_helper.write_stats
+
     def set_log_name(self, name: str) -> None:
         """Set the friendly log name for this connection."""
         self.log_name = name
@@ -232,11 +308,7 @@ class APIConnection:
             self._socket.close()
             self._socket = None
 
-        self._async_cancel_pong_timer()
-
-        if self._ping_timer is not None:
-            self._ping_timer.cancel()
-            self._ping_timer = None
+        self._keepalive.cancel(self._keep_alive_check)
 
         if self.on_stop and self._connect_complete:
 
@@ -257,7 +329,7 @@ class APIConnection:
             self._on_stop_task.add_done_callback(_remove_on_stop_task)
             self.on_stop = None
 
-    async def _connect_resolve_host(self) -> hr.AddrInfo:
+    async def _connect_resolve_host(self) -> list[hr.AddrInfo]:
         """Step 1 in connect process: resolve the address."""
         try:
             coro = hr.async_resolve_host(
@@ -272,49 +344,78 @@ class APIConnection:
                 f"Timeout while resolving IP address for {self.log_name}"
             ) from err
 
-    async def _connect_socket_connect(self, addr: hr.AddrInfo) -> None:
-        """Step 2 in connect process: connect the socket."""
-        self._socket = socket.socket(
-            family=addr.family, type=addr.type, proto=addr.proto
-        )
-        self._socket.setblocking(False)
-        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-        # Try to reduce the pressure on esphome device as it measures
-        # ram in bytes and we measure ram in megabytes.
+    async def _connect_socket_connect_addr(self, addr: hr.AddrInfo) -> socket.socket:
+        """Connect a new socket to a single address."""
+        sock = socket.socket(family=addr.family, type=addr.type, proto=addr.proto)
         try:
-            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_SIZE)
-        except OSError as err:
-            _LOGGER.warning(
-                "%s: Failed to set socket receive buffer size: %s",
-                self.log_name,
-                err,
-            )
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Try to reduce the pressure on esphome device as it measures
+            # ram in bytes and we measure ram in megabytes.
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_SIZE)
+            except OSError as err:
+                _LOGGER.warning(
+                    "%s: Failed to set socket receive buffer size: %s",
+                    self.log_name,
+                    err,
+                )
 
-        if self._debug_enabled():
-            _LOGGER.debug(
-                "%s: Connecting to %s:%s (%s)",
-                self.log_name,
-                self._params.address,
-                self._params.port,
-                addr,
-            )
-        sockaddr = astuple(addr.sockaddr)
+            if self._debug_enabled():
+                _LOGGER.debug(
+                    "%s: Connecting to %s:%s (%s)",
+                    self.log_name,
+                    self._params.address,
+                    self._params.port,
+                    addr,
+                )
+            start = time.monotonic()
+            await self._loop.sock_connect(sock, astuple(addr.sockaddr))
+        except BaseException as err:
+            # Also closes the sockets of attempts cancelled because
+            # another address won the race
+            sock.close()
+            if isinstance(err, OSError):
+                hr.async_record_connect_failure(addr)
+            raise
+        hr.async_record_connect_success(addr, time.monotonic() - start)
+        return sock
+
+    async def _connect_socket_connect(self, addrs: list[hr.AddrInfo]) -> None:
+        """Step 2 in connect process: connect the socket.
 
+        All resolved addresses are tried with staggered starts, and the
+        first to connect is used.
+        """
+        addrs = hr.async_sort_addrs(addrs)
+        sockaddrs = [astuple(addr.sockaddr) for addr in addrs]
         try:
-            coro = self._loop.sock_connect(self._socket, sockaddr)
+            coro = staggered_race(
+                [partial(self._connect_socket_connect_addr, addr) for addr in addrs],
+                HAPPY_EYEBALLS_DELAY,
+            )
             async with async_timeout.timeout(TCP_CONNECT_TIMEOUT):
-                await coro
-        except OSError as err:
-            raise SocketAPIError(f"Error connecting to {sockaddr}: {err}") from err
+                sock, index, errors = await coro
         except asyncio.TimeoutError as err:
-            raise SocketAPIError(f"Timeout while connecting to {sockaddr}") from err
-
+            raise SocketAPIError(f"Timeout while connecting to {sockaddrs}") from err
+
+        if index is None:
+            if len(errors) == 1:
+                raise SocketAPIError(
+                    f"Error connecting to {sockaddrs[0]}: {errors[0]}"
+                ) from errors[0]
+            raise SocketAPIError(
+                f"Error connecting to {sockaddrs}: "
+                + "; ".join(str(err) for err in errors)
+            ) from errors[-1]
+
+        self._socket = sock
         _LOGGER.debug(
             "%s: Opened socket to %s:%s (%s)",
             self.log_name,
             self._params.address,
             self._params.port,
-            addr,
+            addrs[index],
         )
 
     async def _connect_init_frame_helper(self) -> None:
@@ -330,10 +431,18 @@ class APIConnection:
                     on_error=self._report_fatal_error,
                     client_info=self._params.client_info,
                     log_name=self.log_name,
+                    batch_writes=self._params.batch_writes,
+                    stats=self._stats,
                 ),
                 sock=self._socket,
             )
         else:
+            # The noise and cryptography stack is slow to import, so it's
+            # only loaded once an encrypted connection is made.
+            from ._frame_helper.noise import (  # pylint: disable=import-outside-toplevel
+                APINoiseFrameHelper,
+            )
+
             _, fh = await loop.create_connection(
                 lambda: APINoiseFrameHelper(
                     noise_psk=self._params.noise_psk,
@@ -342,6 +451,7 @@ class APIConnection:
                     on_error=self._report_fatal_error,
                     client_info=self._params.client_info,
                     log_name=self.log_name,
+                    stats=self._stats,
                 ),
                 sock=self._socket,
             )
@@ -393,50 +503,62 @@ class APIConnection:
             )
 
     def _async_schedule_keep_alive(self) -> None:
-        """Start the keep alive task."""
-        self._send_pending_ping = True
-        self._ping_timer = self._loop.call_later(
-            self._keep_alive_interval, self._async_send_keep_alive
-        )
-
-    def _async_send_keep_alive(self) -> None:
-        """Send a keep alive message."""
+        """Start the keep alive checks."""
+        next_check = self._loop.time() + self._keep_alive_interval
+        self._keepalive.schedule(self._keep_alive_check, next_check)
+        self._next_check = next_check
+        self._last_check = self._keepalive.now
+        # Nothing received yet, so the first check sends a ping
+        self._last_seen = 0.0
+        self._ping_sent = None
+
+    def _async_keep_alive_check(self, now: float) -> float | None:
+        """Send a keep alive ping, or give up on the connection, if needed.
+
+        Called by the keepalive wheel; returns when to be called next.
+        """
         if not self._is_socket_open:
-            return
-
-        if self._send_pending_ping:
-            self.send_message(PING_REQUEST_MESSAGE)
-            if self._pong_timer is None:
-                # Do not reset the timer if it's already set
-                # since the only thing we want to reset the timer
-                # is if we receive a pong.
-                self._pong_timer = self._loop.call_later(
-                    self._keep_alive_timeout, self._async_pong_not_received
-                )
-            else:
-                #
-                # We haven't reached the ping response (pong) timeout yet
-                # and we haven't seen a response to the last ping
-                #
-                # We send another ping in case the device has
-                # rebooted and dropped the connection without telling
-                # us to force a TCP RST aka connection reset by peer.
-                #
-                _LOGGER.debug(
-                    "%s: PingResponse (pong) was not received "
-                    "since last keep alive after %s seconds; "
-                    "rescheduling keep alive",
-                    self.log_name,
-                    self._keep_alive_interval,
-                )
-
-        self._async_schedule_keep_alive()
+            return None
+
+        ping_sent = self._ping_sent
+        if ping_sent is not None:
+            if self._last_seen >= ping_sent:
+                # Any valid message from the remote since the ping shows
+                # the connection is still alive
+                ping_sent = self._ping_sent = None
+            elif now >= ping_sent + self._keep_alive_timeout:
+                self._async_pong_not_received()
+                return None
+
+        if now >= self._next_check:
+            if self._last_seen < self._last_check:
+                # Nothing has been received since the last check
+                if ping_sent is not None:
+                    #
+                    # We haven't reached the ping response (pong) timeout yet
+                    # and we haven't seen a response to the last ping
+                    #
+                    # We send another ping in case the device has
+                    # rebooted and dropped the connection without telling
+                    # us to force a TCP RST aka connection reset by peer.
+                    #
+                    _LOGGER.debug(
+                        "%s: PingResponse (pong) was not received "
+                        "since last keep alive after %s seconds; "
+                        "rescheduling keep alive",
+                        self.log_name,
+                        self._keep_alive_interval,
+                    )
+                self.send_message(PING_REQUEST_MESSAGE)
+                if ping_sent is None:
+                    # The pong deadline runs from the first unanswered ping
+                    ping_sent = self._ping_sent = now
+            self._last_check = now
+            self._next_check = now + self._keep_alive_interval
 
-    def _async_cancel_pong_timer(self) -> None:
-        """Cancel the pong timer."""
-        if self._pong_timer is not None:
-            self._pong_timer.cancel()
-            self._pong_timer = None
+        if ping_sent is not None:
+            return min(self._next_check, ping_sent + self._keep_alive_timeout)
+        return self._next_check
 
     def _async_pong_not_received(self) -> None:
         """Ping not received."""
@@ -447,6 +569,8 @@ class APIConnection:
             self.log_name,
             self._keep_alive_timeout,
         )
+        if self._stats is not None:
+            self._stats.pong_timeouts += 1
         self._report_fatal_error(
             PingFailedAPIError(
                 f"Ping response not received after {self._keep_alive_timeout} seconds"
@@ -456,8 +580,8 @@ class APIConnection:
     async def _do_connect(self, login: bool) -> None:
         """Do the actual connect process."""
         in_do_connect.set(True)
-        addr = await self._connect_resolve_host()
-        await self._connect_socket_connect(addr)
+        addrs = await self._connect_resolve_host()
+        await self._connect_socket_connect(addrs)
         await self._connect_init_frame_helper()
         await self._connect_hello()
         if login:
@@ -552,6 +676,9 @@ class APIConnection:
         if TYPE_CHECKING:
             assert self._frame_helper is not None
 
+        if self._stats is not None:
+            self._stats.record_sent(message_type)
+
         encoded = msg.SerializeToString()
         try:
             self._frame_helper.write_packet(message_type, encoded)
@@ -563,27 +690,88 @@ class APIConnection:
             raise
 
     def add_message_callback(
-        self, on_message: Callable[[Any], None], msg_types: Iterable[type[Any]]
+        self,
+        on_message: Callable[[Any], None],
+        msg_types: Iterable[type[Any]],
+        keys: Iterable[int] | None = None,
     ) -> Callable[[], None]:
-        """Add a message callback."""
+        """Add a message callback.
+
+        If keys is given, on_message only needs entity state messages for
+        those keys, and messages for other keys may be dropped undecoded.
+        """
+        if keys is not None:
+            self._handler_keys[on_message] = frozenset(keys)
         message_handlers = self._message_handlers
         for msg_type in msg_types:
-            message_handlers.setdefault(msg_type, set()).add(on_message)
+            _add_handler(message_handlers, msg_type, on_message)
+            self._update_key_filter(msg_type)
         return partial(self._remove_message_callback, on_message, msg_types)
 
     def _remove_message_callback(
         self, on_message: Callable[[Any], None], msg_types: Iterable[type[Any]]
     ) -> None:
         """Remove a message callback."""
+        self._handler_keys.pop(on_message, None)
         message_handlers = self._message_handlers
         for msg_type in msg_types:
-            message_handlers[msg_type].discard(on_message)
+            _remove_handler(message_handlers, msg_type, on_message)
+            self._update_key_filter(msg_type)
+
+    def add_state_callback(
+        self,
+        on_state: Callable[[EntityState], None],
+        msg_types: Iterable[type[Any]],
+        keys: Iterable[int] | None = None,
+    ) -> Callable[[], None]:
+        """Add a callback for entity state messages with a fast decoder.
+
+        on_state is called with the model instead of the protobuf message.
+        """
+        if keys is not None:
+            self._handler_keys[on_state] = frozenset(keys)
+        state_handlers = self._state_handlers
+        for msg_type in msg_types:
+            if msg_type not in STATE_DECODERS:
+                raise ValueError(f"No state decoder for {msg_type.__name__}")
+            _add_handler(state_handlers, msg_type, on_state)
+            self._update_key_filter(msg_type)
+        return partial(self._remove_state_callback, on_state, msg_types)
+
+    def _remove_state_callback(
+        self, on_state: Callable[[EntityState], None], msg_types: Iterable[type[Any]]
+    ) -> None:
+        """Remove a state callback."""
+        self._handler_keys.pop(on_state, None)
+        state_handlers = self._state_handlers
+        for msg_type in msg_types:
+            _remove_handler(state_handlers, msg_type, on_state)
+            self._update_key_filter(msg_type)
+
+    def _update_key_filter(self, msg_type: type[Any]) -> None:
+        """Recompute which entity keys the handlers for msg_type want."""
+        handler_keys = self._handler_keys
+        keys: set[int] = set()
+        has_handlers = False
+        for handlers in (self._message_handlers, self._state_handlers):
+            for handler in handlers.get(msg_type, ()):
+                if (wanted := handler_keys.get(handler)) is None:
+                    self._key_filters.pop(msg_type, None)
+                    return
+                keys |= wanted
+                has_handlers = True
+        if has_handlers:
+            self._key_filters[msg_type] = frozenset(keys)
+        else:
+            # Unhandled types are skipped before the filter is checked
+            self._key_filters.pop(msg_type, None)
 
     def send_message_callback_response(
         self,
         send_msg: message.Message,
         on_message: Callable[[Any], None],
         msg_types: Iterable[type[Any]],
+        keys: Iterable[int] | None = None,
     ) -> Callable[[], None]:
         """Send a message to the remote and register the given message handler."""
         self.send_message(send_msg)
@@ -591,9 +779,7 @@ class APIConnection:
         # between sending the message and registering the handler
         # we can be sure that we will not miss any messages even though
         # we register the handler after sending the message
-        for msg_type in msg_types:
-            self._message_handlers.setdefault(msg_type, set()).add(on_message)
-        return partial(self._remove_message_callback, on_message, msg_types)
+        return self.add_message_callback(on_message, msg_types, keys)
 
     def _handle_timeout(self, fut: asyncio.Future[None]) -> None:
         """Handle a timeout."""
@@ -649,7 +835,8 @@ class APIConnection:
         message_handlers = self._message_handlers
         read_exception_futures = self._read_exception_futures
         for msg_type in msg_types:
-            message_handlers.setdefault(msg_type, set()).add(on_message)
+            _add_handler(message_handlers, msg_type, on_message)
+            self._update_key_filter(msg_type)
 
         read_exception_futures.add(fut)
         # Now safe to await since we have registered the handler
@@ -670,7 +857,8 @@ class APIConnection:
             if not timeout_expired:
                 timeout_handle.cancel()
             for msg_type in msg_types:
-                message_handlers[msg_type].discard(on_message)
+                _remove_handler(message_handlers, msg_type, on_message)
+                self._update_key_filter(msg_type)
             read_exception_futures.discard(fut)
 
         return responses
@@ -711,45 +899,85 @@ class APIConnection:
         self._set_connection_state(ConnectionState.CLOSED)
         self._cleanup()
 
-    def _process_packet_factory(self) -> Callable[[int, bytes], None]:
+    def _process_packet_factory(self) -> Callable[[int, bytes | memoryview], None]:
         """Factory to make a packet processor."""
         message_type_to_proto = MESSAGE_TYPE_TO_PROTO
         debug_enabled = self._debug_enabled
         message_handlers = self._message_handlers
+        state_handlers = self._state_handlers
+        state_decoders = STATE_DECODERS
+        key_filters = self._key_filters
         internal_message_types = INTERNAL_MESSAGE_TYPES
 
-        def _process_packet(msg_type_proto: int, data: bytes) -> None:
+        def _process_packet(msg_type_proto: int, data: bytes | memoryview) -> None:
             """Process a packet from the socket."""
-            try:
-                msg = message_type_to_proto[msg_type_proto]()
-                # MergeFromString instead of ParseFromString since
-                # ParseFromString will clear the message first and
-                # the msg is already empty.
-                msg.MergeFromString(data)
-            except KeyError:
+            msg_type = message_type_to_proto.get(msg_type_proto)
+            if msg_type is None:
                 _LOGGER.debug(
                     "%s: Skipping message type %s",
                     self.log_name,
                     msg_type_proto,
                 )
                 return
-            except Exception as e:
-                _LOGGER.info(
-                    "%s: Invalid protobuf message: type=%s data=%s: %s",
-                    self.log_name,
-                    msg_type_proto,
-                    data,
-                    e,
-                    exc_info=True,
-                )
-                self._report_fatal_error(
-                    ProtocolAPIError(
-                        f"Invalid protobuf message: type={msg_type_proto} data={data!r}: {e}"
+
+            handlers = message_handlers.get(msg_type)
+            on_states = state_handlers.get(msg_type)
+            if (
+                not handlers
+                and not on_states
+                and msg_type not in internal_message_types
+            ):
+                # Nobody is listening, so don't spend time decoding it
+                self._on_message_received()
+                return
+
+            if (
+                (key_filter := key_filters.get(msg_type)) is not None
+                and len(data) >= 5
+                and data[0] == 0x0D
+                and int.from_bytes(data[1:5], "little") not in key_filter
+            ):
+                # Entity state messages start with their fixed32 key
+                # (field 1), so a message for an entity no handler wants
+                # can be dropped without decoding it.
+                self._on_message_received()
+                return
+
+            if on_states:
+                try:
+                    state = state_decoders[msg_type](data)
+                except Exception as e:
+                    self._report_invalid_message(msg_type_proto, data, e)
+                    raise
+
+                if debug_enabled():
+                    _LOGGER.debug(
+                        "%s: Got message of type %s: %s",
+                        self.log_name,
+                        msg_type.__name__,
+                        state,
                     )
-                )
-                raise
 
-            msg_type = type(msg)
+                self._on_message_received()
+
+                for on_state in on_states:
+                    on_state(state)
+
+                # State messages are never internal messages
+                if not handlers:
+                    return
+
+            try:
+                msg = msg_type()
+                # Messages without fields, such as pings, have no data
+                # to parse. MergeFromString instead of ParseFromString
+                # since ParseFromString will clear the message first and
+                # the msg is already empty.
+                if data:
+                    msg.MergeFromString(data)
+            except Exception as e:
+                self._report_invalid_message(msg_type_proto, data, e)
+                raise
 
             if debug_enabled():
                 _LOGGER.debug(
@@ -759,19 +987,10 @@ class APIConnection:
                     msg,
                 )
 
-            if self._pong_timer:
-                # Any valid message from the remote cancels the pong timer
-                # as we know the connection is still alive
-                self._async_cancel_pong_timer()
-
-            if self._send_pending_ping:
-                # Any valid message from the remove cancels the pending ping
-                # since we know the connection is still alive
-                self._send_pending_ping = False
+            self._on_message_received()
 
-            handlers = message_handlers.get(msg_type)
             if handlers:
-                for handler in handlers.copy():
+                for handler in handlers:
                     handler(msg)
 
             # Pre-check the message type to avoid awaiting
@@ -791,7 +1010,51 @@ class APIConnection:
                 resp.epoch_seconds = int(time.time())
                 self.send_message(resp)
 
-        return _process_packet
+        stats = self._stats
+        if stats is None:
+            return _process_packet
+
+        # Only connections collecting stats pay for timing every message.
+        perf_counter = time.perf_counter
+        record_received = stats.record_received
+
+        def _process_packet_with_stats(
+            msg_type_proto: int, data: bytes | memoryview
+        ) -> None:
+            """Process a packet, counting it and timing its handlers."""
+            start = perf_counter()
+            try:
+                _process_packet(msg_type_proto, data)
+            finally:
+                record_received(msg_type_proto, perf_counter() - start)
+
+        return _process_packet_with_stats
+
+    def _report_invalid_message(
+        self, msg_type_proto: int, data: bytes | memoryview, err: Exception
+    ) -> None:
+        """Report a message that could not be decoded."""
+        if self._stats is not None:
+            self._stats.decode_errors += 1
+        data = bytes(data)
+        _LOGGER.info(
+            "%s: Invalid protobuf message: type=%s data=%s: %s",
+            self.log_name,
+            msg_type_proto,
+            data,
+            err,
+            exc_info=True,
+        )
+        self._report_fatal_error(
+            ProtocolAPIError(
+                f"Invalid protobuf message: type={msg_type_proto} data={data!r}: {err}"
+            )
+        )
+
+    def _on_message_received(self) -> None:
+        """Note that a message arrived from the remote."""
+        # The keepalive check compares this with when it last sent a ping
+        self._last_seen = self._keepalive.now
 
     async def disconnect(self) -> None:
         """Disconnect from the API."""
@@ -42,45 +42,104 @@ class AddrInfo:
     sockaddr: Sockaddr
 
 
+@dataclass
+class AddrStats:
+    successes: int = 0
+    failures: int = 0
+    # Smoothed time in seconds a successful connect took
+    connect_time: float | None = None
+
+
+# Weight given to each new sample in AddrStats.connect_time
+CONNECT_TIME_SMOOTHING = 0.25
+
+_ADDR_STATS: dict[AddrInfo, AddrStats] = {}
+
+
+def async_record_connect_success(addr: AddrInfo, connect_time: float) -> None:
+    """Record that connecting to addr succeeded after connect_time seconds."""
+    stats = _ADDR_STATS.setdefault(addr, AddrStats())
+    stats.successes += 1
+    if stats.connect_time is None:
+        stats.connect_time = connect_time
+    else:
+        stats.connect_time += CONNECT_TIME_SMOOTHING * (
+            connect_time - stats.connect_time
+        )
+
+
+def async_record_connect_failure(addr: AddrInfo) -> None:
+    """Record that connecting to addr failed."""
+    _ADDR_STATS.setdefault(addr, AddrStats()).failures += 1
+
+
+def async_sort_addrs(addrs: list[AddrInfo]) -> list[AddrInfo]:
+    """Order addresses for a staggered connect.
+
+    Addresses that have connected before come first, fastest first. The
+    rest keep their order, but with address families interleaved as
+    recommended by RFC 8305, so one unreachable family doesn't delay
+    trying the other. Addresses that have only ever failed come last.
+    """
+    known: list[tuple[float, AddrInfo]] = []
+    by_family: dict[int, list[AddrInfo]] = {}
+    failed: list[AddrInfo] = []
+    for addr in addrs:
+        stats = _ADDR_STATS.get(addr)
+        if stats is not None and stats.connect_time is not None:
+            known.append((stats.connect_time, addr))
+        elif stats is not None and stats.failures:
+            failed.append(addr)
+        else:
+            by_family.setdefault(addr.family, []).append(addr)
+    known.sort(key=lambda item: item[0])
+    interleaved: list[AddrInfo] = []
+    family_lists = list(by_family.values())
+    for i in range(max((len(lst) for lst in family_lists), default=0)):
+        interleaved.extend(lst[i] for lst in family_lists if i < len(lst))
+    return [addr for _, addr in known] + interleaved + failed
+
+
 async def _async_zeroconf_get_service_info(
     zeroconf_instance: ZeroconfInstanceType,
     service_type: str,
     service_name: str,
     timeout: float,
 ) -> "zeroconf.ServiceInfo" | None:
-    # Use or create zeroconf instance, ensure it's an AsyncZeroconf
+    # Use or create zeroconf instance
+    aiozc: zeroconf.asyncio.AsyncZeroconf | None = None
     if zeroconf_instance is None:
         try:
-            zc = zeroconf.asyncio.AsyncZeroconf()
+            aiozc = zeroconf.asyncio.AsyncZeroconf()
         except Exception:
             raise ResolveAPIError(
                 "Cannot start mDNS sockets, is this a docker container without "
                 "host network mode?"
             )
-        do_close = True
+        zc = aiozc.zeroconf
     elif isinstance(zeroconf_instance, zeroconf.asyncio.AsyncZeroconf):
-        zc = zeroconf_instance
-        do_close = False
+        zc = zeroconf_instance.zeroconf
     elif isinstance(zeroconf_instance, zeroconf.Zeroconf):
-        zc = zeroconf.asyncio.AsyncZeroconf(zc=zeroconf_instance)
-        do_close = False
+        zc = zeroconf_instance
     else:
         raise ValueError(
             f"Invalid type passed for zeroconf_instance: {type(zeroconf_instance)}"
         )
 
+    # async_request answers from the zeroconf cache without sending a query
+    # when the cached records are complete and unexpired, so a shared
+    # instance that is browsing for the service type resolves immediately.
+    info = zeroconf.asyncio.AsyncServiceInfo(service_type, service_name)
     try:
-        info = await zc.async_get_service_info(
-            service_type, service_name, int(timeout * 1000)
-        )
+        found = await info.async_request(zc, int(timeout * 1000))
     except Exception as exc:
         raise ResolveAPIError(
             f"Error resolving mDNS {service_name} via mDNS: {exc}"
         ) from exc
     finally:
-        if do_close:
-            await zc.async_close()
-    return info
+        if aiozc is not None:
+            await aiozc.async_close()
+    return info if found else None
 
 
 async def _async_resolve_host_zeroconf(
@@ -194,7 +253,7 @@ async def async_resolve_host(
     host: str,
     port: int,
     zeroconf_instance: ZeroconfInstanceType = None,
-) -> AddrInfo:
+) -> list[AddrInfo]:
     addrs: list[AddrInfo] = []
 
     zc_error = None
@@ -221,6 +280,4 @@ async def async_resolve_host(
             raise zc_error
         raise ResolveAPIError(f"Could not resolve host {host} - got no results from OS")
 
-    # Use first matching result
-    # Future: return all matches and use first working one
-    return addrs[0]
+    return addrs
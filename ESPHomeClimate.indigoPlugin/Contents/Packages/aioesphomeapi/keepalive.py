@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from math import ceil
+from typing import Callable
+from weakref import WeakKeyDictionary
+
+_LOGGER = logging.getLogger(__name__)
+
+# Resolution of the wheel in seconds; keepalive deadlines are tens of seconds
+# away, so running them up to a tick late doesn't matter.
+TICK = 1.0
+# Number of slots in the wheel. Deadlines further away than this many ticks
+# share a slot with nearer ones and are skipped until they are due.
+SLOTS = 64
+
+KeepAliveCallback = Callable[[float], "float | None"]
+
+
+class KeepAliveWheel:
+    """Hashed timer wheel running the keepalive checks of many connections.
+
+    Each connection registers a callback with the time it next needs to run.
+    One event loop timer fires every tick while anything is registered and
+    runs the callbacks in the slot for that tick whose deadline has passed.
+    A callback is called with the current time and returns its next
+    deadline, or None to stop. A callback that raises is logged and
+    dropped, and the other callbacks still run.
+
+    `now` is the loop time as of the last tick. Connections record it when
+    a frame arrives, which is cheaper than asking the loop for the time and
+    much cheaper than cancelling and re-arming a timer per frame.
+    """
+
+    __slots__ = ("_loop", "_slots", "_deadlines", "_tick", "_handle", "now")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize the wheel."""
+        self._loop = loop
+        # Per slot, callback -> deadline
+        self._slots: list[dict[KeepAliveCallback, float]] = [
+            {} for _ in range(SLOTS)
+        ]
+        # Callback -> the slot it is in
+        self._deadlines: dict[KeepAliveCallback, int] = {}
+        # The last tick whose slot has been run
+        self._tick = 0
+        self._handle: asyncio.TimerHandle | None = None
+        self.now = loop.time()
+
+    def __len__(self) -> int:
+        """Return the number of registered callbacks."""
+        return len(self._deadlines)
+
+    def schedule(self, callback: KeepAliveCallback, deadline: float) -> None:
+        """Run callback once deadline has passed, replacing any earlier schedule."""
+        if self._handle is None:
+            # Idle until now, so the clock and tick are stale
+            self.now = self._loop.time()
+            self._tick = int(self.now // TICK)
+            self._handle = self._loop.call_at(
+                (self._tick + 1) * TICK, self._run_tick
+            )
+        self.cancel(callback)
+        # Each deadline goes in the first tick at or after it, or the next
+        # tick if that one has already run
+        slot = max(ceil(deadline / TICK), self._tick + 1) % SLOTS
+        self._slots[slot][callback] = deadline
+        self._deadlines[callback] = slot
+
+    def cancel(self, callback: KeepAliveCallback) -> None:
+        """Stop running callback."""
+        if (slot := self._deadlines.pop(callback, None)) is not None:
+            del self._slots[slot][callback]
+
+    def _run_tick(self) -> None:
+        """Run the callbacks that are due, and schedule the next tick."""
+        now = self.now = self._loop.time()
+        # The loop may run a timer a little early, so this is always at least
+        # the tick it was scheduled for
+        current = max(int(now // TICK), self._tick + 1)
+        # If the loop was busy, catch up on the ticks that were missed, but
+        # never go round the wheel more than once.
+        first = max(self._tick + 1, current - SLOTS + 1)
+        self._tick = current
+        try:
+            for tick in range(first, current + 1):
+                entries = self._slots[tick % SLOTS]
+                # Entries for later times round the wheel are left in place
+                limit = tick * TICK
+                due = [
+                    callback
+                    for callback, deadline in entries.items()
+                    if deadline <= limit
+                ]
+                for callback in due:
+                    # An earlier callback may have cancelled this one
+                    if entries.get(callback, limit + TICK) > limit:
+                        continue
+                    self.cancel(callback)
+                    try:
+                        deadline = callback(now)
+                    except Exception:  # pylint: disable=broad-except
+                        _LOGGER.exception("Error in keepalive callback %s", callback)
+                        continue
+                    if deadline is not None:
+                        self.schedule(callback, deadline)
+        finally:
+            if self._deadlines:
+                self._handle = self._loop.call_at(
+                    (current + 1) * TICK, self._run_tick
+                )
+            else:
+                self._handle = None
+
+
+_WHEELS: WeakKeyDictionary[asyncio.AbstractEventLoop, KeepAliveWheel] = (
+    WeakKeyDictionary()
+)
+
+
+def get_keepalive_wheel(loop: asyncio.AbstractEventLoop) -> KeepAliveWheel:
+    """Return the keepalive wheel shared by the connections on loop."""
+    if (wheel := _WHEELS.get(loop)) is None:
+        wheel = _WHEELS[loop] = KeepAliveWheel(loop)
+    return wheel
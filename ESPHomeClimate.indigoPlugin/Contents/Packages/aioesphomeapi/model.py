@@ -35,25 +35,48 @@ _T = TypeVar("_T", bound="APIIntEnum")
 _V = TypeVar("_V")
 
 
-class APIIntEnum(enum.IntEnum):
+class _APIIntEnumMeta(enum.EnumMeta):
+    """Give each APIIntEnum class its own value -> member table."""
+
+    def __new__(mcls, *args: Any, **kwargs: Any) -> Any:
+        cls = super().__new__(mcls, *args, **kwargs)
+        # Set once the members exist; aliases map to their canonical member
+        cls._by_value = {member.value: member for member in cls.__members__.values()}
+        return cls
+
+
+class APIIntEnum(enum.IntEnum, metaclass=_APIIntEnumMeta):
     """Base class for int enum values in API model."""
 
+    # Conversion looks values up in the class's _by_value table, so values
+    # the firmware reports that this version doesn't know map to None
+    # without raising and catching a ValueError for each one.
+    _by_value: dict[Any, APIIntEnum]
+
     @classmethod
     def convert(cls: type[_T], value: int) -> _T | None:
         try:
-            return cls(value)
-        except ValueError:
+            return cls._by_value.get(value)  # type: ignore[return-value]
+        except TypeError:
+            # An unhashable value can't be a member's value
             return None
 
     @classmethod
     def convert_list(cls: type[_T], value: list[int]) -> list[_T]:
-        ret = []
-        for x in value:
-            try:
-                ret.append(cls(x))
-            except ValueError:
-                pass
-        return ret
+        members = cls._by_value
+        try:
+            return [
+                member  # type: ignore[misc]
+                for x in value
+                if (member := members.get(x)) is not None
+            ]
+        except TypeError:
+            convert = cls.convert
+            return [
+                member  # type: ignore[misc]
+                for x in value
+                if (member := convert(x)) is not None
+            ]
 
 
 # Fields do not change so we can cache the result
@@ -61,6 +84,45 @@ class APIIntEnum(enum.IntEnum):
 cached_fields = cache(fields)
 
 
+def _compile_constructor(cls: type[_V], read: str) -> Callable[[Any], _V]:
+    """Generate a constructor for the model class cls.
+
+    read is the expression for a field's value in the constructor's data
+    argument, formatted with the field name. The constructor applies the
+    field converters inline and sets the fields on a new instance, which is
+    what __init__ and __post_init__ do, without walking the fields and their
+    metadata on every call.
+    """
+    namespace: dict[str, Any] = {
+        "cls": cls,
+        "new": object.__new__,
+        "setattr": object.__setattr__,
+    }
+    lines = ["def construct(data):", "    obj = new(cls)"]
+    for i, field_ in enumerate(cached_fields(cls)):  # type: ignore[arg-type]
+        value = read.format(name=field_.name)
+        convert = field_.metadata.get("converter")
+        if convert is not None:
+            namespace[f"convert_{i}"] = convert
+            value = f"convert_{i}({value})"
+        lines.append(f"    setattr(obj, {field_.name!r}, {value})")
+    lines.append("    return obj")
+    exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+    return cast(Callable[[Any], _V], namespace["construct"])
+
+
+@cache
+def pb_constructor(cls: type[_V]) -> Callable[[Any], _V]:
+    """Return the constructor that builds cls from a protobuf message."""
+    return _compile_constructor(cls, "data.{name}")
+
+
+@cache
+def values_constructor(cls: type[_V]) -> Callable[[dict[str, Any]], _V]:
+    """Return the constructor that builds cls from a dict with every field."""
+    return _compile_constructor(cls, "data[{name!r}]")
+
+
 @_frozen_dataclass_decorator
 class APIModelBase:
     def __post_init__(self) -> None:
@@ -88,7 +150,7 @@ class APIModelBase:
 
     @classmethod
     def from_pb(cls: type[_V], data: Any) -> _V:
-        return cls(**{f.name: getattr(data, f.name) for f in cached_fields(cls)})  # type: ignore[arg-type]
+        return pb_constructor(cls)(data)
 
 
 def converter_field(*, converter: Callable[[Any], _V], **kwargs: Any) -> _V:
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import random
 from collections.abc import Awaitable
 from typing import Callable
 
@@ -19,6 +20,152 @@ _LOGGER = logging.getLogger(__name__)
 
 EXPECTED_DISCONNECT_COOLDOWN = 3.0
 MAXIMUM_BACKOFF_TRIES = 100
+# Bounds, in seconds, of the wait between connection attempts. Each wait is
+# drawn at random between the minimum and three times the previous wait
+# (decorrelated jitter), so devices that lost their connections at the same
+# moment don't keep retrying in lockstep.
+MINIMUM_BACKOFF = 1.0
+MAXIMUM_BACKOFF = 60.0
+
+
+class ConnectScheduler:
+    """Limit how many ReconnectLogic instances connect at the same time.
+
+    Share one between the ReconnectLogic instances for a fleet of devices,
+    so that after a network outage they don't all connect, handshake and
+    run their on_connect callbacks at once. The first attempt after
+    ReconnectLogic.start() goes straight through, so a fleet brought up
+    together isn't serialized; retries and reconnects hold a slot from the
+    start of the attempt until on_connect has finished. A freed slot
+    goes to the waiter whose priority callable returns the highest value,
+    or to the one that has waited longest among equals.
+    """
+
+    __slots__ = (
+        "_max_active",
+        "_active",
+        "_waiters",
+        "admitted",
+        "max_waiting",
+        "total_wait",
+    )
+
+    def __init__(self, max_active: int) -> None:
+        """Initialize the scheduler."""
+        self._max_active = max_active
+        self._active = 0
+        # Waiting attempts in arrival order
+        self._waiters: list[tuple[Callable[[], int] | None, asyncio.Future[None]]] = []
+        # Connection attempts let through, the most that have waited at
+        # once, and the total seconds they spent waiting
+        self.admitted = 0
+        self.max_waiting = 0
+        self.total_wait = 0.0
+
+    @property
+    def active(self) -> int:
+        """Return the number of connection attempts holding a slot."""
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        """Return the number of connection attempts waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self, priority: Callable[[], int] | None = None) -> None:
+        """Wait for a slot; release() must be called once done with it."""
+        if self._active < self._max_active and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+        loop = asyncio.get_running_loop()
+        waiter = (priority, loop.create_future())
+        self._waiters.append(waiter)
+        self.max_waiting = max(self.max_waiting, len(self._waiters))
+        start = loop.time()
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        self.total_wait += loop.time() - start
+
+    def release(self) -> None:
+        """Give up a slot, handing it to the next waiter."""
+        self._active -= 1
+        waiters = self._waiters
+        while waiters and self._active < self._max_active:
+            best = max(
+                range(len(waiters)),
+                key=lambda i: (waiters[i][0]() if waiters[i][0] else 0, -i),
+            )
+            _, fut = waiters.pop(best)
+            if fut.done():
+                continue
+            self._active += 1
+            self.admitted += 1
+            fut.set_result(None)
+
+
+class _ZeroconfRecordDispatcher(zeroconf.RecordUpdateListener):
+    """Route mDNS pointer records to the ReconnectLogic waiting for them.
+
+    A single dispatcher is registered with each zeroconf instance while any
+    ReconnectLogic is listening, and finds the ones waiting for a record
+    with one dict lookup. Every mDNS update then costs O(records) rather
+    than O(records * devices), which matters when many devices are offline
+    on a busy network.
+    """
+
+    def __init__(self, zc: zeroconf.Zeroconf) -> None:
+        """Initialize the dispatcher."""
+        self._zc = zc
+        # Lower-cased PTR alias -> ReconnectLogic instances waiting for it
+        self._waiting: dict[str, set[ReconnectLogic]] = {}
+
+    def add(self, alias_key: str, logic: ReconnectLogic) -> None:
+        """Notify logic of records for alias_key."""
+        if not self._waiting:
+            self._zc.async_add_listener(self, None)
+        self._waiting.setdefault(alias_key, set()).add(logic)
+
+    def remove(self, alias_key: str, logic: ReconnectLogic) -> bool:
+        """Stop notifying logic; return True once nothing is waiting."""
+        waiting = self._waiting
+        if (logics := waiting.get(alias_key)) is not None:
+            logics.discard(logic)
+            if not logics:
+                del waiting[alias_key]
+        if waiting:
+            return False
+        self._zc.async_remove_listener(self)
+        return True
+
+    def async_update_records(
+        self,
+        zc: zeroconf.Zeroconf,  # pylint: disable=unused-argument
+        now: float,  # pylint: disable=unused-argument
+        records: list[zeroconf.RecordUpdate],
+    ) -> None:
+        """Pass pointer records on to whoever is waiting for them."""
+        waiting = self._waiting
+        for record_update in records:
+            new = record_update.new
+            if not isinstance(new, zeroconf.DNSPointer):  # type: ignore[attr-defined]
+                continue
+            if (logics := waiting.get(new.alias_key)) is None:
+                continue
+            # Copied, since a triggered logic stops listening
+            for logic in tuple(logics):
+                logic._async_on_pointer_record(new)
+
+
+# Zeroconf instance -> its dispatcher, while anything is listening
+_DISPATCHERS: dict[zeroconf.Zeroconf, _ZeroconfRecordDispatcher] = {}
 
 
 class ReconnectLogic(zeroconf.RecordUpdateListener):
@@ -40,12 +187,18 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         zeroconf_instance: zeroconf.Zeroconf,
         name: str | None = None,
         on_connect_error: Callable[[Exception], Awaitable[None]] | None = None,
+        connect_scheduler: ConnectScheduler | None = None,
+        connect_priority: Callable[[], int] | None = None,
     ) -> None:
         """Initialize ReconnectingLogic.
 
         :param client: initialized :class:`APIClient` to reconnect for
         :param on_connect: Coroutine Function to call when connected.
         :param on_disconnect: Coroutine Function to call when disconnected.
+        :param connect_scheduler: Shared scheduler limiting concurrent
+            reconnects; the first attempt after start() doesn't wait for it.
+        :param connect_priority: Called while waiting for the scheduler; attempts
+            with a higher result are let through first.
         """
         self.loop = asyncio.get_event_loop()
         self._cli = client
@@ -53,8 +206,12 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         self._on_connect_cb = on_connect
         self._on_disconnect_cb = on_disconnect
         self._on_connect_error_cb = on_connect_error
+        self._connect_scheduler = connect_scheduler
+        self._connect_priority = connect_priority
         self._zc = zeroconf_instance
         self._filter_alias: str | None = None
+        # Lower-cased _filter_alias, as matched against DNSPointer.alias_key
+        self._filter_alias_key: str | None = None
         # Flag to check if the device is connected
         self._connected = False
         self._connected_lock = asyncio.Lock()
@@ -62,6 +219,10 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         self._zc_listening = False
         # How many connect attempts have there been already, used for exponential wait time
         self._tries = 0
+        # Seconds waited before the last attempt, the basis of the next wait
+        self._backoff = MINIMUM_BACKOFF
+        # The next attempt is the first since start(), and skips the scheduler
+        self._first_attempt = False
         # Event for tracking when logic should stop
         self._connect_task: asyncio.Task[None] | None = None
         self._connect_timer: asyncio.TimerHandle | None = None
@@ -88,6 +249,9 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
             self._log_name,
         )
 
+        if (stats := self._cli.stats) is not None:
+            stats.disconnects += 1
+
         # Run disconnect hook
         await self._on_disconnect_cb(expected_disconnect)
 
@@ -102,11 +266,25 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         self._schedule_connect(wait)
 
     async def _try_connect(self) -> bool:
+        """Try connecting to the API client, once the scheduler allows it."""
+        scheduler = self._connect_scheduler
+        if scheduler is None or self._first_attempt:
+            self._first_attempt = False
+            return await self._try_connect_now()
+        await scheduler.acquire(self._connect_priority)
+        try:
+            return await self._try_connect_now()
+        finally:
+            scheduler.release()
+
+    async def _try_connect_now(self) -> bool:
         """Try connecting to the API client."""
         assert self._connected_lock.locked(), "connected_lock must be locked"
         try:
             await self._cli.connect(on_stop=self._on_disconnect, login=True)
         except Exception as err:  # pylint: disable=broad-except
+            if (stats := self._cli.stats) is not None:
+                stats.connect_failures += 1
             if self._on_connect_error_cb is not None:
                 await self._on_connect_error_cb(err)
             level = logging.WARNING if self._tries == 0 else logging.DEBUG
@@ -134,8 +312,11 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
                 self._tries += 1
             return False
         _LOGGER.info("Successfully connected to %s", self._log_name)
+        if (stats := self._cli.stats) is not None:
+            stats.connects += 1
         self._connected = True
         self._tries = 0
+        self._backoff = MINIMUM_BACKOFF
         await self._on_connect_cb()
         return True
 
@@ -177,16 +358,21 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
                 return
             if await self._try_connect():
                 return
-            tries = min(self._tries, 10)  # prevent OverflowError
-            wait_time = int(round(min(1.8**tries, 60.0)))
-            if tries == 1:
+            if self._tries >= MAXIMUM_BACKOFF_TRIES:
+                wait_time = MAXIMUM_BACKOFF
+            else:
+                wait_time = min(
+                    MAXIMUM_BACKOFF,
+                    random.uniform(MINIMUM_BACKOFF, self._backoff * 3),
+                )
+            self._backoff = wait_time
+            if self._tries == 1:
                 _LOGGER.info(
                     "Trying to connect to %s in the background", self._log_name
                 )
-            _LOGGER.debug("Retrying %s in %d seconds", self._log_name, wait_time)
-            if wait_time:
-                # If we are waiting, start listening for mDNS records
-                self._start_zc_listen()
+            _LOGGER.debug("Retrying %s in %.1f seconds", self._log_name, wait_time)
+            # While waiting, listen for mDNS records
+            self._start_zc_listen()
             self._schedule_connect(wait_time)
 
     def stop_callback(self) -> None:
@@ -215,6 +401,8 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
             if self._connected:
                 return
             self._tries = 0
+            self._backoff = MINIMUM_BACKOFF
+            self._first_attempt = True
             self._schedule_connect(0.0)
 
     async def stop(self) -> None:
@@ -235,14 +423,22 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         if not self._zc_listening and self.name:
             _LOGGER.debug("Starting zeroconf listener for %s", self.name)
             self._filter_alias = f"{self.name}._esphomelib._tcp.local."
-            self._zc.async_add_listener(self, None)
+            self._filter_alias_key = self._filter_alias.lower()
+            if (dispatcher := _DISPATCHERS.get(self._zc)) is None:
+                dispatcher = _DISPATCHERS[self._zc] = _ZeroconfRecordDispatcher(
+                    self._zc
+                )
+            dispatcher.add(self._filter_alias_key, self)
             self._zc_listening = True
 
     def _stop_zc_listen(self) -> None:
         """Stop listening for zeroconf updates."""
         if self._zc_listening:
             _LOGGER.debug("Removing zeroconf listener for %s", self.name)
-            self._zc.async_remove_listener(self)
+            assert self._filter_alias_key is not None
+            dispatcher = _DISPATCHERS[self._zc]
+            if dispatcher.remove(self._filter_alias_key, self):
+                del _DISPATCHERS[self._zc]
             self._zc_listening = False
 
     def async_update_records(
@@ -256,25 +452,32 @@ class ReconnectLogic(zeroconf.RecordUpdateListener):
         This is a mDNS record from the device and could mean it just woke up.
         """
 
-        # Check if already connected, no lock needed for this access and
-        # bail if either the already stopped or we haven't received device info yet
-        if self._connected or self._is_stopped or self._filter_alias is None:
-            return
-
+        # Listening goes through _ZeroconfRecordDispatcher, which calls
+        # _async_on_pointer_record directly; this is kept for callers
+        # feeding records in themselves.
         for record_update in records:
             # We only consider PTR records and match using the alias name
             if (
-                not isinstance(record_update.new, zeroconf.DNSPointer)  # type: ignore[attr-defined]
-                or record_update.new.alias != self._filter_alias
+                isinstance(record_update.new, zeroconf.DNSPointer)  # type: ignore[attr-defined]
+                and record_update.new.alias_key == self._filter_alias_key
             ):
-                continue
+                self._async_on_pointer_record(record_update.new)
+                return
 
-            # Tell connection logic to retry connection attempt now (even before connect timer finishes)
-            _LOGGER.debug(
-                "%s: Triggering connect because of received mDNS record %s",
-                self._log_name,
-                record_update.new,
-            )
-            self._stop_zc_listen()
-            self._schedule_connect(0.0)
+    def _async_on_pointer_record(
+        self, record: zeroconf.DNSPointer  # type: ignore[name-defined]
+    ) -> None:
+        """Handle a received PTR record for this device's alias."""
+        # Check if already connected, no lock needed for this access and
+        # bail if either the already stopped or we haven't received device info yet
+        if self._connected or self._is_stopped or self._filter_alias is None:
             return
+
+        # Tell connection logic to retry connection attempt now (even before connect timer finishes)
+        _LOGGER.debug(
+            "%s: Triggering connect because of received mDNS record %s",
+            self._log_name,
+            record,
+        )
+        self._stop_zc_listen()
+        self._schedule_connect(0.0)
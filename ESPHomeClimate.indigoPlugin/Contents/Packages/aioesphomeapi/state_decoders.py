@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from struct import Struct, error as StructError
+from typing import Any, Callable
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal import api_implementation
+from google.protobuf.message import DecodeError
+
+from .api_pb2 import (  # type: ignore
+    ClimateStateResponse,
+    SelectStateResponse,
+    SensorStateResponse,
+)
+from .model import (
+    ClimateState,
+    EntityState,
+    SelectState,
+    SensorState,
+    cached_fields,
+    values_constructor,
+)
+
+# Decoders that go straight from the wire bytes of the hot state messages
+# to their model dataclass. The pure-Python protobuf runtime walks a
+# descriptor-driven decoder per field, and from_pb then reads every field
+# back out of the message; these messages only have a few scalar fields,
+# so a single pass over the bytes is much cheaper.
+#
+# The decoders are generated from the message descriptors and follow the
+# protobuf runtime exactly: the last value of a field wins, closed enums
+# ignore values they don't define, unknown fields are skipped and
+# truncated data raises DecodeError. Anything rarer (groups, invalid wire
+# types, multi-byte or zero tags) is handed to protobuf instead, so the
+# result is always the same as from_pb.
+
+_UNPACK_FIXED32 = Struct("<I").unpack_from
+_UNPACK_FLOAT = Struct("<f").unpack_from
+
+_KIND_FIXED32 = 0
+_KIND_FLOAT = 1
+_KIND_BOOL = 2
+_KIND_ENUM = 3
+_KIND_STRING = 4
+
+_WIRETYPE_VARINT = 0
+_WIRETYPE_FIXED64 = 1
+_WIRETYPE_LENGTH_DELIMITED = 2
+_WIRETYPE_FIXED32 = 5
+
+# Protobuf field type -> (kind, wire type)
+_FIELD_KINDS = {
+    FieldDescriptor.TYPE_FIXED32: (_KIND_FIXED32, _WIRETYPE_FIXED32),
+    FieldDescriptor.TYPE_FLOAT: (_KIND_FLOAT, _WIRETYPE_FIXED32),
+    FieldDescriptor.TYPE_BOOL: (_KIND_BOOL, _WIRETYPE_VARINT),
+    FieldDescriptor.TYPE_ENUM: (_KIND_ENUM, _WIRETYPE_VARINT),
+    FieldDescriptor.TYPE_STRING: (_KIND_STRING, _WIRETYPE_LENGTH_DELIMITED),
+}
+
+
+class _FallBack(Exception):
+    """The message needs the protobuf runtime to decode it."""
+
+
+def _read_varint(data: bytes | memoryview, pos: int) -> tuple[int, int]:
+    """Decode a varint at pos, returning it (as uint64) and the next position."""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result & 0xFFFFFFFFFFFFFFFF, pos
+        shift += 7
+        if shift >= 64:
+            raise DecodeError("Too many bytes when decoding varint.")
+
+
+def make_state_decoder(
+    pb_type: Any, model_type: type[EntityState]
+) -> Callable[[bytes | memoryview], EntityState]:
+    """Build a decoder from pb_type's wire format to model_type."""
+    model_fields = {field_.name for field_ in cached_fields(model_type)}
+    # Single byte tag -> (model field name or None, kind, valid enum values)
+    fields: dict[int, tuple[str | None, int, frozenset[int] | None]] = {}
+    defaults: dict[str, Any] = {}
+    for field_ in pb_type.DESCRIPTOR.fields:
+        kind, wire_type = _FIELD_KINDS[field_.type]
+        tag = (field_.number << 3) | wire_type
+        if tag > 0x7F:
+            raise ValueError(
+                f"{pb_type.__name__}.{field_.name} needs a multi-byte tag"
+            )
+        enum_values = None
+        if kind == _KIND_ENUM and field_.enum_type.is_closed:
+            enum_values = frozenset(field_.enum_type.values_by_number)
+        name = field_.name if field_.name in model_fields else None
+        fields[tag] = (name, kind, enum_values)
+        if name is not None:
+            defaults[name] = field_.default_value
+    if missing := model_fields - defaults.keys():
+        raise ValueError(f"{pb_type.__name__} has no fields {sorted(missing)}")
+    construct = values_constructor(model_type)
+
+    def _decode(data: bytes | memoryview) -> dict[str, Any]:
+        values = defaults.copy()
+        end = len(data)
+        pos = 0
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            field = fields.get(tag)
+            if field is None:
+                wire_type = tag & 0x07
+                if tag & 0x80 or not tag >> 3:
+                    raise _FallBack
+                if wire_type == _WIRETYPE_VARINT:
+                    _, pos = _read_varint(data, pos)
+                elif wire_type == _WIRETYPE_FIXED64:
+                    pos += 8
+                elif wire_type == _WIRETYPE_LENGTH_DELIMITED:
+                    size, pos = _read_varint(data, pos)
+                    pos += size
+                elif wire_type == _WIRETYPE_FIXED32:
+                    pos += 4
+                else:
+                    raise _FallBack
+                if pos > end:
+                    raise DecodeError("Truncated message.")
+                continue
+
+            name, kind, enum_values = field
+            if kind == _KIND_FIXED32:
+                value = _UNPACK_FIXED32(data, pos)[0]
+                pos += 4
+            elif kind == _KIND_FLOAT:
+                value = _UNPACK_FLOAT(data, pos)[0]
+                pos += 4
+            elif kind == _KIND_BOOL:
+                value, pos = _read_varint(data, pos)
+                value = bool(value)
+            elif kind == _KIND_ENUM:
+                value, pos = _read_varint(data, pos)
+                # Enums are int32 on the wire
+                value = ((value & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+                if enum_values is not None and value not in enum_values:
+                    continue
+            else:
+                size, pos = _read_varint(data, pos)
+                new_pos = pos + size
+                if new_pos > end:
+                    raise DecodeError("Truncated string.")
+                value = str(data[pos:new_pos], "utf-8")
+                pos = new_pos
+            if name is not None:
+                values[name] = value
+        if pos > end:
+            raise DecodeError("Truncated message.")
+        return values
+
+    def decode(data: bytes | memoryview) -> EntityState:
+        try:
+            return construct(_decode(data))
+        except _FallBack:
+            pass
+        except (IndexError, StructError) as err:
+            raise DecodeError("Truncated message.") from err
+        msg = pb_type()
+        msg.MergeFromString(data)
+        return model_type.from_pb(msg)
+
+    return decode
+
+
+STATE_DECODERS: dict[Any, Callable[[bytes | memoryview], EntityState]] = {}
+
+# A compiled protobuf backend (upb or cpp) decodes these messages faster than
+# the decoders here can, so they're only used with the pure-Python runtime.
+if api_implementation.Type() == "python":
+    STATE_DECODERS = {
+        ClimateStateResponse: make_state_decoder(ClimateStateResponse, ClimateState),
+        SelectStateResponse: make_state_decoder(SelectStateResponse, SelectState),
+        SensorStateResponse: make_state_decoder(SensorStateResponse, SensorState),
+    }
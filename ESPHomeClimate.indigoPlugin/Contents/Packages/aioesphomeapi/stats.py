@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from .core import MESSAGE_TYPE_TO_PROTO
+
+
+class MessageTypeStats(NamedTuple):
+    """Counters for one type of message received."""
+
+    name: str
+    count: int
+    # Seconds spent decoding and handling messages of this type
+    processing_time: float
+
+
+class ConnectionStats:
+    """Traffic counters for the connections to one device.
+
+    Pass an instance to APIClient to collect them; it is shared by every
+    connection the client makes, and by a ReconnectLogic using that
+    client, so the counts carry across reconnects. Without one nothing is
+    counted.
+    """
+
+    __slots__ = (
+        "bytes_received",
+        "bytes_sent",
+        "messages_received",
+        "messages_sent",
+        "processing_time",
+        "decode_errors",
+        "pong_timeouts",
+        "connects",
+        "connect_failures",
+        "disconnects",
+    )
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        # Message type id -> number of messages
+        self.messages_received: dict[int, int] = {}
+        self.messages_sent: dict[int, int] = {}
+        # Message type id -> seconds spent processing received messages
+        self.processing_time: dict[int, float] = {}
+        self.decode_errors = 0
+        self.pong_timeouts = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+
+    def record_received(self, msg_type: int, seconds: float) -> None:
+        """Count a received message that took seconds to process."""
+        messages_received = self.messages_received
+        if msg_type in messages_received:
+            messages_received[msg_type] += 1
+            self.processing_time[msg_type] += seconds
+        else:
+            messages_received[msg_type] = 1
+            self.processing_time[msg_type] = seconds
+
+    def record_sent(self, msg_type: int) -> None:
+        """Count a sent message."""
+        messages_sent = self.messages_sent
+        messages_sent[msg_type] = messages_sent.get(msg_type, 0) + 1
+
+    @property
+    def total_received(self) -> int:
+        """Return the number of messages received."""
+        return sum(self.messages_received.values())
+
+    @property
+    def total_sent(self) -> int:
+        """Return the number of messages sent."""
+        return sum(self.messages_sent.values())
+
+    @property
+    def total_processing_time(self) -> float:
+        """Return the seconds spent processing received messages."""
+        return sum(self.processing_time.values())
+
+    def received_by_type(self) -> list[MessageTypeStats]:
+        """Return counters per received message type, most frequent first."""
+        result = []
+        # Copied first, since the counts may be read from another thread
+        for msg_type, count in list(self.messages_received.items()):
+            proto = MESSAGE_TYPE_TO_PROTO.get(msg_type)
+            name = proto.__name__ if proto is not None else f"type {msg_type}"
+            result.append(
+                MessageTypeStats(name, count, self.processing_time.get(msg_type, 0.0))
+            )
+        result.sort(key=lambda stats: stats.count, reverse=True)
+        return result
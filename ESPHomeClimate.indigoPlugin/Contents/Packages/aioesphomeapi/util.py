@@ -7,18 +7,14 @@ from functools import lru_cache
 @lru_cache(maxsize=1024)
 def varuint_to_bytes(value: int) -> bytes:
     if value <= 0x7F:
-        return bytes([value])
+        return bytes((value,))
 
-    ret = b""
-    while value:
-        temp = value & 0x7F
+    ret = bytearray()
+    while value > 0x7F:
+        ret.append((value & 0x7F) | 0x80)
         value >>= 7
-        if value:
-            ret += bytes([temp | 0x80])
-        else:
-            ret += bytes([temp])
-
-    return ret
+    ret.append(value)
+    return bytes(ret)
 
 
 @lru_cache(maxsize=1024)
@@ -1,4 +1,3 @@
-try:
-  __import__('pkg_resources').declare_namespace(__name__)
-except ImportError:
-  __path__ = __import__('pkgutil').extend_path(__path__, __name__)
+# Declared with pkgutil rather than pkg_resources: importing pkg_resources
+# scans every installed distribution, which dominated plugin import time.
+__path__ = __import__('pkgutil').extend_path(__path__, __name__)
@@ -6,13 +6,22 @@
 
 import asyncio
 import base64
+import concurrent.futures
+import functools
+import json
 import logging
 import math
 import threading
+import time
+
+# Must come before anything that imports google.protobuf
+import protobuf_backend
+kProtobufBackend, kProtobufBackendError = protobuf_backend.selectProtobufBackend()
 
 import aioesphomeapi
 import indigo
 import zeroconf
+import zeroconf.asyncio
 
 from aioesphomeapi import ClimateMode, ClimateAction, ClimateFanMode
 kHvacModeESPMap ={ClimateMode.OFF       : indigo.kHvacMode.Off,
@@ -48,26 +57,187 @@ kFanSpeedESPMap = {ClimateFanMode.OFF     : "off",
                    }
 kFanSpeedIndigoMap = dict(zip(kFanSpeedESPMap.values(), kFanSpeedESPMap.keys()))
 
+# How long shutdown() waits for outstanding device start/stop work on the event
+# loop before stopping it anyway.
+kShutdownTimeout = 10.0
+
+# mDNS service type that ESPHome devices advertise their native API under
+kESPHomeServiceType = "_esphomelib._tcp.local."
+
+# ESPHome often sends several state updates in quick succession (and re-sends
+# unchanged ones); updates arriving within this many seconds are merged into a
+# single write to the Indigo server.
+kStateCoalesceDelay = 0.25
+
+# The ESPHome/HeatPump system doesn't like a lot of commands in sequence; it is
+# after all transmitting them over a 2400bps serial link. Commands are held for
+# a short debounce time so that a run of actions (up/down clicks, action groups)
+# goes out as one command. The debounce follows how long the device has been
+# taking to report back after a command, within these bounds (in seconds).
+kCommandMinDebounce = 0.2
+kCommandMaxDebounce = 1.0
+kCommandDebounceRatio = 0.5
+# A command is acknowledged when the device reports a climate state matching
+# the requested mode, setpoint and fan speed. If that hasn't happened after
+# kCommandAckTimeout seconds the command is sent again, up to kCommandMaxRetries
+# times, unless a newer command is waiting to replace it.
+kCommandAckTimeout = 5.0
+kCommandMaxRetries = 2
+# Reported setpoints within this many degrees C of the requested one match it.
+kSetpointTolerance = 0.25
+# Weight given to each new sample in the smoothed acknowledgement latency.
+kAckLatencySmoothing = 0.25
+# Upper bounds, in seconds, of the command acknowledgement latency histogram
+# buckets. There's an additional bucket for anything slower.
+kAckLatencyBuckets = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+# How often, in seconds, each device's connection statistics are written to its
+# states (when the plugin is collecting them).
+kConnectionStatsInterval = 60.0
+
+# After a network outage every head reconnects at once, and each connection means
+# a TCP connect, encryption handshake and entity listing for a small ESP32. At
+# most this many devices reconnect (up to the end of onConnect()) at a time;
+# devices with a command waiting go first. A device's first attempt after it is
+# started isn't held back, so bringing up the fleet stays parallel.
+kMaxConcurrentConnects = 3
+# How long, in seconds, a command for a disconnected device is held waiting for
+# it to reconnect before being dropped.
+kDisconnectedCommandTimeout = 120.0
+
+# Sensors on the node that a device can show as states of its own: map from the
+# device prop holding the sensor's object ID to the Indigo state it's shown in.
+kSensorStates = {"outdoorTemperatureSensor" : "outdoorTemperature",
+                 "humiditySensor"           : "humidity",
+                 "powerSensor"              : "power",
+                 }
+# Device props that choose which of the node's entities the device uses
+kEntityProps = ("climateEntity", "verticalVaneEntity", *kSensorStates)
+
 class DeviceInfo:
     """Class for information about a particular ESPHome device"""
     def __init__(self):
-        # aioesphomeapi api object
+        # NodeConnection this device shares with any others at the same address
+        self.node = None
+        # aioesphomeapi api object, node.api
         self.api = None
-        # aioesphomeapi reconnect object
-        self.reconnect_logic = None
         # Integer, key of the climate sub-object within ESPhome updates
         self.climate_key = None
         # List of ClimateModes that the device is reported to support
         self.supported_modes = None
         # List of ClimateFanModes that the device is reported to support
         self.supported_fan_speeds = None
+        # Lowest and highest setpoints (in °C) the device accepts, or None if it
+        # doesn't say
+        self.min_setpoint = None
+        self.max_setpoint = None
         # List of vertical vane modes that the device is reported to support
         self.supported_vertical_vane_modes = None
         # Integer, key of the Select sub-object in ESPhome updates that represents
         # the vertical vane position
         self.vertical_vane_key = None
-        # Future of a climate command in progress, so it can be cancelled if another is being sent.
-        self.command_future = None
+        # Map from Indigo state to (entity key, accuracy decimals, unit of measurement)
+        # of the sensors whose values the device shows; see kSensorStates
+        self.sensors = {}
+        # JSON string of the entity information above, as stored in the device's
+        # "entityCache" plugin prop
+        self.entity_cache = None
+        # Dict of climate_command() arguments (plus 'vertical_vane_mode') waiting to be
+        # sent. Later commands are merged into it, so only the latest settings are sent.
+        self.pending_command = None
+        # Set of pending_command keys that were explicitly requested, rather than
+        # filled in from the device's current states
+        self.pending_explicit = set()
+        # Task sending pending_command to the device
+        self.command_task = None
+        # Vertical vane mode most recently reported by or sent to the device
+        self.vertical_vane_mode = None
+        # Dict of climate_command() arguments last sent, plus 'vertical_vane_mode' if
+        # the vane was sent with them, until the device acknowledges it
+        self.command_in_flight = None
+        # Number of times command_in_flight has been sent
+        self.command_attempts = 0
+        # time.monotonic() when command_in_flight was first sent
+        self.command_sent_time = None
+        # Event set when there is no command waiting for acknowledgement, or when a
+        # newer command is queued to replace it
+        self.command_acked = asyncio.Event()
+        self.command_acked.set()
+        # Event set while the device is connected and onConnect() has finished
+        self.connected = asyncio.Event()
+        # True while the device is in an error that reconnecting won't fix ("Config
+        # mismatch" or "Entity not found"), so outages don't wait for it
+        self.config_error = False
+        # Smoothed seconds between sending a command and the device acknowledging it
+        self.ack_latency = None
+        # Counts of acknowledgement latencies, bucketed by kAckLatencyBuckets
+        self.ack_latency_histogram = [0] * (len(kAckLatencyBuckets) + 1)
+        # Number of commands acknowledged, resent, and never acknowledged
+        self.commands_acked = 0
+        self.command_retries = 0
+        self.commands_lost = 0
+        # Map from Indigo state key to the value the plugin last wrote, so unchanged
+        # values don't need to be sent to the Indigo server again.
+        self.indigo_states = {}
+        # Map from Indigo state key to kvl entry, for states waiting to be written
+        self.pending_states = {}
+        # TimerHandle for the scheduled write of pending_states
+        self.flush_handle = None
+        # Number of state writes sent to the Indigo server
+        self.state_writes = 0
+        # aioesphomeapi.ConnectionStats counting the traffic of the device's node,
+        # node.stats, or None if statistics aren't being collected
+        self.stats = None
+        # Messages received, and time.monotonic(), when the statistics were last
+        # published; the message rate state covers the time since then.
+        self.stats_last_received = 0
+        self.stats_last_time = time.monotonic()
+        # Number of state updates from the device that needed no write at all
+        self.state_writes_avoided = 0
+        # Number of individual state values left out of writes because they were unchanged
+        self.state_keys_avoided = 0
+
+class NodeConnection:
+    """Class for the connection to one ESPHome node, shared by all the Indigo devices
+    using entities on it"""
+    def __init__(self, address, port, password, psk):
+        # Host and port of the node
+        self.address = address
+        self.port = port
+        # Key of the connection in Plugin.nodes; host names aren't case sensitive
+        self.key = (address.lower(), port)
+        # Password and encryption key, which every device on the node must agree on
+        self.password = password
+        self.psk = psk
+        # aioesphomeapi api object
+        self.api = None
+        # aioesphomeapi reconnect object
+        self.reconnect_logic = None
+        # aioesphomeapi.ConnectionStats counting the node's traffic, or None if
+        # statistics aren't being collected
+        self.stats = None
+        # Map from Indigo's dev.id to (dev, DeviceInfo) for the devices on the node
+        self.devices = {}
+        # Map from entity key to (dev, handler) for the current connection: the
+        # device using the entity, and the method handling its states
+        self.routes = {}
+        # Function ending the connection's state subscription, or None if there
+        # isn't one, and the set of entity keys it was made for
+        self.unsubscribe_states = None
+        self.subscribed_keys = frozenset()
+        # aioesphomeapi.DeviceInfo of the node, while it is connected
+        self.device_info = None
+        # Entities the node listed since it last connected, or None if no device
+        # has needed them yet
+        self.entities = None
+        # Held while listing entities, so devices set up together list them once
+        self.list_lock = asyncio.Lock()
+        # Event set while the node is connected and onConnect() has finished
+        self.connected = asyncio.Event()
+
+    @property
+    def name(self):
+        return f"{self.address}:{self.port}"
 
 class Plugin(indigo.PluginBase):
     """Plugin for ESPHome devices doing climate control, such as Mitsubishi minisplit heads"""
@@ -93,8 +263,28 @@ class Plugin(indigo.PluginBase):
         self.loop = None
         self.async_thread = None
         self.devices = {}  # map from Indigo's dev.id to a DeviceInfo
-
+        # Map from NodeConnection.key to the NodeConnection, for the nodes that have
+        # devices. Only changed on the event loop thread.
+        self.nodes = {}
+        # concurrent.futures.Future objects for device start/stop work that has been
+        # handed to the event loop but hasn't finished yet.
+        self.pending_futures = set()
+
+        # zeroconf.asyncio.AsyncZeroconf running on self.loop, shared by all devices
         self.zeroconf = None
+        # AsyncServiceBrowser for ESPHome devices on self.zeroconf
+        self.zeroconf_browser = None
+        # TimerHandle for the next publishConnectionStats() call
+        self.stats_handle = None
+        # Shared by all devices' ReconnectLogic; see kMaxConcurrentConnects
+        self.connect_scheduler = aioesphomeapi.ConnectScheduler(kMaxConcurrentConnects)
+        # time.monotonic() when a device first went (or started) disconnected while
+        # all the others were connected, or None when they all are
+        self.outage_start = None
+        # Seconds from outage_start until every device was connected again, for
+        # the last outage (including plugin startup), and how many there have been
+        self.last_recovery_time = None
+        self.recoveries = 0
 
     def setupFromPrefs(self, pluginPrefs):
         self.debug = pluginPrefs.get('debugEnabled', None)
@@ -108,12 +298,15 @@ class Plugin(indigo.PluginBase):
             logging.getLogger("asyncio").setLevel(logging.INFO)
         self.convertF = pluginPrefs.get('temperatureUnit', None) == 'degreesF'
         self.logger.debug(f"Convert to/from degrees F: {self.convertF}")
+        self.collectStats = pluginPrefs.get('connectionStatsEnabled', True)
 
     # Indigo plugin method
     def startup(self):
         self.logger.debug("startup called")
+        if kProtobufBackendError:
+            self.logger.warning(f"Couldn't use the host's protobuf: {kProtobufBackendError}")
+        self.logger.info(f"Using the {kProtobufBackend} protobuf backend")
 
-        self.zeroconf = zeroconf.Zeroconf()
         self.loop = asyncio.new_event_loop()
         self.loop.set_debug(True)
         self.loop.set_exception_handler(self.asyncio_exception_handler)
@@ -123,6 +316,24 @@ class Plugin(indigo.PluginBase):
         asyncio.set_event_loop(self.loop)
         self.async_thread = threading.Thread(target=self.run_async_thread)
         self.async_thread.start()
+        # Zeroconf has to be created on the loop's thread to use the loop rather
+        # than starting its own thread.
+        asyncio.run_coroutine_threadsafe(self.asyncStartZeroconf(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.publishConnectionStats)
+
+    async def asyncStartZeroconf(self):
+        self.zeroconf = zeroconf.asyncio.AsyncZeroconf()
+        # Browsing keeps ESPHome devices' address records in zeroconf's cache, so
+        # resolving a ".local" address on reconnect doesn't have to wait for the network.
+        self.zeroconf_browser = zeroconf.asyncio.AsyncServiceBrowser(
+            self.zeroconf.zeroconf, kESPHomeServiceType, handlers=[self.onServiceStateChange])
+
+    async def asyncStopZeroconf(self):
+        await self.zeroconf_browser.async_cancel()
+        await self.zeroconf.async_close()
+
+    def onServiceStateChange(self, zeroconf, service_type, name, state_change):
+        self.logger.debug(f"mDNS: {name} {state_change.name}")
 
     def asyncio_exception_handler(self, loop, context):
         self.logger.exception(f"Event loop exception {context}")
@@ -138,6 +349,19 @@ class Plugin(indigo.PluginBase):
     # Indigo plugin method
     def shutdown(self):
         self.logger.debug("shutdown called")
+        # deviceStopComm() doesn't wait for devices to disconnect, so give that
+        # a chance to finish before the loop goes away.
+        pending = list(self.pending_futures)
+        if pending:
+            self.logger.debug(f"Waiting for {len(pending)} device operations to finish")
+            concurrent.futures.wait(pending, timeout=kShutdownTimeout)
+        future = asyncio.run_coroutine_threadsafe(self.asyncStopZeroconf(), self.loop)
+        try:
+            future.result(kShutdownTimeout)
+        except Exception as exc:
+            self.logger.exception(exc)
+        if self.stats_handle:
+            self.loop.call_soon_threadsafe(self.stats_handle.cancel)
         self.loop.call_soon_threadsafe(self.loop.stop)
 
     # Indigo plugin method
@@ -157,6 +381,10 @@ class Plugin(indigo.PluginBase):
             valid = False
             error_dict["address"] = "Host must not be empty"
 
+        # Entity IDs are matched exactly.
+        for key in kEntityProps:
+            values_dict[key] = values_dict.get(key, "").strip()
+
         # Port must be decimal and in TCP range
         try:
             portnum = int(values_dict["port"])
@@ -257,7 +485,53 @@ class Plugin(indigo.PluginBase):
                 return dict['value']
         return defaultValue
 
-    def updateDeviceState(self, dev, state):
+    def writeStates(self, dev, devinfo, kvl):
+        """Write states to the Indigo server now, recording them as the last written values.
+
+        Must be called on the event loop thread.
+        """
+        for item in kvl:
+            devinfo.indigo_states[item['key']] = item['value']
+            devinfo.pending_states.pop(item['key'], None)
+        devinfo.state_writes += 1
+        self.logger.debug(f"Updating Indigo states: {kvl}")
+        dev.updateStatesOnServer(kvl)
+
+    def queueStates(self, dev, devinfo, kvl):
+        """Queue states to be written to the Indigo server, skipping unchanged values.
+
+        Must be called on the event loop thread.
+        """
+        for item in kvl:
+            key = item['key']
+            if key in devinfo.indigo_states and devinfo.indigo_states[key] == item['value']:
+                # Drop any different value still waiting to be written, too.
+                devinfo.pending_states.pop(key, None)
+                devinfo.state_keys_avoided += 1
+            else:
+                devinfo.pending_states[key] = item
+        if not devinfo.pending_states:
+            devinfo.state_writes_avoided += 1
+            if devinfo.flush_handle:
+                devinfo.flush_handle.cancel()
+                devinfo.flush_handle = None
+            return
+        if not devinfo.flush_handle:
+            devinfo.flush_handle = self.loop.call_later(
+                kStateCoalesceDelay, self.flushStates, dev, devinfo)
+
+    def flushStates(self, dev, devinfo):
+        devinfo.flush_handle = None
+        kvl = list(devinfo.pending_states.values())
+        if not kvl:
+            return
+        self.writeStates(dev, devinfo, kvl)
+        self.logger.debug(
+            f"\"{dev.name}\": {devinfo.state_writes} state writes, "
+            f"{devinfo.state_writes_avoided} avoided, "
+            f"{devinfo.state_keys_avoided} unchanged values skipped")
+
+    def updateDeviceState(self, dev, devinfo, state):
         """Update Indigo's view of the device from an aioesphomeapi.ClimateState object"""
         # Sample state:
         # ClimateState(key=4057448159, mode=<ClimateMode.COOL: 2>,
@@ -308,123 +582,480 @@ class Plugin(indigo.PluginBase):
             self.addKvl(kvl, 'temperatureInput1', curtemp)
         else:
             self.logger.warning("No reported temperature - disconnected?")
-        self.logger.debug(f"Updating Indigo states: {kvl}")
-        dev.updateStatesOnServer(kvl)
+        self.queueStates(dev, devinfo, kvl)
 
-    def updateDeviceVaneState(self, dev, state):
+    def updateDeviceVaneState(self, dev, devinfo, state):
         """Update Indigo's view of the vane state of the device from an aioesphomeapi.SelectState object"""
         # Sample state:
         # SelectState(key=1072139916, state='center', missing_state=False)
         self.logger.debug(f"updateDeviceVaneState(): from ESPHome state {state}")
         kvl = []
         self.addKvl(kvl, 'verticalVaneMode', state.state)
-        self.logger.debug(f"Updating Indigo states: {kvl}")
-        dev.updateStatesOnServer(kvl)        
+        devinfo.vertical_vane_mode = state.state
+        self.queueStates(dev, devinfo, kvl)
 
-    def changeCallback(self, dev, state):
-        # If it's the climate state being updated, update Indigo's information.
-        devinfo = self.devices[dev.id]
-        if state.key == devinfo.climate_key:
-            self.updateDeviceState(dev, state)
-        elif state.key == devinfo.vertical_vane_key:
-            self.updateDeviceVaneState(dev, state)
+    def updateDeviceSensorState(self, dev, devinfo, state_id, decimals, unit, state):
+        """Update one of the device's sensor states from an aioesphomeapi.SensorState object"""
+        # Sample state:
+        # SensorState(key=2374892716, state=7.5, missing_state=False)
+        if state.missing_state or math.isnan(state.state):
+            return
+        value = state.state
+        # Temperatures from the climate entity use the heat pump's own table, but
+        # a sensor's can be anything.
+        if unit == "°C" and self.convertF:
+            value = value * 1.8 + 32
+            unit = "°F"
+        value = round(value, decimals)
+        kvl = []
+        # accuracy_decimals can be negative, rounding to tens or hundreds, but a
+        # format precision can't
+        self.addKvl(kvl, state_id, value, f"{value:.{max(decimals, 0)}f} {unit}".rstrip())
+        self.queueStates(dev, devinfo, kvl)
+
+    def climateCallback(self, dev, devinfo, state):
+        self.checkCommandAcknowledged(dev, devinfo, state)
+        self.updateDeviceState(dev, devinfo, state)
+
+    def routeState(self, node, state):
+        """Hand a state from the node to the method handling its entity"""
+        route = node.routes.get(state.key)
+        if route is not None:
+            dev, handler = route
+            # One device's bad state mustn't stop the node's others being routed
+            try:
+                handler(state)
+            except Exception as exc:
+                self.logger.exception(f"Error handling state {state} for \"{dev.name}\": {exc}")
+
+    def deviceRoutes(self, dev, devinfo):
+        """Map from the keys of the entities the device uses on its node to the methods
+        handling their states"""
+        routes = {devinfo.climate_key: functools.partial(self.climateCallback, dev, devinfo)}
+        if devinfo.vertical_vane_key is not None:
+            routes[devinfo.vertical_vane_key] = functools.partial(
+                self.updateDeviceVaneState, dev, devinfo)
+        for state_id, (key, decimals, unit) in devinfo.sensors.items():
+            routes[key] = functools.partial(
+                self.updateDeviceSensorState, dev, devinfo, state_id, decimals, unit)
+        return routes
+
+    def runAsync(self, dev, coro):
+        """Schedule a coroutine on the event loop without waiting for it to finish"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.pending_futures.add(future)
+        future.add_done_callback(lambda f: self.asyncDone(dev, f))
+        return future
+
+    def asyncDone(self, dev, future):
+        self.pending_futures.discard(future)
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc:
+            self.logger.error(f"Error in background work for \"{dev.name}\": {exc}",
+                              exc_info=exc)
 
     # Indigo plugin method
     def deviceStartComm(self, dev):
         self.logger.debug("deviceStartComm()")
         devinfo = DeviceInfo()
-        api = aioesphomeapi.APIClient(dev.pluginProps["address"],
-                                      int(dev.pluginProps["port"]),
-                                      dev.pluginProps["password"],
-                                      noise_psk = dev.pluginProps["psk"])
-        devinfo.api = api
+        devinfo.entity_cache = dev.pluginProps.get("entityCache", "")
         self.devices[dev.id] = devinfo
-        future = asyncio.run_coroutine_threadsafe(self.asyncDeviceStartComm(dev), self.loop)
-        try:
-            future.result()
-        except Exception as exc:
-            self.logger.exception(exc)
+        dev.updateStateOnServer('connectionState', 'starting')
+        # Don't wait for the connection here; Indigo calls this once per device,
+        # and blocking would make startup time proportional to the number of heads.
+        self.runAsync(dev, self.asyncDeviceStartComm(dev, devinfo))
 
-    async def asyncDeviceStartComm(self, dev):
+    async def asyncDeviceStartComm(self, dev, devinfo):
         self.logger.debug("asyncDeviceStartComm()")
-        devinfo = self.devices[dev.id]
-        api = devinfo.api
-        # Set up reconnection object. Initial connection occurs through this as well,
-        # and post-connection work happens in the onConnect() callback.
-        devinfo.reconnect_logic = (
+        props = dev.pluginProps
+        address = props["address"].strip()
+        port = int(props["port"])
+        node = self.nodes.get((address.lower(), port))
+        if node is None:
+            node = NodeConnection(address, port, props["password"], props["psk"])
+            self.nodes[node.key] = node
+            self.startNode(node)
+        elif (node.password, node.psk) != (props["password"], props["psk"]):
+            others = ", ".join(f"\"{other.name}\"" for other, _ in node.devices.values())
+            self.logger.error(
+                f"\"{dev.name}\" has a different password or encryption key from "
+                f"{others} at {node.name}, which share its connection; not connecting it")
+            dev.updateStateOnServer('connectionState', 'error')
+            dev.setErrorStateOnServer("Config mismatch")
+            devinfo.config_error = True
+            return
+        self.noteDeviceDown([devinfo])
+        devinfo.node = node
+        devinfo.api = node.api
+        devinfo.stats = node.stats
+        node.devices[dev.id] = (dev, devinfo)
+        if len(node.devices) == 1:
+            await node.reconnect_logic.start()
+        elif node.connected.is_set():
+            # The node's other devices are already using the connection.
+            await self.addDeviceToConnectedNode(node, dev, devinfo)
+            return
+        dev.updateStateOnServer('connectionState', 'connecting')
+
+    def startNode(self, node):
+        """Create the API and reconnection objects for a new node connection"""
+        if self.collectStats:
+            node.stats = aioesphomeapi.ConnectionStats()
+        node.api = aioesphomeapi.APIClient(node.address,
+                                           node.port,
+                                           node.password,
+                                           zeroconf_instance = self.zeroconf,
+                                           noise_psk = node.psk,
+                                           # A command is often a climate and a select
+                                           # message; send them in one segment.
+                                           batch_writes = True,
+                                           stats = node.stats)
+        # Initial connection occurs through the reconnection object as well, and
+        # post-connection work happens in the onConnect() callback.
+        node.reconnect_logic = (
             aioesphomeapi.ReconnectLogic(
-                client = api,
-                zeroconf_instance = self.zeroconf,
-                name = dev.pluginProps["address"],
-                on_connect = lambda: self.onConnect(dev),
-                on_disconnect = lambda expected: self.onDisconnect(dev, expected),
-                on_connect_error = lambda err: self.onConnectError(dev, err)))
-        await devinfo.reconnect_logic.start()
-
-    async def onConnect(self, dev):
-        self.logger.debug(f"onConnect of \"{dev.name}\" ")
-        devinfo = self.devices[dev.id]
-        api = devinfo.api
-        [entities, _] = await api.list_entities_services()
-        # Find entity objects we're going to use
-        climate_key = None
-        vertical_vane_key = None
-        for entity in entities:
-            self.logger.debug(f"Entity {entity}")
-            if isinstance(entity, aioesphomeapi.model.ClimateInfo):
-                if climate_key:
-                    self.logger.warning("More than one ClimateInfo found! Only using the first.")
-                    continue
-                climate_key = entity.key
-                devinfo.supported_modes = entity.supported_modes
-                devinfo.supported_fan_speeds = entity.supported_fan_modes
-            if (isinstance(entity, aioesphomeapi.model.SelectInfo)
-                and 'down' in entity.options):
-                if vertical_vane_key:
-                    self.logger.warning(
-                        "More than one SelectInfo found with 'down' option! Only using the first.")
-                    continue
-                vertical_vane_key = entity.key
-                devinfo.supported_vertical_vane_modes = entity.options
-        if not climate_key:
-            raise RuntimeError("No climate entity found on ESPHome device")
-        self.logger.debug(f"Found climate key {climate_key}")
-        devinfo.climate_key = climate_key
-        if vertical_vane_key:
-            self.logger.debug(f"Found vertical vane key {vertical_vane_key}")
-            devinfo.vertical_vane_key = vertical_vane_key
+                client = node.api,
+                zeroconf_instance = self.zeroconf.zeroconf,
+                name = node.address,
+                on_connect = lambda: self.onConnect(node),
+                on_disconnect = lambda expected: self.onDisconnect(node, expected),
+                on_connect_error = lambda err: self.onConnectError(node, err),
+                connect_scheduler = self.connect_scheduler,
+                connect_priority = lambda: self.connectPriority(node)))
+
+    async def onConnect(self, node):
+        self.logger.debug(f"onConnect of {node.name}")
+        node.device_info = await node.api.device_info()
+        node.entities = None
+        # Entity keys can change when the node is reflashed, and the last
+        # connection's subscription went with it.
+        node.routes.clear()
+        node.unsubscribe_states = None
+        node.subscribed_keys = frozenset()
+        # Devices can be added while others are being set up.
+        ready = []
+        done = set()
+        while any(dev_id not in done for dev_id in node.devices):
+            for dev_id, (dev, devinfo) in list(node.devices.items()):
+                if dev_id not in done:
+                    done.add(dev_id)
+                    if await self.setUpDevice(node, dev, devinfo):
+                        ready.append((dev, devinfo))
+        await self.subscribeStates(node)
+        for dev, devinfo in ready:
+            if node.devices.get(dev.id) == (dev, devinfo):
+                dev.updateStateOnServer('connectionState', 'connected')
+                devinfo.connected.set()
+        node.connected.set()
+        self.checkFleetRecovered()
+
+    async def addDeviceToConnectedNode(self, node, dev, devinfo):
+        """Set up a device that was added to a node that's already connected"""
+        try:
+            if not await self.setUpDevice(node, dev, devinfo):
+                # The outage might only have been waiting for this device.
+                self.checkFleetRecovered()
+                return
+            await self.subscribeStates(node)
+        except aioesphomeapi.APIConnectionError as err:
+            # onConnect() sets it up along with the others when the node is back.
+            self.logger.debug(f"Couldn't add \"{dev.name}\" to {node.name}: {err}")
+            return
+        dev.updateStateOnServer('connectionState', 'connected')
+        devinfo.connected.set()
+        self.checkFleetRecovered()
+
+    async def subscribeStates(self, node):
+        """Make sure the node's state subscription covers every routed entity.
+
+        One subscription delivers the states of every device's entities; states for
+        anything else on the node (and there can be dozens of sensors) are dropped
+        before they're decoded.
+        """
+        keys = frozenset(node.routes)
+        if node.unsubscribe_states is not None and keys <= node.subscribed_keys:
+            return
+        # Subscribing again makes the node send every state again, which is also
+        # how a device that was just added gets its current states.
+        if node.unsubscribe_states is not None:
+            node.unsubscribe_states()
+        node.unsubscribe_states = await node.api.subscribe_states(
+            lambda state: self.routeState(node, state), keys = keys)
+        node.subscribed_keys = keys
+
+    async def setUpDevice(self, node, dev, devinfo):
+        """Find a device's entities on its connected node and route their states to it.
+
+        Returns False if the device can't be used.
+        """
+        # Indigo clears the error state on the next state write, so make sure the
+        # first update after (re)connecting is written in full.
+        devinfo.indigo_states.clear()
+        # Entity keys and capabilities only change when the device is reflashed, so
+        # reuse what was found last time if the device info says it's the same build.
+        try:
+            if not self.loadEntityCache(dev, devinfo, node.device_info):
+                await self.listEntities(node, dev, devinfo)
+        except RuntimeError as err:
+            self.logger.error(f"\"{dev.name}\": {err}")
+            dev.updateStateOnServer('connectionState', 'error')
+            dev.setErrorStateOnServer("Entity not found")
+            devinfo.config_error = True
+            return False
+        if node.devices.get(dev.id) != (dev, devinfo):
+            # Stopped while the entities were being listed
+            return False
+        devinfo.config_error = False
         # maybe check capabilities here?
         new_props = dev.pluginProps
-        new_props["ShowCoolHeatEquipmentStateUI"] = True
-        dev.replacePluginPropsOnServer(new_props)
-        await api.subscribe_states(lambda state: self.changeCallback(dev, state))
+        if (not new_props.get("ShowCoolHeatEquipmentStateUI", False)
+            or new_props.get("entityCache", "") != devinfo.entity_cache):
+            new_props["ShowCoolHeatEquipmentStateUI"] = True
+            new_props["entityCache"] = devinfo.entity_cache
+            dev.replacePluginPropsOnServer(new_props)
+        shared = set()
+        for key, handler in self.deviceRoutes(dev, devinfo).items():
+            other = node.routes.get(key)
+            if other is not None and other[0].id != dev.id:
+                shared.add(other[0].name)
+            node.routes[key] = (dev, handler)
+        for name in shared:
+            self.logger.warning(
+                f"\"{dev.name}\" and \"{name}\" use the same entities on {node.name}; "
+                f"only \"{dev.name}\" will get their states")
+        return True
 
+    @staticmethod
+    def connectPriority(node):
+        """Priority of the node's reconnection attempts; see kMaxConcurrentConnects"""
+        if any(devinfo.pending_command is not None for _, devinfo in node.devices.values()):
+            return 1
+        return 0
+
+    def noteDeviceDown(self, devinfos):
+        """Start timing an outage, if these are the first devices to go down.
+
+        Devices in a configuration error aren't counted. Must be called on the event
+        loop thread.
+        """
+        if (self.outage_start is None
+            and any(not devinfo.config_error for devinfo in devinfos)):
+            self.outage_start = time.monotonic()
+
+    def checkFleetRecovered(self):
+        """Record how long the outage took once every device is connected again.
+
+        Must be called on the event loop thread.
+        """
+        if self.outage_start is None:
+            return
+        if not all(devinfo.connected.is_set() or devinfo.config_error
+                   for devinfo in self.devices.values()):
+            return
+        self.last_recovery_time = time.monotonic() - self.outage_start
+        self.recoveries += 1
+        self.outage_start = None
+        failed = sum(devinfo.config_error for devinfo in self.devices.values())
+        self.logger.info(
+            f"All {len(self.devices) - failed} devices connected "
+            f"{self.last_recovery_time:.1f}s after the first one went down"
+            + (f" ({failed} not connecting because of configuration errors)"
+               if failed else ""))
+
+
+    def loadEntityCache(self, dev, devinfo, device_info):
+        """Set up entity keys from the device's entity cache, if it matches device_info"""
+        if not devinfo.entity_cache:
+            return False
+        try:
+            cache = json.loads(devinfo.entity_cache)
+        except ValueError:
+            self.logger.warning(f"Ignoring unreadable entity cache for \"{dev.name}\"")
+            return False
+        if (cache.get("mac_address") != device_info.mac_address
+            or cache.get("compilation_time") != device_info.compilation_time
+            or cache.get("entity_ids", {}) != self.entityIds(dev)):
+            self.logger.debug(f"Entity cache for \"{dev.name}\" is out of date")
+            return False
+        self.logger.debug(f"Using cached entities for \"{dev.name}\": {cache}")
+        devinfo.climate_key = cache["climate_key"]
+        devinfo.supported_modes = ClimateMode.convert_list(cache["supported_modes"])
+        devinfo.supported_fan_speeds = ClimateFanMode.convert_list(cache["supported_fan_speeds"])
+        devinfo.min_setpoint = cache.get("min_setpoint")
+        devinfo.max_setpoint = cache.get("max_setpoint")
+        devinfo.vertical_vane_key = cache["vertical_vane_key"]
+        devinfo.supported_vertical_vane_modes = cache["supported_vertical_vane_modes"]
+        devinfo.sensors = {state_id: tuple(sensor)
+                           for state_id, sensor in cache.get("sensors", {}).items()}
+        return True
 
-    async def onDisconnect(self, dev, expected_disconnect):
-        self.logger.debug(f"onDisconnect of \"{dev.name}\" ")
-        dev.setErrorStateOnServer("Disconnected")
+    @staticmethod
+    def entityIds(dev):
+        """The entity object IDs set in the device's props, keyed by prop"""
+        return {prop: dev.pluginProps[prop] for prop in kEntityProps
+                if dev.pluginProps.get(prop)}
 
-    async def onConnectError(self, dev, err):
-        self.logger.error(f"onConnectError of \"{dev.name}\" ")
+    @staticmethod
+    def chooseEntity(entities, object_id, description):
+        """Pick the entity with the configured object ID, or else the first one.
+
+        Returns the entity (or None if there are none) and a warning, or None.
+        """
+        if object_id:
+            for entity in entities:
+                if entity.object_id == object_id:
+                    return entity, None
+            raise RuntimeError(f"No {description} with ID '{object_id}' found on ESPHome device")
+        if not entities:
+            return None, None
+        warning = None
+        if len(entities) > 1:
+            others = ", ".join(entity.object_id for entity in entities)
+            warning = (f"More than one {description} found ({others})! Only using the "
+                       f"first; set its ID in the device's settings to use another.")
+        return entities[0], warning
+
+    async def listEntities(self, node, dev, devinfo):
+        """Find the entities the device is going to use on its node, and update the
+        entity cache"""
+        # The node's devices all choose from the same listing.
+        async with node.list_lock:
+            if node.entities is None:
+                [node.entities, _] = await node.api.list_entities_services()
+        for entity in node.entities:
+            self.logger.debug(f"Entity {entity}")
+        props = dev.pluginProps
+        climate, warning = self.chooseEntity(
+            [entity for entity in node.entities
+             if isinstance(entity, aioesphomeapi.model.ClimateInfo)],
+            props.get("climateEntity", ""), "climate entity")
+        if warning:
+            self.logger.warning(f"\"{dev.name}\": {warning}")
+        if not climate:
+            raise RuntimeError("No climate entity found on ESPHome device")
+        vane, warning = self.chooseEntity(
+            [entity for entity in node.entities
+             if isinstance(entity, aioesphomeapi.model.SelectInfo) and 'down' in entity.options],
+            props.get("verticalVaneEntity", ""), "select with 'down' option")
+        if warning:
+            self.logger.warning(f"\"{dev.name}\": {warning}")
+        self.logger.debug(f"Found climate key {climate.key}")
+        devinfo.climate_key = climate.key
+        devinfo.supported_modes = climate.supported_modes
+        devinfo.supported_fan_speeds = climate.supported_fan_modes
+        devinfo.min_setpoint = None
+        devinfo.max_setpoint = None
+        # Devices that don't set their limits report them as 0
+        if climate.visual_min_temperature < climate.visual_max_temperature:
+            devinfo.min_setpoint = climate.visual_min_temperature
+            devinfo.max_setpoint = climate.visual_max_temperature
+        devinfo.vertical_vane_key = None
+        if vane:
+            self.logger.debug(f"Found vertical vane key {vane.key}")
+            devinfo.vertical_vane_key = vane.key
+            devinfo.supported_vertical_vane_modes = vane.options
+        devinfo.sensors = {}
+        sensors = {entity.object_id: entity for entity in node.entities
+                   if isinstance(entity, aioesphomeapi.model.SensorInfo)}
+        for prop, state_id in kSensorStates.items():
+            object_id = props.get(prop, "")
+            if not object_id:
+                continue
+            sensor = sensors.get(object_id)
+            if sensor is None:
+                raise RuntimeError(f"No sensor with ID '{object_id}' found on ESPHome device")
+            self.logger.debug(f"Found {state_id} sensor key {sensor.key}")
+            devinfo.sensors[state_id] = (sensor.key, sensor.accuracy_decimals,
+                                         sensor.unit_of_measurement)
+        device_info = node.device_info
+        devinfo.entity_cache = json.dumps({
+            "mac_address": device_info.mac_address,
+            "compilation_time": device_info.compilation_time,
+            "entity_ids": self.entityIds(dev),
+            "climate_key": devinfo.climate_key,
+            "supported_modes": [int(mode) for mode in devinfo.supported_modes],
+            "supported_fan_speeds": [int(speed) for speed in devinfo.supported_fan_speeds],
+            "min_setpoint": devinfo.min_setpoint,
+            "max_setpoint": devinfo.max_setpoint,
+            "vertical_vane_key": devinfo.vertical_vane_key,
+            "supported_vertical_vane_modes": devinfo.supported_vertical_vane_modes,
+            "sensors": devinfo.sensors,
+        }, sort_keys=True)
+
+    async def onDisconnect(self, node, expected_disconnect):
+        self.logger.debug(f"onDisconnect of {node.name}")
+        node.connected.clear()
+        node.device_info = None
+        node.entities = None
+        self.noteDeviceDown([devinfo for _, devinfo in node.devices.values()])
+        for dev, devinfo in list(node.devices.values()):
+            devinfo.connected.clear()
+            dev.updateStateOnServer('connectionState', 'disconnected')
+            dev.setErrorStateOnServer("Disconnected")
+
+    async def onConnectError(self, node, err):
+        names = ", ".join(f"\"{dev.name}\"" for dev, _ in node.devices.values())
+        self.logger.error(f"onConnectError of {node.name} ({names})")
+        node.connected.clear()
+        self.noteDeviceDown([devinfo for _, devinfo in node.devices.values()])
         self.logger.exception(err)
-        dev.setErrorStateOnServer("Connection Error")
+        for dev, devinfo in list(node.devices.values()):
+            devinfo.connected.clear()
+            dev.updateStateOnServer('connectionState', 'error')
+            dev.setErrorStateOnServer("Connection Error")
+
+    # Indigo plugin method
+    def didDeviceCommPropertyChange(self, origDev, newDev):
+        # The plugin stores its own information (such as the entity cache) in the
+        # device props; only a change to the connection settings needs a restart.
+        for key in ("address", "port", "password", "psk", *kEntityProps):
+            if origDev.pluginProps.get(key) != newDev.pluginProps.get(key):
+                return True
+        return False
 
     # Indigo plugin method
     def deviceStopComm(self, dev):
         self.logger.debug("deviceStopComm()")
         # Called when communication with the hardware should be shutdown.
-        future = asyncio.run_coroutine_threadsafe(self.asyncDeviceStopComm(dev), self.loop)
-        try:
-            future.result()
-        except Exception as exc:
-            self.logger.exception(exc)
+        # Forget the device right away, so that a deviceStartComm() that follows
+        # (e.g. after editing the device) gets a fresh DeviceInfo while the old
+        # connection is still being torn down.
+        devinfo = self.devices.pop(dev.id, None)
+        if not devinfo:
+            self.logger.warning(f"deviceStopComm() for unknown device \"{dev.name}\"")
+            return
+        if devinfo.command_task:
+            self.loop.call_soon_threadsafe(devinfo.command_task.cancel)
+        if devinfo.flush_handle:
+            self.loop.call_soon_threadsafe(devinfo.flush_handle.cancel)
+        self.runAsync(dev, self.asyncDeviceStopComm(dev, devinfo))
 
-    async def asyncDeviceStopComm(self, dev):
+    async def asyncDeviceStopComm(self, dev, devinfo):
         self.logger.debug("asyncDeviceStopComm()")
-        devinfo = self.devices[dev.id]
-        await devinfo.reconnect_logic.stop()
-        await devinfo.api.disconnect()
-        del self.devices[dev.id]
+        node = devinfo.node
+        if node is not None and node.devices.get(dev.id, (None, None))[1] is devinfo:
+            del node.devices[dev.id]
+            keys = [key for key, (other, _) in node.routes.items() if other.id == dev.id]
+            for key in keys:
+                del node.routes[key]
+            # The subscription's filter still lets their states through (routeState()
+            # drops them), but a device using them again needs a new subscription to
+            # be sent their current states.
+            node.subscribed_keys = node.subscribed_keys.difference(keys)
+            if not node.devices:
+                # Forget the node right away, so that a device started while this
+                # connection is being torn down gets a new one.
+                if self.nodes.get(node.key) is node:
+                    del self.nodes[node.key]
+                if node.unsubscribe_states is not None:
+                    node.unsubscribe_states()
+                    node.unsubscribe_states = None
+                await node.reconnect_logic.stop()
+                await node.api.disconnect()
+        # The outage might only have been waiting for this device.
+        self.checkFleetRecovered()
 
     # Indigo plugin method
     # Main thermostat action bottleneck called by Indigo Server.
@@ -517,13 +1148,275 @@ class Plugin(indigo.PluginBase):
         dev = indigo.devices[action.deviceId]
         self.climateCommand(dev, vertical_vane_mode = action.props['newVerticalVaneMode'])
 
-    async def climateTask(self, devinfo, climate_kwargs, select_kwargs):
-        self.logger.debug("climateTask() sleeping to allow cancellation.")
-        await asyncio.sleep(1)
-        self.logger.debug(f"climateTask() slept. Calling api.climate_command('{climate_kwargs}')")
+    def commandDebounce(self, devinfo):
+        """Seconds to hold a command so that following ones can be merged into it"""
+        if devinfo.ack_latency is None:
+            return kCommandMinDebounce
+        return min(kCommandMaxDebounce,
+                   max(kCommandMinDebounce, devinfo.ack_latency * kCommandDebounceRatio))
+
+    @staticmethod
+    def commandMatchesState(devinfo, command, state):
+        """Whether a ClimateState shows the settings a climate_command() asked for"""
+        if state.mode != command['mode'] or state.fan_mode != command['fan_mode']:
+            return False
+        # Without a setpoint on both sides (a missing or NaN one was requested, or the
+        # device reports NaN in a mode that has none) there's nothing more to compare.
+        target = command.get('target_temperature')
+        if (target is None or not math.isfinite(target)
+            or not math.isfinite(state.target_temperature)):
+            return True
+        # The device clamps a setpoint outside its limits to the nearest one
+        if devinfo.min_setpoint is not None:
+            target = min(devinfo.max_setpoint, max(devinfo.min_setpoint, target))
+        return abs(state.target_temperature - target) <= kSetpointTolerance
+
+    def checkCommandAcknowledged(self, dev, devinfo, state):
+        """Complete the command in flight if the device's reported state matches it"""
+        command = devinfo.command_in_flight
+        if command is None or not self.commandMatchesState(devinfo, command, state):
+            return
+        latency = time.monotonic() - devinfo.command_sent_time
+        devinfo.command_in_flight = None
+        devinfo.command_sent_time = None
+        devinfo.command_acked.set()
+        devinfo.commands_acked += 1
+        if devinfo.ack_latency is None:
+            devinfo.ack_latency = latency
+        else:
+            devinfo.ack_latency += kAckLatencySmoothing * (latency - devinfo.ack_latency)
+        bucket = 0
+        while bucket < len(kAckLatencyBuckets) and latency > kAckLatencyBuckets[bucket]:
+            bucket += 1
+        devinfo.ack_latency_histogram[bucket] += 1
+        self.logger.debug(
+            f"Command acknowledged in {latency:.3f}s (smoothed {devinfo.ack_latency:.3f}s)")
+        kvl = []
+        self.addKvl(kvl, 'commandLatency', round(latency, 3))
+        self.addKvl(kvl, 'commandLatencyAverage', round(devinfo.ack_latency, 3))
+        self.addKvl(kvl, 'commandLatencyHistogram', self.latencyHistogramText(devinfo))
+        self.queueStates(dev, devinfo, kvl)
+
+    @staticmethod
+    def latencyHistogramText(devinfo):
+        """The device's acknowledgement latency histogram, as shown in its state"""
+        buckets = []
+        lower = 0
+        for upper, count in zip(kAckLatencyBuckets, devinfo.ack_latency_histogram):
+            buckets.append(f"{lower}-{upper}s: {count}")
+            lower = upper
+        buckets.append(f">{lower}s: {devinfo.ack_latency_histogram[-1]}")
+        return ", ".join(buckets)
+
+    async def sendCommand(self, devinfo, command):
+        """Send a command_in_flight dict: its climate_command(), then its vane position"""
+        climate_kwargs = dict(command)
+        vertical_vane_mode = climate_kwargs.pop('vertical_vane_mode', None)
+        self.logger.debug(f"sendCommand() Calling api.climate_command('{climate_kwargs}')")
         await devinfo.api.climate_command(key = devinfo.climate_key, **climate_kwargs)
-        self.logger.debug(f"climateTask() Calling api.select_command('{select_kwargs}')")
-        await devinfo.api.select_command(key = devinfo.vertical_vane_key, **select_kwargs)
+        if vertical_vane_mode is not None:
+            self.logger.debug(
+                f"sendCommand() Calling api.select_command('{vertical_vane_mode}')")
+            await devinfo.api.select_command(key = devinfo.vertical_vane_key,
+                                             state = vertical_vane_mode)
+            devinfo.vertical_vane_mode = vertical_vane_mode
+
+    async def waitForCommandAcknowledged(self, dev, devinfo):
+        """Wait for the command in flight to be acknowledged (or replaced by a newer
+        one), resending it on timeout.
+
+        Returns False if the command was resent and needs waiting for again.
+        """
+        try:
+            await asyncio.wait_for(devinfo.command_acked.wait(), kCommandAckTimeout)
+            return True
+        except asyncio.TimeoutError:
+            pass
+        command = devinfo.command_in_flight
+        if devinfo.pending_command is None and devinfo.command_attempts <= kCommandMaxRetries:
+            self.logger.info(f"No response from \"{dev.name}\" to command; retrying")
+            devinfo.command_attempts += 1
+            devinfo.command_retries += 1
+            self.queueStates(dev, devinfo, [{'key':'commandRetries',
+                                             'value':devinfo.command_retries}])
+            await self.sendCommand(devinfo, command)
+            return False
+        if devinfo.pending_command is None:
+            self.logger.warning(
+                f"\"{dev.name}\" never applied command {command} after "
+                f"{devinfo.command_attempts} attempts")
+            devinfo.commands_lost += 1
+            self.queueStates(dev, devinfo, [{'key':'commandsLost',
+                                             'value':devinfo.commands_lost}])
+        # else a newer command is about to replace it anyway.
+        devinfo.command_in_flight = None
+        devinfo.command_sent_time = None
+        devinfo.command_acked.set()
+        return True
+
+    def queueCommand(self, dev, devinfo, kwargs, explicit):
+        """Merge a command into the device's pending command and make sure it gets sent.
+
+        Must be called on the event loop thread.
+        """
+        if devinfo.pending_command is None:
+            devinfo.pending_command = dict(kwargs)
+            devinfo.pending_explicit = set(explicit)
+        else:
+            # Values that were filled in from (possibly stale) Indigo states don't
+            # override values an earlier command explicitly asked for.
+            for key, value in kwargs.items():
+                if key in explicit or key not in devinfo.pending_explicit:
+                    devinfo.pending_command[key] = value
+            devinfo.pending_explicit |= explicit
+        if devinfo.command_in_flight is not None:
+            # The newer command replaces the one in flight, so stop waiting for
+            # that to be acknowledged (or resending it) and send this at once.
+            devinfo.command_acked.set()
+        if not devinfo.command_task:
+            devinfo.command_task = self.loop.create_task(self.commandTask(dev, devinfo))
+
+    async def commandTask(self, dev, devinfo):
+        try:
+            while devinfo.pending_command is not None or devinfo.command_in_flight is not None:
+                # Don't stack commands up on the serial link while the device is
+                # still applying the previous one.
+                if devinfo.command_in_flight is not None:
+                    if not await self.waitForCommandAcknowledged(dev, devinfo):
+                        continue
+                if devinfo.pending_command is None:
+                    break
+                await asyncio.sleep(self.commandDebounce(devinfo))
+                if not devinfo.connected.is_set():
+                    # Hold the command (merging any later ones into it) until the
+                    # device is back; connectPriority() moves it up the queue.
+                    self.logger.info(
+                        f"\"{dev.name}\" is not connected; holding command until it reconnects")
+                    try:
+                        await asyncio.wait_for(devinfo.connected.wait(),
+                                               kDisconnectedCommandTimeout)
+                    except asyncio.TimeoutError:
+                        raise aioesphomeapi.APIConnectionError(
+                            f"not connected after {kDisconnectedCommandTimeout:.0f}s")
+                command = devinfo.pending_command
+                devinfo.pending_command = None
+                devinfo.pending_explicit = set()
+                # Only send the vane position if it's changing; every frame costs time
+                # on the serial link. A resend repeats it along with the rest.
+                if (devinfo.vertical_vane_key is None
+                    or command['vertical_vane_mode'] == devinfo.vertical_vane_mode):
+                    del command['vertical_vane_mode']
+
+                devinfo.command_in_flight = command
+                devinfo.command_attempts = 1
+                devinfo.command_sent_time = time.monotonic()
+                devinfo.command_acked.clear()
+                await self.sendCommand(devinfo, command)
+        except aioesphomeapi.APIConnectionError as err:
+            self.logger.error(f"Could not send command to \"{dev.name}\": {err}")
+            devinfo.pending_command = None
+            devinfo.pending_explicit = set()
+            devinfo.command_in_flight = None
+            devinfo.command_sent_time = None
+            devinfo.command_acked.set()
+        finally:
+            devinfo.command_task = None
+
+    # Menu item callback
+    def logCommandStatistics(self):
+        self.logger.info(f"Protobuf backend: {kProtobufBackend}")
+        for dev_id, devinfo in list(self.devices.items()):
+            name = indigo.devices[dev_id].name
+            average = "n/a" if devinfo.ack_latency is None else f"{devinfo.ack_latency:.3f}s"
+            write_stats = devinfo.api.write_stats if devinfo.api else None
+            if write_stats is None:
+                writes = "not connected"
+            else:
+                writes = (f"{write_stats.packets} packets in {write_stats.writes} writes, "
+                          f"at most {write_stats.largest_batch} per write")
+            self.logger.info(
+                f"\"{name}\": {devinfo.commands_acked} commands acknowledged, "
+                f"{devinfo.command_retries} retries, {devinfo.commands_lost} lost, "
+                f"smoothed latency {average}; latency histogram {self.latencyHistogramText(devinfo)}; "
+                f"{devinfo.state_writes} state writes, "
+                f"{devinfo.state_writes_avoided} avoided; {writes}")
+
+    def publishConnectionStats(self):
+        """Write each device's node connection statistics to its states, then reschedule.
+
+        Disconnected devices are skipped: writing their states would clear the error
+        state that shows them as disconnected. Must be called on the event loop thread.
+        """
+        self.stats_handle = self.loop.call_later(kConnectionStatsInterval,
+                                                 self.publishConnectionStats)
+        now = time.monotonic()
+        for dev_id, devinfo in list(self.devices.items()):
+            stats = devinfo.stats
+            if stats is None:
+                continue
+            received = stats.total_received
+            elapsed = now - devinfo.stats_last_time
+            rate = 0.0
+            if elapsed > 0:
+                rate = (received - devinfo.stats_last_received) * 60.0 / elapsed
+            devinfo.stats_last_received = received
+            devinfo.stats_last_time = now
+            if not devinfo.connected.is_set():
+                continue
+            kvl = []
+            self.addKvl(kvl, 'messagesReceived', received)
+            self.addKvl(kvl, 'messageRate', round(rate, 1))
+            self.addKvl(kvl, 'bytesReceived', stats.bytes_received)
+            self.addKvl(kvl, 'bytesSent', stats.bytes_sent)
+            self.addKvl(kvl, 'processingTime', round(stats.total_processing_time, 3))
+            self.addKvl(kvl, 'decodeErrors', stats.decode_errors)
+            self.addKvl(kvl, 'disconnects', stats.disconnects)
+            self.addKvl(kvl, 'connectFailures', stats.connect_failures)
+            self.queueStates(indigo.devices[dev_id], devinfo, kvl)
+
+    # Menu item callback
+    def logConnectionStatistics(self):
+        scheduler = self.connect_scheduler
+        average_wait = scheduler.total_wait / scheduler.admitted if scheduler.admitted else 0.0
+        if self.last_recovery_time is None:
+            recovery = "no full recovery yet"
+        else:
+            recovery = (f"last full recovery took {self.last_recovery_time:.1f}s "
+                        f"({self.recoveries} so far)")
+        if self.outage_start is not None:
+            down = sum(not d.connected.is_set() and not d.config_error
+                       for d in self.devices.values())
+            recovery += (f"; {down} "
+                         f"devices down for {time.monotonic() - self.outage_start:.1f}s")
+        self.logger.info(
+            f"Connections: {len(self.nodes)} for {len(self.devices)} devices; "
+            f"{scheduler.active} connecting, {scheduler.waiting} waiting, "
+            f"at most {scheduler.max_waiting} waited at once; {scheduler.admitted} attempts, "
+            f"average wait {average_wait:.1f}s; {recovery}")
+        if not self.collectStats:
+            self.logger.info("Connection statistics are turned off in the plugin config")
+        # Devices on the same node share its connection, and its statistics. Busiest
+        # nodes first, since they're the ones worth looking at.
+        nodes = []
+        for node in list(self.nodes.values()):
+            if node.stats is None:
+                continue
+            names = ", ".join(f"\"{dev.name}\"" for dev, _ in list(node.devices.values()))
+            nodes.append((f"{node.name} ({names})", node.stats))
+        nodes.sort(key=lambda item: item[1].total_received, reverse=True)
+        for name, stats in nodes:
+            self.logger.info(
+                f"{name}: {stats.total_received} messages received, "
+                f"{stats.total_sent} sent; {stats.bytes_received} bytes received, "
+                f"{stats.bytes_sent} sent; {stats.total_processing_time:.3f}s processing; "
+                f"{stats.decode_errors} decode errors, {stats.pong_timeouts} ping timeouts; "
+                f"{stats.connects} connects, {stats.connect_failures} failed, "
+                f"{stats.disconnects} disconnects")
+            for type_stats in stats.received_by_type():
+                average = type_stats.processing_time / type_stats.count * 1e6
+                self.logger.info(
+                    f"    {type_stats.name}: {type_stats.count} messages, "
+                    f"{type_stats.processing_time:.3f}s ({average:.0f}µs each)")
 
     def climateCommand(self, dev, **kwargs):
         self.logger.debug(f"climateCommand({kwargs})")
@@ -536,6 +1429,8 @@ class Plugin(indigo.PluginBase):
         # (by that same heatpump library!) after such updates, it's best to
         # set all the states we know about.
 
+        explicit = set(kwargs)
+
         def adjust(kvl, kwargs, indigoName, espName):
             if espName in kwargs:
                 self.addKvl(kvl, indigoName, kwargs[espName])
@@ -549,26 +1444,19 @@ class Plugin(indigo.PluginBase):
         setpointCool = self.getKvl(kvl, 'setpointCool')
         if setpointCool:
             self.addKvl(kvl, 'setpointHeat', setpointCool)
-        self.logger.debug(f"Updating Indigo states: {kvl}")
-        dev.updateStatesOnServer(kvl)
+        devinfo = self.devices[dev.id]
+        # Show the new settings right away. The write goes through the event loop,
+        # which owns indigo_states and pending_states; it's scheduled ahead of the
+        # command, so it's still written before any state the command brings back.
+        # A status request changes nothing, and has nothing to show.
+        if kvl:
+            self.loop.call_soon_threadsafe(self.writeStates, dev, devinfo, kvl)
 
         # Translate Indigo-world values to ESPHomeAPI values
         kwargs['target_temperature'] = self.maybeConvertToC(kwargs['target_temperature'])
         kwargs['fan_mode'] = kFanSpeedIndigoMap[kwargs['fan_mode']]
-        vertical_vane_mode = kwargs['vertical_vane_mode']
-        del kwargs['vertical_vane_mode']
         kwargs['mode'] = kHvacModeIndigoMap[kwargs['mode']]
 
-        self.logger.debug(f"running api.climate_command({kwargs})")
-        devinfo = self.devices[dev.id]
-        # The ESPHome/HeatPump system doesn't like a lot of commands
-        # in sequence. It is after all transmitting them over a
-        # 2400bps serial link. To prevent a flood of commands if
-        # there's a sequence of actions or if a user clicks an up/down
-        # button a bunch, cancel any pending climate command (which
-        # will wait for a second to allow this to happen).
-        if devinfo.command_future:
-            devinfo.command_future.cancel()
-        devinfo.command_future = asyncio.run_coroutine_threadsafe(
-            self.climateTask(devinfo, kwargs, {'state' : vertical_vane_mode}),
-            self.loop)
+        # Commands aren't sent right away; see kCommandMinDebounce.
+        self.logger.debug(f"queueing climate command {kwargs}")
+        self.loop.call_soon_threadsafe(self.queueCommand, dev, devinfo, kwargs, explicit)
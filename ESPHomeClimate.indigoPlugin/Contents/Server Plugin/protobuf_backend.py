@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The plugin bundles a pure-Python protobuf in Packages, which is slow at
+# encoding and decoding. If the Python running the plugin has its own protobuf
+# with a compiled backend (upb or the older C++ extension), use that instead.
+# This has to run before anything imports google.protobuf.
+
+import glob
+import importlib
+import os
+import sys
+
+kPackagesDir = os.path.realpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Packages"))
+
+# Compiled modules that provide a protobuf backend, relative to a google/ directory
+kCompiledBackends = (os.path.join("_upb", "_message*"),
+                     os.path.join("protobuf", "pyext", "_message*"))
+
+
+def findCompiledProtobuf():
+    """Return the google/ directory of the first protobuf outside Packages if
+    it has a compiled backend."""
+    for entry in sys.path:
+        root = os.path.realpath(entry or os.curdir)
+        if root == kPackagesDir:
+            continue
+        google_dir = os.path.join(root, "google")
+        if not os.path.isdir(os.path.join(google_dir, "protobuf")):
+            continue
+        for pattern in kCompiledBackends:
+            if glob.glob(os.path.join(google_dir, pattern)):
+                return google_dir
+        # This is the protobuf the host would use, and it's pure Python too
+        return None
+    return None
+
+
+def hideOtherProtobufs():
+    """Keep the bundled protobuf from loading parts of another one.
+
+    google is a namespace package spanning every google/ directory on sys.path,
+    and the bundled api_implementation probes for google._upb whatever
+    PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION says; a host's compiled module
+    loaded against the bundled pure-Python protobuf fails to import."""
+    import google
+    bundled = os.path.join(kPackagesDir, "google")
+    google.__path__[:] = [path for path in google.__path__
+                          if os.path.realpath(path) == bundled
+                          or not any(os.path.exists(os.path.join(path, name))
+                                     for name in ("protobuf", "_upb"))]
+
+
+def forgetProtobufModules():
+    for name in list(sys.modules):
+        if (name in ("google.protobuf", "google._upb", "aioesphomeapi")
+            or name.startswith(("google.protobuf.", "google._upb.", "aioesphomeapi."))):
+            del sys.modules[name]
+
+
+def selectProtobufBackend():
+    """Prefer a compiled protobuf from the host Python over the bundled one.
+
+    Returns (backend, error): the protobuf implementation in use ('upb', 'cpp'
+    or 'python'), and the reason a compiled protobuf that was found couldn't be
+    used, or None.
+    """
+    error = None
+    google_dir = None
+    # Honour an explicit request for the pure-Python implementation.
+    if os.environ.get("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION") != "python":
+        google_dir = findCompiledProtobuf()
+    if google_dir is not None and "google.protobuf" not in sys.modules:
+        import google
+        # google is a pkgutil namespace package, so the host's google/ can be
+        # searched first for protobuf without putting the rest of the host's
+        # site-packages ahead of the bundled packages.
+        google.__path__.insert(0, google_dir)
+        try:
+            # Building the API descriptors is the part most likely to fail with
+            # a protobuf version the generated code doesn't support.
+            importlib.import_module("aioesphomeapi.api_pb2")
+        except Exception as err:
+            error = f"{google_dir}: {err}"
+            google.__path__.remove(google_dir)
+            forgetProtobufModules()
+            hideOtherProtobufs()
+    elif "google.protobuf" not in sys.modules:
+        hideOtherProtobufs()
+
+    from google.protobuf.internal import api_implementation
+    return api_implementation.Type(), error
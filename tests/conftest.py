@@ -0,0 +1,10 @@
+"""Put the plugin's bundled packages on sys.path, as Indigo does."""
+
+import os
+import sys
+
+PACKAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "ESPHomeClimate.indigoPlugin", "Contents", "Packages")
+
+if PACKAGES not in sys.path:
+    sys.path.insert(0, PACKAGES)
@@ -0,0 +1,80 @@
+"""Tests for APIIntEnum's conversion of values reported by the firmware."""
+
+import pytest
+
+from aioesphomeapi.model import (
+    ClimateFanMode,
+    ClimateInfo,
+    ClimateMode,
+    ClimatePreset,
+    ClimateSwingMode,
+)
+
+
+def convert_by_call(cls, value):
+    """The conversion convert() replaces: calling the enum class."""
+    try:
+        return cls(value)
+    except ValueError:
+        return None
+
+
+def test_convert_known_value():
+    assert ClimateMode.convert(3) is ClimateMode.HEAT
+    assert ClimateMode.convert(ClimateMode.COOL) is ClimateMode.COOL
+    assert ClimateFanMode.convert(0) is ClimateFanMode.ON
+
+
+@pytest.mark.parametrize("value", [-1, 7, 99, 2**32])
+def test_convert_unknown_value(value):
+    assert ClimateMode.convert(value) is None
+
+
+@pytest.mark.parametrize("value", [[1], {}, "1", None, b"\x01", 1.5])
+def test_convert_invalid_value(value):
+    # The conversion it replaces returned None for these, unhashable or not
+    assert ClimateMode.convert(value) is None
+    assert ClimateMode.convert(value) is convert_by_call(ClimateMode, value)
+    assert ClimateMode.convert_list([value, 1]) == [ClimateMode.HEAT_COOL]
+
+
+def test_convert_bool():
+    # bool is an int subclass, and protobuf hands some fields over as bools
+    assert ClimateMode.convert(False) is ClimateMode.OFF
+    assert ClimateMode.convert(True) is ClimateMode.HEAT_COOL
+    assert ClimateMode.convert_list([True, False]) == [
+        ClimateMode.HEAT_COOL,
+        ClimateMode.OFF,
+    ]
+
+
+@pytest.mark.parametrize(
+    "cls", [ClimateMode, ClimateFanMode, ClimateSwingMode, ClimatePreset]
+)
+def test_convert_matches_calling_the_class(cls):
+    for value in [*range(-2, 20), True, False]:
+        assert cls.convert(value) is convert_by_call(cls, value)
+    assert cls._by_value == cls._value2member_map_
+
+
+def test_convert_list_drops_unknown_values():
+    assert ClimateMode.convert_list([0, 42, 2, -1, 6, 7]) == [
+        ClimateMode.OFF,
+        ClimateMode.COOL,
+        ClimateMode.AUTO,
+    ]
+    assert ClimateMode.convert_list([]) == []
+    assert ClimateMode.convert_list([42]) == []
+
+
+def test_convert_list_keeps_order_and_duplicates():
+    assert ClimateFanMode.convert_list([9, 2, 9]) == [
+        ClimateFanMode.QUIET,
+        ClimateFanMode.AUTO,
+        ClimateFanMode.QUIET,
+    ]
+
+
+def test_model_drops_unknown_modes():
+    info = ClimateInfo.from_dict({"supported_modes": [1, 100, 3]})
+    assert info.supported_modes == [ClimateMode.HEAT_COOL, ClimateMode.HEAT]
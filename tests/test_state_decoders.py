@@ -0,0 +1,161 @@
+"""Differential fuzz test: the state decoders must agree with protobuf.
+
+Every input, valid or not, is decoded both by the decoder and by the protobuf
+runtime (MergeFromString then from_pb); the results, or the exceptions raised,
+must be the same.
+"""
+
+import random
+import struct
+
+import pytest
+
+from aioesphomeapi.api_pb2 import (
+    ClimateStateResponse,
+    SelectStateResponse,
+    SensorStateResponse,
+)
+from aioesphomeapi.model import ClimateState, SelectState, SensorState
+from aioesphomeapi.state_decoders import make_state_decoder
+
+from google.protobuf.descriptor import FieldDescriptor
+
+MESSAGES = [
+    (ClimateStateResponse, ClimateState),
+    (SelectStateResponse, SelectState),
+    (SensorStateResponse, SensorState),
+]
+
+SEED = 20240601
+ROUNDS = 300
+
+
+def random_float(rng):
+    return rng.choice([
+        0.0, -0.0, 21.5, -40.0, float("inf"), float("nan"),
+        struct.unpack("<f", struct.pack("<I", rng.getrandbits(32)))[0],
+    ])
+
+
+def random_message(rng, pb_type):
+    """A valid message with a random subset of its fields set."""
+    msg = pb_type()
+    for field in pb_type.DESCRIPTOR.fields:
+        if rng.random() < 0.3:
+            continue
+        if field.type == FieldDescriptor.TYPE_FIXED32:
+            value = rng.getrandbits(32)
+        elif field.type == FieldDescriptor.TYPE_FLOAT:
+            value = random_float(rng)
+        elif field.type == FieldDescriptor.TYPE_BOOL:
+            value = rng.random() < 0.5
+        elif field.type == FieldDescriptor.TYPE_ENUM:
+            value = rng.choice(list(field.enum_type.values_by_number))
+        else:
+            value = rng.choice(["", "Auto", "Quiet", "Ünïcødé", "x" * 200])
+        setattr(msg, field.name, value)
+    return msg.SerializeToString()
+
+
+def mutate(rng, data):
+    """data with a few random bytes flipped, inserted, deleted or appended."""
+    data = bytearray(data)
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        pos = rng.randint(0, len(data))
+        if choice < 0.4 and pos < len(data):
+            data[pos] = rng.getrandbits(8)
+        elif choice < 0.6:
+            data[pos:pos] = bytes([rng.getrandbits(8)])
+        elif choice < 0.8 and pos < len(data):
+            del data[pos]
+        else:
+            # An unknown field, or a repeat of a known one
+            data += bytes([(rng.randint(1, 20) << 3) | rng.choice([0, 1, 2, 5])])
+            data += bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 9)))
+    return bytes(data)
+
+
+def reference(pb_type, model_type, data):
+    msg = pb_type()
+    msg.MergeFromString(data)
+    return model_type.from_pb(msg)
+
+
+def outcome(decode, *args):
+    """repr() of decode's result (so NaN and -0.0 compare), or the exception."""
+    try:
+        return repr(decode(*args))
+    except Exception as err:  # pylint: disable=broad-except
+        return type(err)
+
+
+def check(pb_type, model_type, data):
+    decoder = make_state_decoder(pb_type, model_type)
+    expected = outcome(reference, pb_type, model_type, data)
+    assert outcome(decoder, data) == expected, data.hex()
+    # The frame helpers pass a memoryview into their receive buffer
+    buffer = bytearray(b"\xff\x01" + data + b"\x0d\x02")
+    view = memoryview(buffer)[2 : 2 + len(data)]
+    assert outcome(decoder, view) == expected, data.hex()
+
+
+@pytest.mark.parametrize("pb_type, model_type", MESSAGES)
+def test_valid(pb_type, model_type):
+    rng = random.Random(SEED)
+    check(pb_type, model_type, b"")
+    for _ in range(ROUNDS):
+        check(pb_type, model_type, random_message(rng, pb_type))
+
+
+@pytest.mark.parametrize("pb_type, model_type", MESSAGES)
+def test_mutated(pb_type, model_type):
+    rng = random.Random(SEED)
+    for _ in range(ROUNDS * 3):
+        check(pb_type, model_type, mutate(rng, random_message(rng, pb_type)))
+
+
+@pytest.mark.parametrize("pb_type, model_type", MESSAGES)
+def test_truncated(pb_type, model_type):
+    rng = random.Random(SEED)
+    for _ in range(ROUNDS // 10):
+        data = random_message(rng, pb_type)
+        for end in range(len(data)):
+            check(pb_type, model_type, data[:end])
+
+
+@pytest.mark.parametrize("pb_type, model_type", MESSAGES)
+def test_random_bytes(pb_type, model_type):
+    rng = random.Random(SEED)
+    for _ in range(ROUNDS):
+        check(pb_type, model_type,
+              bytes(rng.getrandbits(8) for _ in range(rng.randint(1, 40))))
+
+
+def varint(value):
+    value &= 0xFFFFFFFFFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if not value:
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+@pytest.mark.parametrize("pb_type, model_type", MESSAGES)
+def test_enum_values(pb_type, model_type):
+    """Enum values the enum doesn't define, negative ones included, decode as
+    protobuf decodes them, and the last value on the wire wins."""
+    rng = random.Random(SEED)
+    for field in pb_type.DESCRIPTOR.fields:
+        if field.type != FieldDescriptor.TYPE_ENUM:
+            continue
+        tag = bytes([field.number << 3])
+        known = list(field.enum_type.values_by_number)
+        for value in [-1, max(known) + 1, 99, 2**31, 2**32 + known[-1], *known]:
+            valid = random_message(rng, pb_type)
+            check(pb_type, model_type, valid + tag + varint(value))
+            check(pb_type, model_type,
+                  tag + varint(rng.choice(known)) + tag + varint(value))
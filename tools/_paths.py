@@ -0,0 +1,20 @@
+"""Put the plugin's bundled packages, the plugin itself and the stub indigo module
+on sys.path, so the tools run from a checkout without Indigo.
+
+Import this before anything from the plugin. Setting ESPHOME_CLIMATE_CONTENTS
+to another copy of the bundle's Contents folder runs the tools against that
+copy instead (see compare.py)."""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTENTS = (os.environ.get("ESPHOME_CLIMATE_CONTENTS")
+            or os.path.join(ROOT, "ESPHomeClimate.indigoPlugin", "Contents"))
+PACKAGES = os.path.join(CONTENTS, "Packages")
+SERVER_PLUGIN = os.path.join(CONTENTS, "Server Plugin")
+STUB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub")
+
+for path in (STUB, SERVER_PLUGIN, PACKAGES):
+    if path not in sys.path:
+        sys.path.insert(0, path)
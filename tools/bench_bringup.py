@@ -0,0 +1,66 @@
+"""Benchmark: fleet bring-up and shutdown time against fake ESPHome nodes.
+
+Starts the plugin with N devices, each on its own fake node, and measures
+
+  - how long deviceStartComm() holds Indigo's thread, over all devices
+  - the time from the first deviceStartComm() until every device has written
+    its first climate state (works against plugin versions that predate the
+    connectionState state)
+  - how long deviceStopComm() holds Indigo's thread, over all devices
+
+    python tools/bench_bringup.py --devices 20
+    python tools/compare.py <revision> tools/bench_bringup.py --devices 20
+
+Devices are started one after another from the calling thread, the way Indigo
+starts them when the plugin is enabled or restarted. --response-delay makes
+the fake nodes answer like nodes on Wi-Fi; without it a connect on localhost
+is almost all CPU, and starting connects in parallel gains little.
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+import _paths  # noqa: F401
+
+from harness import FakeNodes, Harness, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--response-delay", type=float, default=0.05,
+                        help="seconds each fake node takes to answer a request")
+    parser.add_argument("--psk", help="base64 Noise key to encrypt the connections with")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR, format="%(levelname)s %(name)s: %(message)s")
+
+    nodes = FakeNodes(args.devices, psk=args.psk, response_delay=args.response_delay)
+    harness = Harness()
+    try:
+        for port in nodes.ports:
+            harness.addDevice(port, psk=args.psk)
+        start = time.monotonic()
+        harness.startDevices()
+        if not harness.waitReporting(args.timeout):
+            print(f"Only {len(harness.reporting)} of {args.devices} devices reported "
+                  f"within {args.timeout:.0f}s")
+        all_reporting = time.monotonic() - start
+        latencies = harness.reportLatencies()
+        print(f"{args.devices} devices{' (Noise)' if args.psk else ''}")
+        print(f"deviceStartComm(): {harness.start_comm_time * 1000:.1f}ms of Indigo's thread")
+        if latencies:
+            print(f"first state: median {statistics.median(latencies):.3f}s, "
+                  f"p95 {percentile(latencies, 0.95):.3f}s; "
+                  f"all devices reporting after {all_reporting:.3f}s")
+        harness.stopDevices()
+        print(f"deviceStopComm(): {harness.stop_comm_time * 1000:.1f}ms of Indigo's thread")
+    finally:
+        harness.close()
+        nodes.close()
+
+
+if __name__ == "__main__":
+    main()
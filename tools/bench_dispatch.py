@@ -0,0 +1,92 @@
+"""Benchmark: dispatching received messages to many subscriptions.
+
+Feeds pre-encoded packets straight to an APIConnection's packet processor,
+skipping the socket and frame helper, with a number of handlers subscribed to
+the sensor states being received, alongside standing subscriptions for logs and
+BLE advertisements. Reports the time per message as the handler count grows,
+for sensor states and for messages with no fields, which skip decoding and so
+show the dispatch cost itself more clearly.
+It also subscribes and unsubscribes many short-lived handlers, as log and BLE
+subscribers come and go, and reports the handler table entries left behind.
+
+    python tools/bench_dispatch.py
+    python tools/compare.py <revision> tools/bench_dispatch.py
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import time
+
+import _paths  # noqa: F401
+
+from aioesphomeapi import api_pb2 as pb
+from aioesphomeapi.connection import APIConnection, ConnectionParams
+from aioesphomeapi.core import MESSAGE_TYPE_TO_PROTO
+
+PROTO_TO_MESSAGE_TYPE = {proto: msg_type for msg_type, proto in MESSAGE_TYPE_TO_PROTO.items()}
+
+
+def make_connection():
+    values = dict(address="127.0.0.1", port=6053, password=None, client_info="bench",
+                  keepalive=20.0, zeroconf_instance=None, noise_psk=None,
+                  expected_name=None, batch_writes=False, stats=None)
+    # Older versions have fewer parameters
+    params = ConnectionParams(**{field.name: values[field.name]
+                                 for field in dataclasses.fields(ConnectionParams)})
+    return APIConnection(params, None)
+
+
+async def bench(args):
+    cases = [
+        (pb.SensorStateResponse, pb.SensorStateResponse(key=1234, state=21.5).SerializeToString()),
+        (pb.TextSensorStateResponse, b""),
+    ]
+    print(f"{'handlers':>8} {'sensor state':>14} {'empty message':>14}")
+    for count in args.handlers:
+        results = []
+        for proto, data in cases:
+            connection = make_connection()
+            process = connection._process_packet_factory()
+            for _ in range(args.background):
+                connection.add_message_callback(lambda msg: None, (pb.SubscribeLogsResponse,))
+                connection.add_message_callback(
+                    lambda msg: None, (pb.BluetoothLEAdvertisementResponse,))
+            for _ in range(count):
+                connection.add_message_callback(lambda msg: None, (proto,))
+            msg_type = PROTO_TO_MESSAGE_TYPE[proto]
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for _ in range(args.messages):
+                    process(msg_type, data)
+                best = min(best, time.perf_counter() - start)
+            results.append(best / args.messages)
+        print(f"{count:>8}" + "".join(f"{result * 1e9:>12,.0f}ns" for result in results))
+
+    connection = make_connection()
+    msg_types = [proto for proto in MESSAGE_TYPE_TO_PROTO.values()
+                 if proto.__name__.endswith("Response")]
+    for i in range(args.churn):
+        remove = connection.add_message_callback(lambda msg: None, (msg_types[i % len(msg_types)],))
+        remove()
+    entries = connection._message_handlers
+    print(f"after {args.churn} subscribe/unsubscribe cycles over {len(msg_types)} message "
+          f"types: {len(entries)} handler entries left, "
+          f"{sum(1 for handlers in entries.values() if not handlers)} of them empty")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--handlers", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="handlers subscribed to the messages received")
+    parser.add_argument("--background", type=int, default=8,
+                        help="log and BLE advertisement subscriptions each")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--churn", type=int, default=1000)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
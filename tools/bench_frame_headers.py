@@ -0,0 +1,92 @@
+"""Benchmark: plaintext frame headers, on receive and on send.
+
+Every plaintext frame starts with a header of a zero byte, the data length and
+the message type, each a varuint. This measures frames per second through
+APIPlaintextFrameHelper.data_received() and write_packet() for frames whose
+length and type take one byte each (the usual case), a two-byte length, and a
+two-byte message type.
+
+    python tools/bench_frame_headers.py
+    python tools/compare.py <revision> tools/bench_frame_headers.py
+"""
+
+import argparse
+import asyncio
+import time
+
+import _paths  # noqa: F401
+
+from aioesphomeapi._frame_helper import APIPlaintextFrameHelper
+from aioesphomeapi.util import varuint_to_bytes
+
+# (label, message type, data length)
+CASES = [
+    ("1-byte length and type", 47, 30),
+    ("2-byte length", 47, 300),
+    ("2-byte type", 130, 30),
+]
+
+
+class NullTransport(asyncio.Transport):
+    def write(self, data):
+        pass
+
+    def writelines(self, chunks):
+        pass
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+
+def frame(msg_type, data):
+    return b"\0" + varuint_to_bytes(len(data)) + varuint_to_bytes(msg_type) + data
+
+
+def best_rate(func, count, repeat):
+    """Return the best rate, in calls per second, over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+async def bench(args):
+    helper = APIPlaintextFrameHelper(
+        lambda msg_type, data: None, lambda exc: print("error:", exc), "bench", "bench")
+    helper.connection_made(NullTransport())
+    print(f"{'':<24} {'receive':>14} {'send':>14}")
+    for label, msg_type, length in CASES:
+        data = bytes(length)
+        # Frames arrive a segment's worth at a time
+        per_call = max(1, 1460 // len(frame(msg_type, data)))
+        chunk = frame(msg_type, data) * per_call
+        calls = args.frames // per_call
+
+        def receive():
+            for _ in range(calls):
+                helper.data_received(chunk)
+
+        def send():
+            for _ in range(args.frames):
+                helper.write_packet(msg_type, data)
+
+        received = best_rate(receive, calls * per_call, args.repeat)
+        sent = best_rate(send, args.frames, args.repeat)
+        print(f"{label:<24} {received:>10,.0f} f/s {sent:>10,.0f} f/s")
+    helper.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark: building model objects from protobuf messages.
+
+Every state update is turned into a model dataclass with from_pb(). This
+measures from_pb() calls per second for ClimateState, with a mix of modes,
+fan modes, presets and temperatures, and for a few other state and entity
+classes.
+
+    python tools/bench_from_pb.py
+    python tools/compare.py <revision> tools/bench_from_pb.py
+"""
+
+import argparse
+import random
+import time
+
+import _paths  # noqa: F401
+
+from aioesphomeapi import api_pb2 as pb
+from aioesphomeapi import model
+from google.protobuf.internal import api_implementation
+
+
+def climate_states(count):
+    rng = random.Random(1)
+    return [pb.ClimateStateResponse(
+        key=rng.randrange(1 << 32), mode=rng.choice([0, 1, 2, 3, 4, 5]),
+        current_temperature=rng.uniform(15, 30), target_temperature=rng.uniform(16, 31),
+        action=rng.choice([0, 2, 3, 4, 5, 6]), fan_mode=rng.choice([0, 2, 3, 4, 5]),
+        swing_mode=rng.choice([0, 1]), custom_fan_mode=rng.choice(["", "quiet"]),
+        preset=rng.choice([0, 1, 2]))
+        for _ in range(count)]
+
+
+def messages(count):
+    """Return (label, model class, messages) for each case."""
+    rng = random.Random(2)
+    return [
+        ("ClimateState", model.ClimateState, climate_states(count)),
+        ("SensorState", model.SensorState,
+         [pb.SensorStateResponse(key=i, state=rng.uniform(-20, 40)) for i in range(count)]),
+        ("SelectState", model.SelectState,
+         [pb.SelectStateResponse(key=i, state="swing") for i in range(count)]),
+        ("ClimateInfo", model.ClimateInfo,
+         [pb.ListEntitiesClimateResponse(
+             object_id="climate", key=i, name="Climate",
+             supported_modes=[0, 2, 3, 4], supported_fan_modes=[2, 3, 4],
+             visual_min_temperature=16, visual_max_temperature=31)
+          for i in range(count // 10)]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=20000, help="messages per case")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"protobuf backend: {api_implementation.Type()}")
+    for label, cls, msgs in messages(args.count):
+        from_pb = cls.from_pb
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for msg in msgs:
+                from_pb(msg)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<14} {len(msgs) / best:>10,.0f} calls/s  {best / len(msgs) * 1e6:.2f}µs each")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: how long importing plugin.py takes, and what it loads.
+
+Indigo imports plugin.py before it calls startup(), so everything imported at
+module level delays the plugin host becoming ready. This imports the plugin in
+fresh interpreters with -X importtime and reports
+
+  - the median wall time of "import plugin" over --runs runs, after one run
+    to write the .pyc files
+  - the cumulative import time of the heavy modules, or "not loaded"; the
+    Noise stack (noise.connection, and cryptography through
+    chacha20poly1305_reuseable) should only load once a device with an
+    encryption key starts
+
+    python tools/bench_import.py
+    python tools/compare.py <revision> tools/bench_import.py
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+import _paths  # noqa: F401
+
+# Modules whose cumulative import time is reported
+MODULES = [
+    "aioesphomeapi",
+    "aioesphomeapi.api_pb2",
+    "google.protobuf",
+    "zeroconf",
+    "noise.connection",
+    "chacha20poly1305_reuseable",
+    "pkg_resources",
+]
+
+CHILD = """
+import sys, time
+sys.path.insert(0, {tools!r})
+import _paths
+start = time.perf_counter()
+import plugin
+elapsed = time.perf_counter() - start
+print(elapsed)
+"""
+
+
+def import_plugin():
+    """Import the plugin in a fresh interpreter.
+
+    Returns the import time in seconds, and a map from each module imported
+    to its cumulative import time in microseconds.
+    """
+    code = CHILD.format(tools=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:       self |  cumulative | imported package", with the
+        # package name indented by nesting depth
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return float(result.stdout), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+    import_plugin()
+    runs = [import_plugin() for _ in range(args.runs)]
+    times = [run[0] for run in runs]
+    print(f"import plugin: median {statistics.median(times) * 1000:.0f}ms, "
+          f"min {min(times) * 1000:.0f}ms over {args.runs} runs")
+    # Cumulative times nest: google.protobuf is within aioesphomeapi.api_pb2,
+    # which is within aioesphomeapi. -X importtime adds its own overhead, so
+    # these are larger than their share of the times above.
+    for name in MODULES:
+        cumulative = [run[1][name] for run in runs if name in run[1]]
+        if cumulative:
+            print(f"  {name:<24} {statistics.median(cumulative) / 1000:>7.1f}ms")
+        else:
+            print(f"  {name:<24} not loaded")
+
+
+if __name__ == "__main__":
+    main()
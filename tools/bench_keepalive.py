@@ -0,0 +1,121 @@
+"""Benchmark: event loop overhead of keepalives for many connections.
+
+Runs N connected APIConnections on one loop with their keepalive running,
+feeding them frames without any sockets, and counts the loop timers armed and
+cancelled and the process CPU time used. Two traffic patterns:
+
+  - chatty: every connection receives a frame every 50ms, like a device
+    streaming sensor states
+  - quiet: connections only receive the answers to their pings
+
+The keepalive interval is shortened (--keepalive, 2s by default rather than
+20s) so that a short run covers many intervals; the keepalive wheel's tick is
+scaled down with it, keeping the default 20:1 ratio of interval to tick.
+
+    python tools/bench_keepalive.py
+    python tools/compare.py <revision> tools/bench_keepalive.py
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import time
+import timeit
+
+import _paths  # noqa: F401
+
+from aioesphomeapi.connection import APIConnection, ConnectionParams, ConnectionState
+
+try:
+    from aioesphomeapi import keepalive
+except ImportError:
+    # Older versions run a timer per connection
+    keepalive = None
+
+
+def make_connection(interval):
+    values = dict(address="127.0.0.1", port=6053, password=None, client_info="bench",
+                  keepalive=interval, zeroconf_instance=None, noise_psk=None,
+                  expected_name=None, batch_writes=False, stats=None)
+    params = ConnectionParams(**{field.name: values[field.name]
+                                 for field in dataclasses.fields(ConnectionParams)})
+    connection = APIConnection(params, None)
+    connection._set_connection_state(ConnectionState.CONNECTED)
+    return connection
+
+
+async def bench(args, mode):
+    loop = asyncio.get_running_loop()
+    counts = {"armed": 0, "cancelled": 0}
+    call_at = loop.call_at
+
+    def counted_call_at(when, callback, *call_args, **kwargs):
+        counts["armed"] += 1
+        return call_at(when, callback, *call_args, **kwargs)
+
+    loop.call_at = counted_call_at
+    cancel = asyncio.TimerHandle.cancel
+
+    def counted_cancel(handle):
+        counts["cancelled"] += 1
+        cancel(handle)
+
+    asyncio.TimerHandle.cancel = counted_cancel
+
+    # The device answers each ping with the next frame it sends
+    awaiting_pong = []
+    send_message = APIConnection.send_message
+    APIConnection.send_message = lambda connection, msg: awaiting_pong.append(connection)
+    try:
+        connections = [make_connection(args.keepalive) for _ in range(args.connections)]
+        for connection in connections:
+            connection._async_schedule_keep_alive()
+            # Spread the connections out, as they would have connected
+            await asyncio.sleep(args.keepalive / args.connections)
+        counts["armed"] = counts["cancelled"] = 0
+        frames = 0
+        cpu = time.process_time()
+        end = loop.time() + args.duration
+        while loop.time() < end:
+            await asyncio.sleep(0.05)
+            receiving = connections if mode == "chatty" else awaiting_pong
+            for connection in receiving:
+                connection._on_message_received()
+            frames += len(receiving)
+            awaiting_pong = [] if mode == "quiet" else awaiting_pong
+        cpu = time.process_time() - cpu
+        print(f"{mode:>6}: {frames / args.duration:>7,.0f} frames/s, "
+              f"timers armed {counts['armed'] / args.duration:>6,.0f}/s, "
+              f"cancelled {counts['cancelled'] / args.duration:>6,.0f}/s, "
+              f"CPU {cpu / args.duration * 100:.1f}%, "
+              f"{len(loop._scheduled)} timers pending")
+        per_frame = min(timeit.repeat(connections[0]._on_message_received,
+                                      number=100000, repeat=5)) / 100000
+        for connection in connections:
+            connection._set_connection_state(ConnectionState.CLOSED)
+            connection._cleanup()
+        return per_frame
+    finally:
+        loop.call_at = call_at
+        asyncio.TimerHandle.cancel = cancel
+        APIConnection.send_message = send_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--keepalive", type=float, default=2.0,
+                        help="keepalive interval in seconds")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    if keepalive is not None:
+        keepalive.TICK = args.keepalive / 20
+    print(f"{args.connections} connections, keepalive every {args.keepalive:g}s, "
+          f"{'timer wheel' if keepalive else 'timer per connection'}")
+    for mode in ("chatty", "quiet"):
+        per_frame = asyncio.run(bench(args, mode))
+    print(f"_on_message_received(): {per_frame * 1e9:.0f}ns per frame")
+
+
+if __name__ == "__main__":
+    main()
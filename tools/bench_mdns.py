@@ -0,0 +1,120 @@
+"""Benchmark: mDNS record handling with many devices waiting to reconnect.
+
+While a device is offline its ReconnectLogic listens for the device's mDNS
+pointer record. This registers N offline devices with a stand-in zeroconf
+instance that, like zeroconf's record manager, hands every received packet's
+records to each registered listener. It then delivers packets typical of a
+busy home network (AirPlay, Sonos, printers, Google Cast: pointer, service,
+text and address records for other devices) and reports the time per packet.
+Finally one device's own pointer record is delivered, to check it is found.
+
+    python tools/bench_mdns.py
+    python tools/compare.py <revision> tools/bench_mdns.py
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import _paths  # noqa: F401
+
+import zeroconf
+from zeroconf import DNSAddress, DNSPointer, DNSService, DNSText, RecordUpdate
+
+from aioesphomeapi import APIClient, ReconnectLogic
+
+SERVICE_TYPES = ["_airplay._tcp.local.", "_raop._tcp.local.", "_sonos._tcp.local.",
+                 "_ipp._tcp.local.", "_googlecast._tcp.local.", "_spotify-connect._tcp.local.",
+                 "_hap._tcp.local.", "_companion-link._tcp.local."]
+
+
+class FakeZeroconf:
+    """Just the listener registry of zeroconf.Zeroconf."""
+
+    def __init__(self):
+        self.listeners = []
+
+    def async_add_listener(self, listener, question):
+        self.listeners.append(listener)
+
+    def async_remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def deliver(self, now, records):
+        for listener in self.listeners:
+            listener.async_update_records(self, now, records)
+        for listener in self.listeners:
+            listener.async_update_records_complete()
+
+
+def noisy_packets(count, records_per_packet):
+    rng = random.Random(1)
+    packets = []
+    for _ in range(count):
+        records = []
+        while len(records) < records_per_packet:
+            type_ = rng.choice(SERVICE_TYPES)
+            name = f"Device {rng.randrange(40)}.{type_}"
+            host = f"host-{rng.randrange(40)}.local."
+            for record in (
+                DNSPointer(type_, zeroconf.const._TYPE_PTR, zeroconf.const._CLASS_IN, 4500, name),
+                DNSService(name, zeroconf.const._TYPE_SRV, zeroconf.const._CLASS_IN, 120,
+                           0, 0, 7000, host),
+                DNSText(name, zeroconf.const._TYPE_TXT, zeroconf.const._CLASS_IN, 4500,
+                        b"\x09model=abc"),
+                DNSAddress(host, zeroconf.const._TYPE_A, zeroconf.const._CLASS_IN, 120,
+                           bytes([192, 168, 1, rng.randrange(2, 250)])),
+            ):
+                records.append(RecordUpdate(record, None))
+        packets.append(records[:records_per_packet])
+    return packets
+
+
+async def bench(args):
+    packets = noisy_packets(args.packets, args.records)
+
+    async def noop(*_args):
+        pass
+
+    print(f"{'waiting devices':>15} {'per packet':>12}")
+    for count in args.devices:
+        zc = FakeZeroconf()
+        logics = []
+        for i in range(count):
+            logic = ReconnectLogic(
+                client=APIClient(f"head{i}.local", 6053, None), on_connect=noop,
+                on_disconnect=noop, zeroconf_instance=zc, name=f"head{i}")
+            # Offline and waiting, as after a failed connection attempt
+            logic._is_stopped = False
+            logic._start_zc_listen()
+            logics.append(logic)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for records in packets:
+                zc.deliver(0.0, records)
+            best = min(best, time.perf_counter() - start)
+        print(f"{count:>15} {best / len(packets) * 1e6:>10,.1f}µs")
+
+        # The last device comes back
+        name = f"head{count - 1}._esphomelib._tcp.local."
+        zc.deliver(0.0, [RecordUpdate(DNSPointer(
+            "_esphomelib._tcp.local.", zeroconf.const._TYPE_PTR, zeroconf.const._CLASS_IN,
+            4500, name), None)])
+        assert not logics[-1]._zc_listening, "device's own record was not noticed"
+        for logic in logics:
+            await logic.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--records", type=int, default=12, help="records per packet")
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
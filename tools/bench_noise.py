@@ -0,0 +1,118 @@
+"""Benchmark: encrypted (Noise) connection throughput against a fake node.
+
+Connects an APIClient to a fake node in a subprocess, so the client's CPU use
+can be measured on its own, and reports
+
+  - receive: climate states per second pushed by the node, and the client's
+    CPU time per message, including decryption, parsing and decoding
+  - send: the client's CPU time per climate command, sent in bursts of
+    --burst commands in the same loop iteration, and the number of transport
+    writes per burst
+
+    python tools/bench_noise.py
+    python tools/compare.py <revision> tools/bench_noise.py
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import time
+
+import _paths  # noqa: F401
+
+import fake_esphome
+from harness import FakeNodes
+
+from aioesphomeapi import APIClient
+
+
+def count_writes():
+    """Count calls to socket transports' write methods, in the returned list.
+
+    Patches the transport class, as frame helpers may keep a reference to a
+    transport's bound write method. The node runs in another process, so
+    every transport here is the client's.
+    """
+    count = [0]
+    # Some Python versions implement writelines() by calling write()
+    nested = [False]
+    transport_class = asyncio.selector_events._SelectorSocketTransport
+    for name in ("write", "writelines"):
+        method = getattr(transport_class, name)
+
+        def counted(self, data, method=method):
+            if nested[0]:
+                return method(self, data)
+            count[0] += 1
+            nested[0] = True
+            try:
+                return method(self, data)
+            finally:
+                nested[0] = False
+
+        setattr(transport_class, name, counted)
+    return count
+
+
+async def bench(args):
+    psk = None if args.plaintext else base64.b64encode(os.urandom(32)).decode()
+    nodes = FakeNodes(1, psk=psk, state_rate=args.state_rate, heads=args.heads)
+    client = APIClient("127.0.0.1", nodes.ports[0], "", noise_psk=psk)
+    try:
+        await client.connect(login=True)
+        received = 0
+
+        def on_state(state):
+            nonlocal received
+            received += 1
+
+        await client.subscribe_states(on_state)
+        await asyncio.sleep(1.0)
+        count, cpu, start = received, time.process_time(), time.monotonic()
+        await asyncio.sleep(args.duration)
+        count, cpu = received - count, time.process_time() - cpu
+        elapsed = time.monotonic() - start
+        print(f"{'Noise' if psk else 'plaintext'}, {args.heads} heads at "
+              f"{args.state_rate:g} states/s each")
+        print(f"receive: {count / elapsed:,.0f} messages/s, "
+              f"{cpu * 1e6 / max(count, 1):.0f}µs client CPU per message")
+
+        # A second connection, without the state stream, for sending
+        await client.disconnect()
+        writes = count_writes()
+        client = APIClient("127.0.0.1", nodes.ports[0], "", noise_psk=psk)
+        await client.connect(login=True)
+        writes[0] = 0
+        cpu = time.process_time()
+        for _ in range(args.bursts):
+            await asyncio.gather(*(
+                client.climate_command(fake_esphome.CLIMATE_KEY,
+                                       target_temperature=20.0 + i % 10)
+                for i in range(args.burst)))
+            await asyncio.sleep(0)
+        cpu = time.process_time() - cpu
+        writes = writes[0]
+        commands = args.bursts * args.burst
+        print(f"send: {cpu * 1e6 / commands:.1f}µs client CPU per command, "
+              f"{writes / args.bursts:.1f} transport writes per {args.burst}-command burst")
+    finally:
+        await client.disconnect(force=True)
+        nodes.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--heads", type=int, default=20)
+    parser.add_argument("--state-rate", type=float, default=50.0,
+                        help="states per second from each head")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--burst", type=int, default=20, help="commands per burst")
+    parser.add_argument("--bursts", type=int, default=2000)
+    parser.add_argument("--plaintext", action="store_true",
+                        help="measure a plaintext connection instead")
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: parsing bursts of plaintext API frames.
+
+When a client subscribes, the node sends the state of every entity at once,
+so data_received() gets many frames in one call. This feeds bursts of N
+small frames to APIPlaintextFrameHelper, either all at once or in TCP
+segment-sized chunks, and reports the parse cost per frame. A parser that
+shifts its buffer once per frame costs more per frame as bursts grow.
+
+It then feeds single large frames in segment-sized chunks and reports the
+cost per KiB. A parser that copies everything buffered so far on every
+segment costs more per KiB as frames grow.
+
+    python tools/bench_plaintext_burst.py
+    python tools/compare.py <revision> tools/bench_plaintext_burst.py
+"""
+
+import argparse
+import asyncio
+import time
+
+import _paths  # noqa: F401
+
+from aioesphomeapi._frame_helper import APIPlaintextFrameHelper
+from aioesphomeapi.util import varuint_to_bytes
+
+# ClimateStateResponse
+MSG_TYPE = 47
+SEGMENT = 1460
+
+
+def frame(msg_type, data):
+    return b"\0" + varuint_to_bytes(len(data)) + varuint_to_bytes(msg_type) + data
+
+
+def run(helper, chunks, repeat):
+    """Return the best time, in seconds, to feed all chunks to the helper."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for chunk in chunks:
+            helper.data_received(chunk)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def bench(args):
+    received = []
+    helper = APIPlaintextFrameHelper(
+        lambda msg_type, data: received.append(msg_type),
+        lambda exc: print("error:", exc), "bench", "bench")
+    payload = bytes(range(args.size))
+    print(f"{'frames':>7} {'one call':>12} {f'{SEGMENT}B chunks':>13}")
+    for frames in args.frames:
+        burst = frame(MSG_TYPE, payload) * frames
+        segments = [burst[i:i + SEGMENT] for i in range(0, len(burst), SEGMENT)]
+        results = []
+        for chunks in ([burst], segments):
+            received.clear()
+            elapsed = run(helper, chunks, args.repeat)
+            assert len(received) == frames * args.repeat, len(received)
+            results.append(f"{elapsed / frames * 1e9:.0f}ns")
+        print(f"{frames:>7} {results[0]:>9}/fr {results[1]:>10}/fr")
+    print()
+    print(f"{'frame':>7} {f'{SEGMENT}B chunks':>13}")
+    for size in args.large:
+        data = frame(MSG_TYPE, bytes(size * 1024))
+        segments = [data[i:i + SEGMENT] for i in range(0, len(data), SEGMENT)]
+        received.clear()
+        elapsed = run(helper, segments, args.repeat)
+        assert len(received) == args.repeat, len(received)
+        print(f"{size:>6}K {elapsed / size * 1e9:>9.0f}ns/KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000],
+                        help="frames per burst")
+    parser.add_argument("--size", type=int, default=30, help="bytes of data per frame")
+    parser.add_argument("--large", type=int, nargs="+", default=[16, 64, 256, 1024],
+                        help="KiB of data per large frame")
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(bench(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark: protobuf encode and decode throughput per backend.
+
+Runs the same encode, decode and decode-to-model loops in a child interpreter
+for each protobuf backend available:
+
+  - python: the pure-Python protobuf bundled in Packages, forced with
+    PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python
+  - host: whatever protobuf_backend.selectProtobufBackend() picks, as the
+    plugin does at import; this is only a compiled backend if one is found on
+    sys.path, so point --protobuf at a site-packages folder (or a pip
+    install --target folder) containing a compiled protobuf to measure it
+
+    python tools/bench_protobuf.py --protobuf /path/to/site-packages
+    python tools/compare.py <revision> tools/bench_protobuf.py --protobuf ...
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import _paths  # noqa: F401
+
+
+def cases():
+    from aioesphomeapi import api_pb2 as pb
+    from aioesphomeapi import model
+    climate = pb.ClimateStateResponse(
+        key=4057448159, mode=pb.CLIMATE_MODE_COOL, current_temperature=24.5,
+        target_temperature=22.0, action=pb.CLIMATE_ACTION_COOLING,
+        fan_mode=pb.CLIMATE_FAN_AUTO)
+    sensor = pb.SensorStateResponse(key=123, state=12.5)
+    info = pb.ListEntitiesClimateResponse(
+        object_id="climate", key=4057448159, name="Climate",
+        supported_modes=[0, 2, 3, 4], supported_fan_modes=[2, 3, 4],
+        visual_min_temperature=16, visual_max_temperature=31,
+        visual_target_temperature_step=0.5)
+    climate_data = climate.SerializeToString()
+    return [
+        ("encode ClimateStateResponse", climate.SerializeToString),
+        ("decode ClimateStateResponse",
+         lambda: pb.ClimateStateResponse().MergeFromString(climate_data)),
+        ("decode + ClimateState.from_pb", lambda: model.ClimateState.from_pb(
+            _decode(pb.ClimateStateResponse, climate_data))),
+        ("encode SensorStateResponse", sensor.SerializeToString),
+        ("decode SensorStateResponse",
+         lambda: pb.SensorStateResponse().MergeFromString(sensor.SerializeToString())),
+        ("encode ListEntitiesClimate", info.SerializeToString),
+    ]
+
+
+def _decode(proto, data):
+    msg = proto()
+    msg.MergeFromString(data)
+    return msg
+
+
+def child(count):
+    """Run the cases with the backend the plugin would choose, printing JSON."""
+    import protobuf_backend
+    backend, error = protobuf_backend.selectProtobufBackend()
+    results = []
+    for label, func in cases():
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(count):
+                func()
+            best = min(best, time.perf_counter() - start)
+        results.append((label, count / best))
+    print(json.dumps({"backend": backend, "error": error, "results": results}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--protobuf", help="folder containing a compiled google/protobuf")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        if args.protobuf:
+            sys.path.append(args.protobuf)
+        child(args.count)
+        return
+
+    runs = []
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--count", str(args.count)]
+    if args.protobuf:
+        command += ["--protobuf", args.protobuf]
+    for label, env in (("python", dict(os.environ, PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION="python")),
+                       ("host", {k: v for k, v in os.environ.items()
+                                 if k != "PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"})):
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode:
+            print(f"{label}: failed\n{result.stderr}")
+            continue
+        run = json.loads(result.stdout.splitlines()[-1])
+        if run["error"]:
+            print(f"{label}: compiled protobuf not usable: {run['error']}")
+        runs.append((f"{label} ({run['backend']})", dict(run["results"])))
+    if not runs:
+        return
+    print(f"{'ops/s':<32}" + "".join(f"{label:>18}" for label, _ in runs))
+    for case in runs[0][1]:
+        print(f"{case:<32}" + "".join(f"{results.get(case, 0):>18,.0f}" for _, results in runs))
+
+
+if __name__ == "__main__":
+    main()
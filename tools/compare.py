@@ -0,0 +1,57 @@
+"""Run a tool against earlier revisions of the plugin and then the working tree.
+
+    python tools/compare.py [--rounds N] <revision>[,<revision>...] tools/bench_x.py [args...]
+
+Each revision's ESPHomeClimate.indigoPlugin/Contents is exported to a temporary
+folder with git archive, and the tool runs once against each of them and once
+against the working tree, each in a fresh interpreter. Only the plugin comes
+from the revisions; the tools themselves are always the working tree's.
+
+With --rounds, the whole sequence runs N times over. On a machine whose speed
+drifts (a laptop, a shared VM) alternating like this and taking each version's
+best round is far more reliable than one long run of each.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import _paths
+
+
+def main():
+    args = sys.argv[1:]
+    rounds = 1
+    if args[:1] == ["--rounds"]:
+        rounds = int(args[1])
+        args = args[2:]
+    if len(args) < 2:
+        sys.exit(__doc__)
+    revisions, command = args[0].split(","), args[1:]
+    env = {k: v for k, v in os.environ.items() if k != "ESPHOME_CLIMATE_CONTENTS"}
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [(revision,
+                 dict(env, ESPHOME_CLIMATE_CONTENTS=export(revision, os.path.join(tmp, str(i)))))
+                for i, revision in enumerate(revisions)]
+        runs.append(("working tree", env))
+        for round_ in range(rounds):
+            for label, run_env in runs:
+                print(f"== {label}" + (f" (round {round_ + 1})" if rounds > 1 else ""),
+                      flush=True)
+                subprocess.run([sys.executable, *command], env=run_env)
+
+
+def export(revision, folder):
+    """Export the revision's Contents folder into folder, and return its path."""
+    os.makedirs(folder)
+    archive = subprocess.Popen(["git", "archive", revision, "ESPHomeClimate.indigoPlugin/Contents"],
+                               cwd=_paths.ROOT, stdout=subprocess.PIPE)
+    subprocess.run(["tar", "-x", "-C", folder], stdin=archive.stdout, check=True)
+    if archive.wait():
+        sys.exit(f"git archive {revision} failed")
+    return os.path.join(folder, "ESPHomeClimate.indigoPlugin", "Contents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""A stand-in for an ESPHome node running a heat pump, for exercising the plugin
+and aioesphomeapi without hardware.
+
+FakeNode listens on localhost and speaks the native API, in plaintext or with
+Noise encryption (if given a psk). It lists a climate entity and a vertical vane
+select per head, and an outdoor temperature sensor. It applies climate and select
+commands (clamping the setpoint to the climate's limits, like the HeatPump
+library), and pushes climate states at a configurable rate once a client
+subscribes.
+
+    node = FakeNode(name="head1", state_rate=2.0)
+    await node.start()          # node.port is the port it listens on
+    ...
+    await node.stop()
+
+Run as a script to serve a few nodes until interrupted (SIGUSR1 makes it print
+the number of messages sent):
+
+    python tools/fake_esphome.py --nodes 3 --psk <base64 key>
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import signal
+
+import _paths  # noqa: F401
+
+from aioesphomeapi import api_pb2 as pb
+from aioesphomeapi.core import MESSAGE_TYPE_TO_PROTO
+
+PROTO_TO_MESSAGE_TYPE = {proto: msg_type for msg_type, proto in MESSAGE_TYPE_TO_PROTO.items()}
+
+# Entity keys of the first head; each further head adds HEAD_KEY_STEP
+CLIMATE_KEY = 1001
+VANE_KEY = 1002
+HEAD_KEY_STEP = 10
+OUTDOOR_KEY = 1000
+# Entity keys of the extra sensors, counting up from here
+EXTRA_SENSOR_KEY = 2000
+
+VANE_OPTIONS = ["auto", "swing", "up", "up_center", "center", "down_center", "down"]
+MIN_TEMPERATURE = 16.0
+MAX_TEMPERATURE = 31.0
+
+
+def head_object_ids(head):
+    """Object IDs of a head's climate and vane select entities."""
+    if head == 0:
+        return "climate", "vane"
+    return f"climate_{head + 1}", f"vane_{head + 1}"
+
+
+def encode_varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, pos):
+    """Return the varint at pos and the position after it, or None if incomplete."""
+    result = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+    return None
+
+
+class FakeNode:
+    """One fake ESPHome node, listening on its own localhost port."""
+
+    def __init__(self, name="fake", psk=None, password="", state_rate=0.0,
+                 command_delay=0.05, response_delay=0.0, heads=1, extra_sensors=0,
+                 host="127.0.0.1", port=0):
+        self.name = name
+        # Base64 Noise key, or None for plaintext
+        self.psk = psk
+        self.password = password
+        # Climate states pushed per second to each subscribed client
+        self.state_rate = state_rate
+        # Seconds the heat pump takes to apply a command and report it
+        self.command_delay = command_delay
+        # Seconds the node takes to answer each API request, like a real node
+        # on Wi-Fi; localhost alone answers in well under a millisecond
+        self.response_delay = response_delay
+        # Number of heat pumps the node controls
+        self.heads = heads
+        # Sensors that no plugin device uses, which still send states
+        self.extra_sensors = extra_sensors
+        self.host = host
+        self.port = port
+        self.mac_address = "02:00:00:%02X:%02X:%02X" % tuple(
+            random.randrange(256) for _ in range(3))
+        self.compilation_time = "Jan  1 2024, 00:00:00"
+        # Map from entity key to the head's current state
+        self.climates = {}
+        self.vanes = {}
+        for head in range(heads):
+            key = CLIMATE_KEY + head * HEAD_KEY_STEP
+            self.climates[key] = pb.ClimateStateResponse(
+                key=key, mode=pb.CLIMATE_MODE_COOL, current_temperature=24.0,
+                target_temperature=22.0, action=pb.CLIMATE_ACTION_COOLING,
+                fan_mode=pb.CLIMATE_FAN_AUTO)
+            key = VANE_KEY + head * HEAD_KEY_STEP
+            self.vanes[key] = pb.SelectStateResponse(key=key, state="auto")
+        self.outdoor = pb.SensorStateResponse(key=OUTDOOR_KEY, state=12.5)
+        self.server = None
+        self.connections = set()
+        # Counters
+        self.connects = 0
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.commands = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(
+            lambda: NodeProtocol(self), self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for connection in list(self.connections):
+            connection.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def disconnect_all(self):
+        """Drop every client connection, as if the node rebooted."""
+        for connection in list(self.connections):
+            connection.close()
+
+    def entities(self):
+        for head in range(self.heads):
+            yield from self.head_entities(head)
+        yield pb.ListEntitiesSensorResponse(
+            object_id="outdoor_temperature", key=OUTDOOR_KEY,
+            name=f"{self.name} outdoor temperature", unit_of_measurement="°C",
+            accuracy_decimals=1)
+        for i in range(self.extra_sensors):
+            yield pb.ListEntitiesSensorResponse(
+                object_id=f"sensor_{i}", key=EXTRA_SENSOR_KEY + i, name=f"sensor {i}",
+                unit_of_measurement="dB", accuracy_decimals=0)
+
+    def head_entities(self, head):
+        climate_id, vane_id = head_object_ids(head)
+        yield pb.ListEntitiesClimateResponse(
+            object_id=climate_id, key=CLIMATE_KEY + head * HEAD_KEY_STEP,
+            name=f"{self.name} {climate_id}",
+            supports_current_temperature=True, supports_action=True,
+            supported_modes=[pb.CLIMATE_MODE_OFF, pb.CLIMATE_MODE_HEAT_COOL,
+                             pb.CLIMATE_MODE_COOL, pb.CLIMATE_MODE_HEAT,
+                             pb.CLIMATE_MODE_FAN_ONLY],
+            supported_fan_modes=[pb.CLIMATE_FAN_AUTO, pb.CLIMATE_FAN_QUIET,
+                                 pb.CLIMATE_FAN_LOW, pb.CLIMATE_FAN_MEDIUM,
+                                 pb.CLIMATE_FAN_HIGH],
+            visual_min_temperature=MIN_TEMPERATURE,
+            visual_max_temperature=MAX_TEMPERATURE,
+            visual_target_temperature_step=0.5)
+        yield pb.ListEntitiesSelectResponse(
+            object_id=vane_id, key=VANE_KEY + head * HEAD_KEY_STEP,
+            name=f"{self.name} {vane_id}", options=VANE_OPTIONS)
+
+    def states(self):
+        yield from self.climates.values()
+        yield from self.vanes.values()
+        yield self.outdoor
+        for i in range(self.extra_sensors):
+            yield pb.SensorStateResponse(key=EXTRA_SENSOR_KEY + i, state=-60.0 - i)
+
+    def apply_climate_command(self, command):
+        climate = self.climates.get(command.key)
+        if climate is None:
+            return None
+        if command.has_mode:
+            climate.mode = command.mode
+        if command.has_target_temperature:
+            climate.target_temperature = min(
+                MAX_TEMPERATURE, max(MIN_TEMPERATURE, command.target_temperature))
+        if command.has_fan_mode:
+            climate.fan_mode = command.fan_mode
+        return climate
+
+    def broadcast(self, msg):
+        for connection in list(self.connections):
+            if connection.subscribed:
+                connection.send(msg)
+
+
+class NodeProtocol(asyncio.Protocol):
+    """One client connection to a FakeNode."""
+
+    def __init__(self, node):
+        self.node = node
+        self.transport = None
+        self.buffer = bytearray()
+        self.noise = None
+        # Noise: 'hello', 'handshake' or 'ready'
+        self.noise_state = "hello"
+        self.subscribed = False
+        self.push_handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.node.connections.add(self)
+        self.node.connects += 1
+        if self.node.psk is not None:
+            from noise.connection import NoiseConnection
+            self.noise = NoiseConnection.from_name(b"Noise_NNpsk0_25519_ChaChaPoly_SHA256")
+            self.noise.set_as_responder()
+            self.noise.set_psks(base64.b64decode(self.node.psk))
+            self.noise.set_prologue(b"NoiseAPIInit\x00\x00")
+            self.noise.start_handshake()
+
+    def connection_lost(self, exc):
+        self.node.connections.discard(self)
+        if self.push_handle is not None:
+            self.push_handle.cancel()
+            self.push_handle = None
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def data_received(self, data):
+        self.buffer += data
+        if self.noise is None:
+            self.read_plaintext()
+        else:
+            self.read_noise()
+
+    def read_plaintext(self):
+        buf = self.buffer
+        pos = 0
+        while True:
+            if pos >= len(buf):
+                break
+            if buf[pos] != 0x00:
+                self.close()
+                return
+            length = decode_varint(buf, pos + 1)
+            if length is None:
+                break
+            length, type_pos = length
+            msg_type = decode_varint(buf, type_pos)
+            if msg_type is None:
+                break
+            msg_type, data_pos = msg_type
+            if data_pos + length > len(buf):
+                break
+            self.handle(msg_type, bytes(buf[data_pos:data_pos + length]))
+            pos = data_pos + length
+        del self.buffer[:pos]
+
+    def read_noise(self):
+        buf = self.buffer
+        pos = 0
+        while pos + 3 <= len(buf):
+            if buf[pos] != 0x01:
+                self.close()
+                return
+            end = pos + 3 + ((buf[pos + 1] << 8) | buf[pos + 2])
+            if end > len(buf):
+                break
+            frame = bytes(buf[pos + 3:end])
+            pos = end
+            if self.noise_state == "hello":
+                # The client's hello is an empty frame; answer with the chosen
+                # protocol and our name.
+                self.write_noise_frame(b"\x01" + self.node.name.encode() + b"\x00")
+                self.noise_state = "handshake"
+            elif self.noise_state == "handshake":
+                self.noise.read_message(frame[1:])
+                self.write_noise_frame(b"\x00" + self.noise.write_message())
+                self.noise_state = "ready"
+            else:
+                msg = self.noise.decrypt(frame)
+                msg_type = (msg[0] << 8) | msg[1]
+                self.handle(msg_type, msg[4:])
+        del self.buffer[:pos]
+
+    def write_noise_frame(self, frame):
+        self.transport.write(bytes((0x01, len(frame) >> 8, len(frame) & 0xFF)) + frame)
+
+    def send(self, msg):
+        if self.transport is None or self.transport.is_closing():
+            return
+        self.node.messages_sent += 1
+        data = msg.SerializeToString()
+        msg_type = PROTO_TO_MESSAGE_TYPE[type(msg)]
+        if self.noise is None:
+            self.transport.write(
+                b"\x00" + encode_varint(len(data)) + encode_varint(msg_type) + data)
+        else:
+            self.write_noise_frame(self.noise.encrypt(
+                bytes((msg_type >> 8, msg_type & 0xFF, len(data) >> 8, len(data) & 0xFF))
+                + data))
+
+    def handle(self, msg_type, data):
+        node = self.node
+        node.messages_received += 1
+        proto = MESSAGE_TYPE_TO_PROTO.get(msg_type)
+        if proto is None:
+            return
+        msg = proto()
+        msg.ParseFromString(data)
+        if node.response_delay > 0:
+            asyncio.get_running_loop().call_later(
+                node.response_delay, self.respond, proto, msg)
+        else:
+            self.respond(proto, msg)
+
+    def respond(self, proto, msg):
+        node = self.node
+        if proto is pb.HelloRequest:
+            self.send(pb.HelloResponse(api_version_major=1, api_version_minor=9,
+                                       server_info="fake_esphome", name=node.name))
+        elif proto is pb.ConnectRequest:
+            self.send(pb.ConnectResponse(invalid_password=msg.password != node.password))
+        elif proto is pb.DeviceInfoRequest:
+            self.send(pb.DeviceInfoResponse(
+                uses_password=bool(node.password), name=node.name,
+                mac_address=node.mac_address, esphome_version="2023.8.0",
+                compilation_time=node.compilation_time, model="fake"))
+        elif proto is pb.ListEntitiesRequest:
+            for entity in node.entities():
+                self.send(entity)
+            self.send(pb.ListEntitiesDoneResponse())
+        elif proto is pb.SubscribeStatesRequest:
+            self.subscribed = True
+            for state in node.states():
+                self.send(state)
+            if node.state_rate > 0 and self.push_handle is None:
+                self.schedule_push()
+        elif proto is pb.ClimateCommandRequest:
+            node.commands += 1
+            climate = node.apply_climate_command(msg)
+            if climate is not None:
+                asyncio.get_running_loop().call_later(
+                    node.command_delay, node.broadcast, climate)
+        elif proto is pb.SelectCommandRequest:
+            node.commands += 1
+            vane = node.vanes.get(msg.key)
+            if vane is not None:
+                vane.state = msg.state
+                asyncio.get_running_loop().call_later(
+                    node.command_delay, node.broadcast, vane)
+        elif proto is pb.PingRequest:
+            self.send(pb.PingResponse())
+        elif proto is pb.DisconnectRequest:
+            self.send(pb.DisconnectResponse())
+            self.close()
+
+    def schedule_push(self):
+        self.push_handle = asyncio.get_running_loop().call_later(
+            1.0 / self.node.state_rate, self.push_state)
+
+    def push_state(self):
+        # A new room temperature reading from each head, like the heat pump sends
+        for climate in self.node.climates.values():
+            climate.current_temperature = round(
+                climate.target_temperature + random.uniform(-1.0, 1.0), 1)
+            self.send(climate)
+        self.schedule_push()
+
+
+async def serve(args):
+    nodes = []
+    for i in range(args.nodes):
+        node = FakeNode(name=f"fake{i}", psk=args.psk, state_rate=args.state_rate,
+                        response_delay=args.response_delay, heads=args.heads,
+                        extra_sensors=args.extra_sensors, port=args.port + i if args.port else 0)
+        await node.start()
+        print(f"{node.name} listening on 127.0.0.1:{node.port}", flush=True)
+        nodes.append(node)
+    # SIGUSR1 prints how many messages the nodes have sent so far, so a driver
+    # can count what the plugin received without reaching into the plugin.
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGUSR1,
+        lambda: print(f"sent {sum(node.messages_sent for node in nodes)}", flush=True))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for node in nodes:
+            await node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=1)
+    parser.add_argument("--port", type=int, default=6053,
+                        help="port of the first node (0 for any free port)")
+    parser.add_argument("--psk", help="base64 Noise encryption key")
+    parser.add_argument("--state-rate", type=float, default=1.0,
+                        help="climate states per second per client, from each head")
+    parser.add_argument("--response-delay", type=float, default=0.0,
+                        help="seconds to wait before answering each request")
+    parser.add_argument("--heads", type=int, default=1,
+                        help="climate entities per node")
+    parser.add_argument("--extra-sensors", type=int, default=0,
+                        help="sensors per node that the plugin doesn't use")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
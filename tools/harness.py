@@ -0,0 +1,243 @@
+"""Load-test harness: drive the plugin against many fake ESPHome nodes.
+
+The fake nodes (fake_esphome.py) run in a subprocess, so the plugin's own CPU
+use can be measured. The plugin runs as it would in Indigo, with the stub
+indigo module standing in for the server: startup(), deviceStartComm() for
+every device, then deviceStopComm() and shutdown().
+
+    python tools/harness.py --devices 200 --state-rate 2 --duration 10
+
+reports:
+  - connect latency: from deviceStartComm() to the device's connectionState
+    becoming "connected", and how long the deviceStartComm() calls held
+    Indigo's thread
+  - state update throughput over --duration seconds, in messages received
+    and Indigo state writes per second
+  - CPU per message on the plugin's event loop thread
+  - memory per device (growth in resident set size while starting devices)
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import _paths
+
+import fake_esphome
+import indigo
+
+
+def rss_bytes():
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the peak, in bytes on macOS and kilobytes elsewhere
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class FakeNodes:
+    """Fake ESPHome nodes served by a fake_esphome.py subprocess."""
+
+    def __init__(self, count, psk=None, state_rate=0.0, response_delay=0.0, heads=1,
+                 extra_sensors=0):
+        command = [sys.executable, os.path.join(os.path.dirname(__file__), "fake_esphome.py"),
+                   "--nodes", str(count), "--port", "0", "--state-rate", str(state_rate),
+                   "--response-delay", str(response_delay), "--heads", str(heads),
+                   "--extra-sensors", str(extra_sensors)]
+        if psk:
+            command += ["--psk", psk]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.ports = []
+        for _ in range(count):
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("fake_esphome.py exited early")
+            self.ports.append(int(line.rsplit(":", 1)[1]))
+
+    def messagesSent(self):
+        """Messages the nodes have sent so far, all of which the plugin receives"""
+        self.process.send_signal(signal.SIGUSR1)
+        return int(self.process.stdout.readline().split()[1])
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class Harness:
+    """The plugin, running outside Indigo, with devices for fake nodes."""
+
+    def __init__(self, prefs=None):
+        import plugin
+        self.plugin = plugin.Plugin("com.example.esphomeclimate", "ESPHome Climate", "0.0",
+                                    indigo.Dict(prefs or {}))
+        self.plugin.startup()
+        self.devices = []
+        # dev.id -> time.monotonic() when deviceStartComm() was called, when
+        # the device first reported connectionState "connected", and when it
+        # first wrote a climate state
+        self.started = {}
+        self.connected = {}
+        self.reporting = {}
+        self.all_connected = threading.Event()
+        self.all_reporting = threading.Event()
+        # Seconds Indigo's thread spent in deviceStartComm() and
+        # deviceStopComm() calls
+        self.start_comm_time = 0.0
+        self.stop_comm_time = 0.0
+        self.running = set()
+
+    def onWrite(self, dev, kvl):
+        for item in kvl:
+            if (item["key"] == "connectionState" and item["value"] == "connected"
+                    and dev.id not in self.connected):
+                self.connected[dev.id] = time.monotonic()
+                if len(self.connected) == len(self.devices):
+                    self.all_connected.set()
+            elif item["key"] == "hvacOperationMode" and dev.id not in self.reporting:
+                self.reporting[dev.id] = time.monotonic()
+                if len(self.reporting) == len(self.devices):
+                    self.all_reporting.set()
+
+    def addDevice(self, port, address="127.0.0.1", psk="", **props):
+        dev_id = 1000 + len(self.devices)
+        dev = indigo.Device(dev_id, f"Head {len(self.devices) + 1}",
+                            dict(address=address, port=str(port), password="",
+                                 psk=psk or "", **props))
+        dev.on_write = self.onWrite
+        indigo.devices[dev_id] = dev
+        self.devices.append(dev)
+        return dev
+
+    def startDevices(self, devices=None):
+        for dev in devices or self.devices:
+            start = time.monotonic()
+            self.started[dev.id] = start
+            self.plugin.deviceStartComm(dev)
+            self.start_comm_time += time.monotonic() - start
+            self.running.add(dev.id)
+
+    def stopDevices(self, devices=None):
+        for dev in devices or self.devices:
+            if dev.id in self.running:
+                start = time.monotonic()
+                self.plugin.deviceStopComm(dev)
+                self.stop_comm_time += time.monotonic() - start
+                self.running.discard(dev.id)
+
+    def waitConnected(self, timeout):
+        return self.all_connected.wait(timeout)
+
+    def waitReporting(self, timeout):
+        return self.all_reporting.wait(timeout)
+
+    def connectLatencies(self):
+        return sorted(self.connected[dev_id] - self.started[dev_id]
+                      for dev_id in self.connected)
+
+    def reportLatencies(self):
+        return sorted(self.reporting[dev_id] - self.started[dev_id]
+                      for dev_id in self.reporting)
+
+    def loopThreadTime(self):
+        """CPU seconds used so far by the plugin's event loop thread."""
+        future = asyncio.run_coroutine_threadsafe(self._threadTime(), self.plugin.loop)
+        return future.result(10)
+
+    @staticmethod
+    async def _threadTime():
+        return time.thread_time()
+
+    def stateWrites(self):
+        return sum(dev.state_writes for dev in self.devices)
+
+    def close(self):
+        self.stopDevices()
+        self.plugin.shutdown()
+        self.plugin.async_thread.join(10)
+        for dev in self.devices:
+            indigo.devices.pop(dev.id, None)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--devices-per-node", type=int, default=1,
+                        help="Indigo devices sharing each fake node, one per head")
+    parser.add_argument("--extra-sensors", type=int, default=0,
+                        help="sensors per node that no device uses")
+    parser.add_argument("--state-rate", type=float, default=1.0,
+                        help="climate states per second from each node")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds to measure state throughput for")
+    parser.add_argument("--psk", help="base64 Noise key to encrypt the connections with")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    # The plugin runs its loop in debug mode, which warns about every slow step;
+    # with hundreds of connections starting at once there are many.
+    logging.getLogger("asyncio").addFilter(lambda record: record.levelno >= logging.ERROR)
+
+    node_count = -(-args.devices // args.devices_per_node)
+    nodes = FakeNodes(node_count, psk=args.psk, state_rate=args.state_rate,
+                      heads=args.devices_per_node, extra_sensors=args.extra_sensors)
+    harness = Harness()
+    try:
+        for i in range(args.devices):
+            node, head = divmod(i, args.devices_per_node)
+            climate_id, vane_id = fake_esphome.head_object_ids(head)
+            harness.addDevice(nodes.ports[node], psk=args.psk,
+                              climateEntity=climate_id, verticalVaneEntity=vane_id)
+        rss_before = rss_bytes()
+        start = time.monotonic()
+        harness.startDevices()
+        if not harness.waitConnected(args.timeout):
+            print(f"Only {len(harness.connected)} of {args.devices} devices connected "
+                  f"within {args.timeout:.0f}s")
+        all_connected = time.monotonic() - start
+        latencies = harness.connectLatencies()
+        rss_per_device = (rss_bytes() - rss_before) / args.devices
+        print(f"{args.devices} devices on {node_count} fake nodes"
+              f"{' (Noise)' if args.psk else ''}")
+        print(f"deviceStartComm() held Indigo's thread for {harness.start_comm_time * 1000:.1f}ms "
+              f"in total")
+        if latencies:
+            print(f"connect latency: median {statistics.median(latencies):.3f}s, "
+                  f"p95 {percentile(latencies, 0.95):.3f}s, max {latencies[-1]:.3f}s; "
+                  f"all connected after {all_connected:.3f}s")
+        print(f"memory: {rss_per_device / 1024:.1f} KiB per device")
+
+        received = nodes.messagesSent()
+        writes = harness.stateWrites()
+        cpu = harness.loopThreadTime()
+        time.sleep(args.duration)
+        cpu = harness.loopThreadTime() - cpu
+        received = nodes.messagesSent() - received
+        writes = harness.stateWrites() - writes
+        print(f"throughput: {received / args.duration:.0f} messages/s received, "
+              f"{writes / args.duration:.0f} Indigo state writes/s")
+        if received:
+            print(f"CPU: {cpu * 1e6 / received:.0f}µs per message on the event loop thread "
+                  f"({cpu / args.duration * 100:.1f}% of a core)")
+    finally:
+        harness.close()
+        nodes.close()
+
+
+if __name__ == "__main__":
+    main()
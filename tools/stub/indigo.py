@@ -0,0 +1,86 @@
+"""Just enough of Indigo's `indigo` module to run the plugin outside Indigo.
+
+Devices are Device objects created by the tools and registered in `devices`;
+they record every state write so the tools can count and inspect them.
+"""
+
+import logging
+import threading
+
+
+class _Constants:
+    def __init__(self, *names, **values):
+        self.__dict__.update({name: i for i, name in enumerate(names)}, **values)
+
+
+kHvacMode = _Constants("Off", "Heat", "Cool", "HeatCool", "ProgramHeat", "ProgramCool",
+                       "ProgramHeatCool")
+kFanMode = _Constants("Auto", "AlwaysOn")
+kThermostatAction = _Constants(
+    "SetHvacMode", "SetFanMode", "SetCoolSetpoint", "SetHeatSetpoint",
+    "DecreaseCoolSetpoint", "IncreaseCoolSetpoint", "DecreaseHeatSetpoint",
+    "IncreaseHeatSetpoint", "RequestStatusAll", "RequestMode", "RequestEquipmentState",
+    "RequestTemperatures", "RequestHumidities", "RequestDeadbands", "RequestSetpoints")
+kUniversalAction = _Constants("RequestStatus")
+
+
+class Dict(dict):
+    pass
+
+
+class Device:
+    def __init__(self, id, name, props):
+        self.id = id
+        self.name = name
+        self.pluginProps = Dict(props)
+        self.states = {}
+        self.error = None
+        # Number of updateStatesOnServer() calls, and of state values written
+        self.state_writes = 0
+        self.state_values = 0
+        # Called with (dev, kvl) after each write, if set
+        self.on_write = None
+        self._lock = threading.Lock()
+
+    @property
+    def coolSetpoint(self):
+        return self.states.get("setpointCool", 0.0)
+
+    @property
+    def heatSetpoint(self):
+        return self.states.get("setpointHeat", 0.0)
+
+    def updateStatesOnServer(self, kvl):
+        with self._lock:
+            self.state_writes += 1
+            self.state_values += len(kvl)
+            for item in kvl:
+                self.states[item["key"]] = item["value"]
+            self.error = None
+        if self.on_write is not None:
+            self.on_write(self, kvl)
+
+    def updateStateOnServer(self, key, value, uiValue=None):
+        self.updateStatesOnServer([{"key": key, "value": value}])
+
+    def setErrorStateOnServer(self, error):
+        self.error = error
+
+    def replacePluginPropsOnServer(self, props):
+        self.pluginProps = Dict(props)
+
+
+# Map from device id to Device
+devices = {}
+
+
+class PluginBase:
+    def __init__(self, plugin_id, plugin_display_name, plugin_version, plugin_prefs):
+        self.pluginId = plugin_id
+        self.pluginDisplayName = plugin_display_name
+        self.pluginVersion = plugin_version
+        self.pluginPrefs = plugin_prefs
+        self.logger = logging.getLogger("Plugin")
+        # The plugin adds this to the root logger; the tools configure their own
+        # output.
+        self.indigo_log_handler = logging.NullHandler()